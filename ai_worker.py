@@ -0,0 +1,207 @@
+import multiprocessing
+import os
+import queue
+
+from bitboard import unpack_move
+from engine import (SEARCH_BUDGETS, TRANSPOSITION_TABLE_MB, book_move, choose_move, opening_book, position_from_game,
+                    tablebase, tablebase_move, transposition_table)
+from smp import HelperPool, SharedTranspositionTable, make_searcher
+
+
+class AIWorker:
+    # Thinks for the AI in a separate process so neither the search nor the
+    # GIL it would hold can stall the pygame loop. start() sends a copy of the
+    # position; the main loop calls poll() every frame, which collects
+    # progress reports and, once ready, the chosen BitMove. Requests are
+    # numbered, and anything from a cancelled or superseded request is dropped.
+    # With ponder, the worker keeps searching on the opponent's time after
+    # each searched move; cancel() stops that as well. With more than one
+    # worker, helper processes join every search (see smp.py).
+    def __init__(self, on_progress=None, ponder=False, workers=1):
+        self.on_progress = on_progress
+        self.ponder = ponder
+        self.workers = workers
+        self.helpers = None
+        self.progress = None
+        self.generation = 0
+        self.position_hash = None
+        self.process = None
+        self.requests = None
+        self.replies = None
+        self.cancelled = None
+
+    @property
+    def pending(self):
+        return self.position_hash is not None
+
+    def _ensure_process(self):
+        if self.process is not None and self.process.is_alive():
+            return
+        self.requests = multiprocessing.Queue()
+        self.replies = multiprocessing.Queue()
+        self.cancelled = multiprocessing.RawValue('l', self.generation)
+        if self.workers > 1 and self.helpers is None:
+            # Started from here because the daemonic worker process may not have children of its own.
+            self.helpers = HelperPool(self.workers - 1, SharedTranspositionTable(TRANSPOSITION_TABLE_MB), tablebase(),
+                                      niceness=10)
+        self.process = multiprocessing.Process(target=_worker_main,
+                                               args=(self.requests, self.replies, self.cancelled, self.helpers),
+                                               daemon=True)
+        self.process.start()
+
+    def start(self, game):
+        # A pending request is superseded, but pondering carries on: it may be searching this very position.
+        if self.pending:
+            self.cancel()
+        self._ensure_process()
+        self.generation += 1
+        self.progress = None
+        self.position_hash = game.hash
+        budget = SEARCH_BUDGETS.get(game.difficulty)
+        self.requests.put((self.generation, position_from_game(game), game.hash_history[:-1], game.difficulty, budget,
+                           self.ponder, game.status.quiet_plies[-1]))
+
+    def cancel(self):
+        self.position_hash = None
+        if self.cancelled is not None:
+            self.cancelled.value = self.generation
+
+    def poll(self):
+        # Returns (BitMove, SearchResult or None) for the current request, or None.
+        if self.replies is None:
+            return None
+        while True:
+            try:
+                reply = self.replies.get_nowait()
+            except queue.Empty:
+                return None
+            kind, generation = reply[0], reply[1]
+            if generation != self.generation or not self.pending:
+                continue
+            if kind == 'progress':
+                self.progress = reply[2]
+                if self.on_progress:
+                    self.on_progress(self.progress)
+            else:
+                self.position_hash = None
+                return reply[2], reply[3]
+
+    def close(self):
+        self.cancel()
+        if self.process is not None and self.process.is_alive():
+            self.requests.put(None)
+            self.process.join(1)
+        self.process = None
+        if self.helpers is not None:
+            self.helpers.close()
+            self.helpers.tt.close()
+            self.helpers = None
+
+
+def _think(position, history, difficulty, budget, quiet_plies, helpers, tt, replies, cancelled, generation):
+    # (BitMove, SearchResult or None) for a request.
+    move = book_move(position, difficulty)
+    if move is None and budget is None:
+        return choose_move(position, difficulty), None
+    if move is None:
+        move = tablebase_move(position, quiet_plies)
+    if move is not None:
+        return move, None
+    searcher = make_searcher(helpers, time_limit=budget[0], node_limit=budget[1], tt=tt, tablebase=tablebase(),
+                             on_iteration=lambda result: replies.put(('progress', generation, result)),
+                             stop_check=lambda: cancelled.value >= generation)
+    result = searcher.search(position, history=history)
+    return result.best_move, result
+
+
+def _predicted_reply(tt, position):
+    # The opponent's move the last search expected, from its transposition table.
+    moves = position.generate_moves()
+    entry = tt.probe(position.hash)
+    if entry is not None and entry[3]:
+        move = unpack_move(entry[3])
+        if move in moves:
+            return move
+    return moves[0] if len(moves) == 1 else None
+
+
+def _ponder(requests, replies, cancelled, helpers, tt, generation, position, history, move):
+    # After answering request generation with move, searches the AI's reply
+    # to the opponent's predicted answer until the next request arrives. If
+    # that request is for the predicted position (a ponder hit) the running
+    # search takes on its budget, counting the time already spent, and
+    # answers it; pondering then starts over from the new move. Anything
+    # else aborts the search, and the request is returned to be handled.
+    while True:
+        history = history + [position.hash]
+        position = position.play(move)
+        predicted = _predicted_reply(tt, position)
+        if predicted is None:
+            return None
+        history = history + [position.hash]
+        position = position.play(predicted)
+        if len(opening_book().lookup(position)) or tablebase().covers(position):
+            return None
+
+        state = {'request': None, 'hit': None}
+
+        def is_hit(request):
+            return request is not None and request[4] is not None and cancelled.value < request[0] and \
+                request[1].hash == position.hash and request[2] == history
+
+        def stop_check():
+            if state['hit'] is not None:
+                return cancelled.value >= state['hit'][0]
+            if cancelled.value >= generation:
+                return True
+            try:
+                request = requests.get_nowait()
+            except queue.Empty:
+                return False
+            if not is_hit(request):
+                state['request'] = request
+                return True
+            state['hit'] = request
+            searcher.on_iteration = lambda result: replies.put(('progress', request[0], result))
+            searcher.ponderhit(*request[4])
+            return False
+
+        searcher = make_searcher(helpers, tt=tt, tablebase=tablebase(), stop_check=stop_check)
+        result = searcher.search(position, history=history)
+        if state['request'] is not None or (state['hit'] is None and cancelled.value >= generation):
+            return state['request']
+        if state['hit'] is None:
+            # The search finished on its own (a forced win or loss); wait for the opponent.
+            request = requests.get()
+            if not is_hit(request):
+                return request
+            state['hit'] = request
+        generation = state['hit'][0]
+        if cancelled.value >= generation:
+            return None
+        move = result.best_move
+        replies.put(('done', generation, move, result))
+        if move is None:
+            return None
+
+
+def _worker_main(requests, replies, cancelled, helpers):
+    # Lower priority so the UI process wins the CPU on single-core machines.
+    if hasattr(os, 'nice'):
+        try:
+            os.nice(10)
+        except OSError:
+            pass
+    tt = helpers.tt if helpers else transposition_table()
+    request = requests.get()
+    while request is not None:
+        generation, position, history, difficulty, budget, ponder, quiet_plies = request
+        request = None
+        if cancelled.value < generation:
+            move, result = _think(position, history, difficulty, budget, quiet_plies, helpers, tt, replies, cancelled,
+                                  generation)
+            replies.put(('done', generation, move, result))
+            if ponder and result is not None and move is not None:
+                request = _ponder(requests, replies, cancelled, helpers, tt, generation, position, history, move)
+        if request is None:
+            request = requests.get()
@@ -0,0 +1,162 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from bitboard import format_move
+from pdn import iter_games
+from search import Searcher
+from zobrist import TranspositionTable
+
+BLUNDER_THRESHOLD = 150  # score lost by the played move, in evaluation units (a man is 100)
+DEFAULT_DEPTH = 6
+BATCH_POSITIONS = 10000  # new positions collected before they are handed to the workers
+
+_searcher = None
+
+
+def game_positions(record):
+    # (position, move played from it) for every ply, then the final position with None.
+    position = record.start
+    for position, bitmove in record.bitmoves():
+        yield position, bitmove
+    if record.moves:
+        position = position.play(bitmove)
+    yield position, None
+
+
+def _init_worker(depth, node_limit, tt_mb):
+    global _searcher
+    _searcher = Searcher(node_limit=node_limit, max_depth=depth, tt=TranspositionTable(tt_mb))
+
+
+def analyse_position(position):
+    # Worker entry point. Scores are from the side to move's point of view.
+    result = _searcher.search(position)
+    return position.hash, {
+        'score': result.score,
+        'best': format_move(result.best_move) if result.best_move else None,
+        'depth': result.depth,
+        'nodes': result.nodes,
+    }
+
+
+def load_cache(path, settings):
+    # Position results from earlier, possibly interrupted, runs. The first
+    # line holds the search settings they were made with; None when there is
+    # no cache or it was made with other settings.
+    cache = {}
+    if not os.path.exists(path):
+        return None
+    with open(path) as infile:
+        try:
+            header = json.loads(infile.readline())
+        except ValueError:
+            return None
+        if header.get('settings') != settings:
+            return None
+        for line in infile:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by the interruption
+            cache[int(entry['hash'], 16)] = entry
+    return cache
+
+
+def search_batch(pool, pending, cache, cache_file, searched, report):
+    for key, result in pool.imap_unordered(analyse_position, pending.values(), chunksize=16):
+        result['hash'] = f"{key:016x}"
+        cache[key] = result
+        cache_file.write(json.dumps(result) + '\n')
+        cache_file.flush()
+        searched += 1
+        if report:
+            report(searched)
+    pending.clear()
+    return searched
+
+
+def analyse_games(paths, output, cache_path, depth=DEFAULT_DEPTH, node_limit=None, processes=None, tt_mb=8,
+                  threshold=BLUNDER_THRESHOLD, report=None):
+    settings = {'depth': depth, 'nodes': node_limit}
+    cache = load_cache(cache_path, settings)
+    mode = 'a'
+    if cache is None:
+        cache, mode = {}, 'w'
+    start_time = time.perf_counter()
+
+    # Every distinct position is searched once, however many games reach it.
+    # New positions are searched in batches, so only one batch of them is
+    # held at a time.
+    pending = {}
+    seen = set()
+    games = plies = searched = 0
+    with open(cache_path, mode) as cache_file, \
+            multiprocessing.Pool(processes, _init_worker, (depth, node_limit, tt_mb)) as pool:
+        if mode == 'w':
+            cache_file.write(json.dumps({'settings': settings}) + '\n')
+            cache_file.flush()
+        for _, record in iter_games(paths):
+            games += 1
+            for position, _ in game_positions(record):
+                plies += 1
+                seen.add(position.hash)
+                if position.hash not in cache and position.hash not in pending:
+                    pending[position.hash] = position
+            if len(pending) >= BATCH_POSITIONS:
+                searched = search_batch(pool, pending, cache, cache_file, searched, report)
+        searched = search_batch(pool, pending, cache, cache_file, searched, report)
+
+    moves = blunders = 0
+    with open(output, 'w') as outfile:
+        for game_id, record in iter_games(paths):
+            previous = None
+            for ply, (position, bitmove) in enumerate(game_positions(record)):
+                entry = cache[position.hash]
+                if previous is not None:
+                    line = previous
+                    # The score after the move, seen from the side that played it.
+                    line['played_score'] = -entry['score']
+                    line['loss'] = max(line['score'] - line['played_score'], 0)
+                    line['blunder'] = line['loss'] >= threshold
+                    blunders += line['blunder']
+                    moves += 1
+                    outfile.write(json.dumps(line) + '\n')
+                if bitmove is not None:
+                    previous = {'game': game_id, 'ply': ply, 'fen': position.to_fen(), 'move': format_move(bitmove),
+                                'score': entry['score'], 'best': entry['best'], 'depth': entry['depth']}
+    return {'games': games, 'positions': plies, 'unique_positions': len(seen),
+            'cached': len(seen) - searched, 'searched': searched, 'moves': moves, 'blunders': blunders,
+            'seconds': time.perf_counter() - start_time}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse every move of a set of games with the engine.")
+    parser.add_argument('games', nargs='+', help="game record archives/journals (.ckr), PDN files or saved_game.txt")
+    parser.add_argument('--output', default='analysis.jsonl', help="JSON Lines output, one line per move")
+    parser.add_argument('--cache', help="position results kept between runs with the same --depth and --nodes "
+                                        "(default: OUTPUT.positions)")
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH)
+    parser.add_argument('--nodes', type=int, default=None, help="node limit per position")
+    parser.add_argument('--processes', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--tt-mb', type=int, default=8, help="transposition table size per worker")
+    parser.add_argument('--threshold', type=int, default=BLUNDER_THRESHOLD, help="score loss flagged as a blunder")
+    args = parser.parse_args()
+
+    def report(searched):
+        if searched % 100 == 0:
+            print(f"\r{searched} positions searched", end='', file=sys.stderr)
+
+    summary = analyse_games(args.games, args.output, args.cache or args.output + '.positions', args.depth,
+                            args.nodes, args.processes, args.tt_mb, args.threshold, report)
+    print(file=sys.stderr)
+    print(f"{summary['games']} games, {summary['moves']} moves, {summary['blunders']} blunders; "
+          f"{summary['searched']} positions searched, {summary['cached']} from earlier runs, "
+          f"{summary['positions'] - summary['unique_positions']} duplicates skipped ({summary['seconds']:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import argparse
+import random
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from bitboard import SHIFTS, SQUARE_MASKS, VALID, Position
+from evaluation import CENTRE, FEATURES, ROW_MASKS, WEIGHTS, evaluate, features
+
+# Vectorised version of evaluation.features/evaluate for scoring many
+# positions at once. Positions are packed as an (N, 5) uint64 array of
+# player1_men, player1_kings, player2_men, player2_kings and player1_to_move,
+# so every feature is a handful of whole-array bit operations.
+PLAYER1_MEN, PLAYER1_KINGS, PLAYER2_MEN, PLAYER2_KINGS, PLAYER1_TO_MOVE = range(5)
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("batch evaluation needs NumPy (pip install numpy)")
+
+
+def pack_positions(positions):
+    _require_numpy()
+    return np.array([(position.player1_men, position.player1_kings, position.player2_men, position.player2_kings,
+                      position.player1_to_move) for position in positions], dtype=np.uint64).reshape(-1, 5)
+
+
+def unpack_positions(packed):
+    return [Position(*(int(word) for word in row[:4]), bool(row[PLAYER1_TO_MOVE])) for row in packed]
+
+
+def pack_squares(squares, player1_to_move):
+    # squares: (N, 32) array of CellType values, square 1 first.
+    _require_numpy()
+    squares = np.asarray(squares)
+    masks = np.array(SQUARE_MASKS, dtype=np.uint64)
+    packed = np.zeros((len(squares), 5), dtype=np.uint64)
+    # CellType values 1-4 are Player 1 man, Player 2 man, Player 1 king, Player 2 king.
+    for value, column in ((1, PLAYER1_MEN), (2, PLAYER2_MEN), (3, PLAYER1_KINGS), (4, PLAYER2_KINGS)):
+        packed[:, column] = np.bitwise_or.reduce(np.where(squares == value, masks, np.uint64(0)), axis=1)
+    packed[:, PLAYER1_TO_MOVE] = np.asarray(player1_to_move, dtype=np.uint64)
+    return packed
+
+
+def _popcount(words):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).astype(np.int64)
+    bytes_ = np.ascontiguousarray(words).view(np.uint8).reshape(words.shape + (8,))
+    return np.unpackbits(bytes_, axis=-1).sum(axis=-1, dtype=np.int64)
+
+
+def batch_features(packed):
+    # (N, len(FEATURES)) int64 array, column for column equal to evaluation.features.
+    _require_numpy()
+    packed = np.asarray(packed, dtype=np.uint64)
+    player1_men = packed[:, PLAYER1_MEN]
+    player1_kings = packed[:, PLAYER1_KINGS]
+    player2_men = packed[:, PLAYER2_MEN]
+    player2_kings = packed[:, PLAYER2_KINGS]
+    player1 = player1_men | player1_kings
+    player2 = player2_men | player2_kings
+    empty = np.uint64(VALID) & ~(player1 | player2)
+
+    advancement = np.zeros(len(packed), dtype=np.int64)
+    for row, mask in enumerate(ROW_MASKS):
+        mask = np.uint64(mask)
+        advancement += (7 - row) * _popcount(player1_men & mask) - row * _popcount(player2_men & mask)
+
+    mobility = np.zeros(len(packed), dtype=np.int64)
+    for shift in SHIFTS:
+        shift = np.uint64(shift)
+        mobility += _popcount((player1 >> shift) & empty) + _popcount((player1_kings << shift) & empty)
+        mobility -= _popcount((player2 << shift) & empty) + _popcount((player2_kings >> shift) & empty)
+
+    centre = np.uint64(CENTRE)
+    return np.stack([
+        _popcount(player1_men) - _popcount(player2_men),
+        _popcount(player1_kings) - _popcount(player2_kings),
+        advancement,
+        _popcount(player1_men & np.uint64(ROW_MASKS[7])) - _popcount(player2_men & np.uint64(ROW_MASKS[0])),
+        _popcount(player1 & centre) - _popcount(player2 & centre),
+        mobility,
+    ], axis=1)
+
+
+def batch_evaluate(packed, weights=None, feature_values=None):
+    # Scores from the side to move's point of view, like evaluation.evaluate.
+    _require_numpy()
+    if weights is None:
+        weights = WEIGHTS
+    if feature_values is None:
+        feature_values = batch_features(packed)
+    scores = (feature_values * np.asarray(weights)).sum(axis=1)
+    # int() in evaluate truncates towards zero, so fractional weights give the same result.
+    scores = np.trunc(scores).astype(np.int64)
+    side = np.asarray(packed, dtype=np.uint64)[:, PLAYER1_TO_MOVE]
+    return np.where(side != 0, scores, -scores)
+
+
+def random_positions(count, seed=1, max_plies=80):
+    # Positions from random games, for benchmarks and checks.
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        position = Position.initial()
+        for _ in range(rng.randrange(max_plies)):
+            moves = position.generate_moves()
+            if not moves:
+                break
+            position.make(rng.choice(moves))
+        positions.append(position)
+    return positions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and time the NumPy batch evaluator.")
+    parser.add_argument('--positions', type=int, default=10000, help="distinct random positions")
+    parser.add_argument('--repeat', type=int, default=100, help="copies of them evaluated per batch")
+    args = parser.parse_args()
+
+    positions = random_positions(args.positions)
+    packed = pack_positions(positions)
+    mismatches = sum(list(row) != features(position) for row, position in zip(batch_features(packed), positions))
+    mismatches += sum(int(score) != evaluate(position) for score, position in zip(batch_evaluate(packed), positions))
+    print(f"{len(positions)} positions checked against evaluation.evaluate: {mismatches} mismatches")
+
+    start_time = time.perf_counter()
+    for position in positions:
+        evaluate(position)
+    scalar_rate = len(positions) / (time.perf_counter() - start_time)
+
+    batch = np.tile(packed, (args.repeat, 1))
+    start_time = time.perf_counter()
+    batch_evaluate(batch)
+    batch_rate = len(batch) / (time.perf_counter() - start_time)
+    print(f"scalar {scalar_rate:,.0f} positions/s, batch {batch_rate:,.0f} positions/s "
+          f"({batch_rate / scalar_rate:.0f}x) over {len(FEATURES)} features")
+
+
+if __name__ == "__main__":
+    main()
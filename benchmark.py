@@ -0,0 +1,124 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import engine
+from bitboard import Position, MASK_TO_ROWCOL, iter_bits
+from perft import PERFT_POSITIONS, run_perft
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_rules_api(repeat):
+    # Times the Game-level calls the GUI makes: get_valid_moves for every piece
+    # of the side to move, and has_any_moves for each piece type. Both are served
+    # by the game's move cache after the first call for a position.
+    game = engine.Game()
+    results = []
+    for name, fen, _ in PERFT_POSITIONS:
+        position = Position.from_fen(fen)
+        engine.set_position(game, position)
+        game.move_cache.hits = game.move_cache.misses = 0
+        occupied = position.player1_men | position.player1_kings if position.player1_to_move else \
+            position.player2_men | position.player2_kings
+        squares = [MASK_TO_ROWCOL[mask] for mask in iter_bits(occupied)]
+
+        start_time = time.perf_counter()
+        moves = 0
+        for _ in range(repeat):
+            for row, col in squares:
+                moves += len(engine.get_valid_moves(game, row, col))
+        get_valid_moves_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            for cell_type in engine.PIECE_TYPES:
+                engine.has_any_moves(game, cell_type)
+        has_any_moves_seconds = time.perf_counter() - start_time
+
+        results.append({
+            'name': name,
+            'get_valid_moves_per_second': int(moves / get_valid_moves_seconds) if get_valid_moves_seconds > 0 else moves,
+            'has_any_moves_calls_per_second': int(4 * repeat / has_any_moves_seconds),
+            'move_cache_hit_rate': game.move_cache.hit_rate(),
+        })
+    return results
+
+
+def run_benchmarks(depth, repeat):
+    return {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'perft': run_perft(depth),
+        'rules_api': bench_rules_api(repeat),
+    }
+
+
+def rates(record):
+    # Flattens a benchmark record into {benchmark name: rate}, higher is better.
+    flat = {}
+    for result in record['perft']:
+        flat[f"perft/{result['name']}/d{result['depth']}"] = result['nps']
+    for result in record['rules_api']:
+        flat[f"get_valid_moves/{result['name']}"] = result['get_valid_moves_per_second']
+        flat[f"has_any_moves/{result['name']}"] = result['has_any_moves_calls_per_second']
+    return flat
+
+
+def compare(baseline, current, tolerance):
+    slowdowns = []
+    baseline_rates = rates(baseline)
+    for name, rate in rates(current).items():
+        if name not in baseline_rates:
+            continue
+        change = rate / baseline_rates[name] - 1 if baseline_rates[name] else 0.0
+        marker = '  SLOWER' if change < -tolerance else ''
+        print(f"{name:40s} {baseline_rates[name]:10d} -> {rate:10d}  {change:+7.1%}{marker}")
+        if marker:
+            slowdowns.append(name)
+    return slowdowns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the move generator and record the results as JSON.")
+    parser.add_argument('--depth', type=int, default=6, help="perft depth")
+    parser.add_argument('--repeat', type=int, default=200, help="repetitions for the rules API benchmarks")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="compare against an earlier JSON results file")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="fractional slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    record = run_benchmarks(args.depth, args.repeat)
+    failed = [result['name'] for result in record['perft'] if not result['ok']]
+    if failed:
+        print(f"perft mismatch: {', '.join(failed)}")
+
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(record, outfile, indent=2)
+    else:
+        print(json.dumps(record, indent=2))
+
+    slowdowns = []
+    if args.compare:
+        with open(args.compare) as infile:
+            slowdowns = compare(json.load(infile), record, args.tolerance)
+
+    if failed or slowdowns:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
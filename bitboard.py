@@ -0,0 +1,352 @@
+from collections import namedtuple
+
+from zobrist import PIECE_KEYS, SIDE_KEY, hash_bitboards
+
+# The 32 playable squares live in a 35-bit layout with ghost bits at 8, 17
+# and 26. With the ghosts in place every diagonal step is a shift by 4
+# (towards the left edge) or 5 (towards the right edge): left shifts move
+# down the board (towards row 7), right shifts move up (towards row 0).
+GHOST_BITS = (1 << 8) | (1 << 17) | (1 << 26)
+VALID = ((1 << 35) - 1) & ~GHOST_BITS
+ROW_BASES = [0, 4, 9, 13, 18, 22, 27, 31]
+
+# Player 1 starts at the bottom and moves up, Player 2 starts at the top and
+# moves down. Men are crowned on the far row.
+PLAYER1_KING_ROW = 0b1111 << ROW_BASES[0]
+PLAYER2_KING_ROW = 0b1111 << ROW_BASES[7]
+
+SHIFTS = (4, 5)
+
+# square index (0-31, row * 4 + col // 2) <-> bit mask <-> (row, col)
+SQUARE_MASKS = []
+MASK_TO_ROWCOL = {}
+ROWCOL_TO_MASK = {}
+for _row in range(8):
+    for _k in range(4):
+        _col = 2 * _k + (1 if _row % 2 == 0 else 0)
+        _mask = 1 << (ROW_BASES[_row] + _k)
+        SQUARE_MASKS.append(_mask)
+        MASK_TO_ROWCOL[_mask] = (_row, _col)
+        ROWCOL_TO_MASK[(_row, _col)] = _mask
+
+BitMove = namedtuple('BitMove', ['start', 'end', 'captured'])
+
+
+def iter_bits(mask):
+    while mask:
+        bit = mask & -mask
+        yield bit
+        mask ^= bit
+
+
+def mask_to_square(mask):
+    return SQUARE_MASKS.index(mask)
+
+
+def pack_move(move):
+    # start bit (6 bits) | end bit (6 bits) | captured mask (35 bits), never 0 for a real move
+    return (move.start.bit_length() - 1) | ((move.end.bit_length() - 1) << 6) | (move.captured << 12)
+
+
+def unpack_move(packed):
+    return BitMove(1 << (packed & 0x3F), 1 << ((packed >> 6) & 0x3F), packed >> 12)
+
+
+class Position:
+    __slots__ = ('player1_men', 'player1_kings', 'player2_men', 'player2_kings', 'player1_to_move', 'hash')
+
+    def __init__(self, player1_men=0, player1_kings=0, player2_men=0, player2_kings=0, player1_to_move=True,
+                 hash=None):
+        self.player1_men = player1_men
+        self.player1_kings = player1_kings
+        self.player2_men = player2_men
+        self.player2_kings = player2_kings
+        self.player1_to_move = player1_to_move
+        if hash is None:
+            hash = hash_bitboards(player1_men, player1_kings, player2_men, player2_kings, player1_to_move)
+        self.hash = hash
+
+    @classmethod
+    def initial(cls):
+        player2 = 0
+        player1 = 0
+        for row in range(3):
+            player2 |= 0b1111 << ROW_BASES[row]
+        for row in range(5, 8):
+            player1 |= 0b1111 << ROW_BASES[row]
+        return cls(player1, 0, player2, 0, True)
+
+    @classmethod
+    def from_fen(cls, fen):
+        # PDN FEN, e.g. "W:W21,22,K30:B1-12". White is Player 1 (squares 21-32
+        # at the start), Black is Player 2; the first field is the side to move.
+        fields = fen.strip().strip('"').rstrip('.').split(':')
+        if len(fields) != 3 or fields[0] not in ('W', 'B'):
+            raise ValueError(f"Invalid FEN: {fen}")
+        bitboards = {'W': [0, 0], 'B': [0, 0]}
+        for field in fields[1:]:
+            colour = field[:1]
+            if colour not in bitboards:
+                raise ValueError(f"Invalid FEN: {fen}")
+            for token in field[1:].split(','):
+                token = token.strip()
+                if not token:
+                    continue
+                is_king = token.startswith('K')
+                first, _, last = token.lstrip('K').partition('-')
+                for square in range(int(first), int(last or first) + 1):
+                    if not 1 <= square <= 32:
+                        raise ValueError(f"Invalid square {square} in FEN: {fen}")
+                    bitboards[colour][is_king] |= SQUARE_MASKS[square - 1]
+        return cls(bitboards['W'][0], bitboards['W'][1], bitboards['B'][0], bitboards['B'][1], fields[0] == 'W')
+
+    def to_fen(self):
+        def field(colour, men, kings):
+            squares = []
+            for square, mask in enumerate(SQUARE_MASKS):
+                if mask & men:
+                    squares.append(str(square + 1))
+                elif mask & kings:
+                    squares.append(f"K{square + 1}")
+            return colour + ','.join(squares)
+
+        return ':'.join(['W' if self.player1_to_move else 'B',
+                         field('W', self.player1_men, self.player1_kings),
+                         field('B', self.player2_men, self.player2_kings)])
+
+    def copy(self):
+        return Position(self.player1_men, self.player1_kings, self.player2_men, self.player2_kings, self.player1_to_move,
+                        self.hash)
+
+    def key(self):
+        return (self.player1_men, self.player1_kings, self.player2_men, self.player2_kings, self.player1_to_move)
+
+    def __eq__(self, other):
+        return isinstance(other, Position) and self.key() == other.key()
+
+    def __hash__(self):
+        return self.hash
+
+    def __repr__(self):
+        return (f"Position(player1_men={self.player1_men:#x}, player1_kings={self.player1_kings:#x}, "
+                f"player2_men={self.player2_men:#x}, player2_kings={self.player2_kings:#x}, "
+                f"player1_to_move={self.player1_to_move})")
+
+    def occupied(self):
+        return self.player1_men | self.player1_kings | self.player2_men | self.player2_kings
+
+    def empty(self):
+        return VALID & ~self.occupied()
+
+    def with_side(self, player1_to_move):
+        if player1_to_move == self.player1_to_move:
+            return self
+        position = self.copy()
+        position.player1_to_move = player1_to_move
+        position.hash ^= SIDE_KEY
+        return position
+
+    def _sides(self):
+        if self.player1_to_move:
+            return self.player1_men, self.player1_kings, self.player2_men | self.player2_kings
+        return self.player2_men, self.player2_kings, self.player1_men | self.player1_kings
+
+    def _jumpers(self, men, kings, opp, empty):
+        # Pieces with at least one capture, found with shift-and-mask over the whole side.
+        if self.player1_to_move:
+            up, down = men | kings, kings
+        else:
+            up, down = kings, men | kings
+        jumpers = 0
+        for shift in SHIFTS:
+            jumpers |= (((empty << shift) & opp) << shift) & up
+            jumpers |= (((empty >> shift) & opp) >> shift) & down
+        return jumpers
+
+    def has_captures(self):
+        men, kings, opp = self._sides()
+        return self._jumpers(men, kings, opp, self.empty()) != 0
+
+    def generate_moves(self):
+        men, kings, opp = self._sides()
+        empty = self.empty()
+        jumpers = self._jumpers(men, kings, opp, empty)
+        if jumpers:
+            return self._generate_captures(jumpers, kings, opp, empty)
+        return self._generate_simple_moves(men, kings, empty)
+
+    def has_moves(self):
+        men, kings, opp = self._sides()
+        empty = self.empty()
+        if self._jumpers(men, kings, opp, empty):
+            return True
+        if self.player1_to_move:
+            up, down = men | kings, kings
+        else:
+            up, down = kings, men | kings
+        for shift in SHIFTS:
+            if (up >> shift) & empty or (down << shift) & empty:
+                return True
+        return False
+
+    def moves_from(self, start):
+        return [move for move in self.generate_moves() if move.start == start]
+
+    def _generate_simple_moves(self, men, kings, empty):
+        moves = []
+        if self.player1_to_move:
+            up, down = men | kings, kings
+        else:
+            up, down = kings, men | kings
+        for shift in SHIFTS:
+            targets = (up >> shift) & empty
+            while targets:
+                end = targets & -targets
+                targets ^= end
+                moves.append(BitMove(end << shift, end, 0))
+            targets = (down << shift) & empty
+            while targets:
+                end = targets & -targets
+                targets ^= end
+                moves.append(BitMove(end >> shift, end, 0))
+        return moves
+
+    def _generate_captures(self, jumpers, kings, opp, empty):
+        moves = []
+        player1 = self.player1_to_move
+        promotion_row = PLAYER1_KING_ROW if player1 else PLAYER2_KING_ROW
+        while jumpers:
+            start = jumpers & -jumpers
+            jumpers ^= start
+            if start & kings:
+                up = down = True
+            else:
+                up, down = player1, not player1
+            self._add_jumps(start, start, 0, opp, empty | start, up, down,
+                            0 if start & kings else promotion_row, moves)
+        if len(moves) > 1:
+            # Kings can reach the same square by the same set of captures in a different order.
+            moves = list(dict.fromkeys(moves))
+        return moves
+
+    def _add_jumps(self, start, square, captured, opp, empty, up, down, promotion_row, moves):
+        extended = False
+        for shift in SHIFTS:
+            if up:
+                middle = square >> shift
+                if middle & opp and not middle & captured:
+                    end = middle >> shift
+                    if end & empty:
+                        extended = True
+                        if end & promotion_row:
+                            moves.append(BitMove(start, end, captured | middle))
+                        else:
+                            self._add_jumps(start, end, captured | middle, opp, empty, up, down, promotion_row, moves)
+            if down:
+                middle = square << shift
+                if middle & opp and not middle & captured:
+                    end = middle << shift
+                    if end & empty:
+                        extended = True
+                        if end & promotion_row:
+                            moves.append(BitMove(start, end, captured | middle))
+                        else:
+                            self._add_jumps(start, end, captured | middle, opp, empty, up, down, promotion_row, moves)
+        if not extended and captured:
+            moves.append(BitMove(start, square, captured))
+
+    def play(self, move):
+        position = self.copy()
+        position.make(move)
+        return position
+
+    def make(self, move):
+        # Applies move in place and returns an undo record for unmake():
+        # previous hash << 36 | captured kings << 1 | promoted.
+        start, end, captured = move
+        undo = self.hash << 36
+        start_index = start.bit_length() - 1
+        end_index = end.bit_length() - 1
+        key = self.hash ^ SIDE_KEY
+        if self.player1_to_move:
+            if start & self.player1_kings:
+                self.player1_kings ^= start ^ end
+                key ^= PIECE_KEYS[1][start_index] ^ PIECE_KEYS[1][end_index]
+            elif end & PLAYER1_KING_ROW:
+                self.player1_men ^= start
+                self.player1_kings |= end
+                key ^= PIECE_KEYS[0][start_index] ^ PIECE_KEYS[1][end_index]
+                undo |= 1
+            else:
+                self.player1_men ^= start ^ end
+                key ^= PIECE_KEYS[0][start_index] ^ PIECE_KEYS[0][end_index]
+            if captured:
+                captured_kings = captured & self.player2_kings
+                key ^= _captured_key(captured, self.player2_men, 2)
+                self.player2_men &= ~captured
+                self.player2_kings ^= captured_kings
+                undo |= captured_kings << 1
+        else:
+            if start & self.player2_kings:
+                self.player2_kings ^= start ^ end
+                key ^= PIECE_KEYS[3][start_index] ^ PIECE_KEYS[3][end_index]
+            elif end & PLAYER2_KING_ROW:
+                self.player2_men ^= start
+                self.player2_kings |= end
+                key ^= PIECE_KEYS[2][start_index] ^ PIECE_KEYS[3][end_index]
+                undo |= 1
+            else:
+                self.player2_men ^= start ^ end
+                key ^= PIECE_KEYS[2][start_index] ^ PIECE_KEYS[2][end_index]
+            if captured:
+                captured_kings = captured & self.player1_kings
+                key ^= _captured_key(captured, self.player1_men, 0)
+                self.player1_men &= ~captured
+                self.player1_kings ^= captured_kings
+                undo |= captured_kings << 1
+        self.player1_to_move = not self.player1_to_move
+        self.hash = key
+        return undo
+
+    def unmake(self, move, undo):
+        start, end, captured = move
+        captured_kings = (undo >> 1) & VALID
+        captured_men = captured ^ captured_kings
+        self.player1_to_move = not self.player1_to_move
+        if self.player1_to_move:
+            if undo & 1:
+                self.player1_kings ^= end
+                self.player1_men |= start
+            elif end & self.player1_kings:
+                self.player1_kings ^= start ^ end
+            else:
+                self.player1_men ^= start ^ end
+            self.player2_men |= captured_men
+            self.player2_kings |= captured_kings
+        else:
+            if undo & 1:
+                self.player2_kings ^= end
+                self.player2_men |= start
+            elif end & self.player2_kings:
+                self.player2_kings ^= start ^ end
+            else:
+                self.player2_men ^= start ^ end
+            self.player1_men |= captured_men
+            self.player1_kings |= captured_kings
+        self.hash = undo >> 36
+
+
+def _captured_key(captured, men, men_kind):
+    men_keys = PIECE_KEYS[men_kind]
+    king_keys = PIECE_KEYS[men_kind + 1]
+    key = 0
+    while captured:
+        bit = captured & -captured
+        captured ^= bit
+        key ^= (men_keys if bit & men else king_keys)[bit.bit_length() - 1]
+    return key
+
+
+def format_move(move):
+    separator = 'x' if move.captured else '-'
+    return f"{mask_to_square(move.start) + 1}{separator}{mask_to_square(move.end) + 1}"
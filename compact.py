@@ -0,0 +1,308 @@
+import argparse
+import itertools
+import random
+import sys
+import time
+import tracemalloc
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from bitboard import PLAYER1_KING_ROW, PLAYER2_KING_ROW, SQUARE_MASKS, BitMove, Position, iter_bits
+from engine import Board, CellType, PIECE_KINDS, PIECE_TYPES, move_from_bitmove
+from pdn import iter_games
+
+# Compact forms for holding large numbers of moves and positions, e.g. a
+# whole archive for analysis. Both use 32-bit square sets (bit n is PDN
+# square n + 1) instead of the 35-bit bitboard layout with its ghost bits.
+#
+# A move is one int: start square (5 bits), end square (5 bits), captured
+# squares (32 bits) and a promotion flag. The captured set identifies the
+# capture path; the move generator gives the order of the jumps.
+#
+# A position is two 64-bit words: Player 1's pieces | Player 2's pieces << 32,
+# and kings | player 1 to move << 32. The hash is not stored; unpacking
+# recomputes it.
+START_SHIFT = 0
+END_SHIFT = 5
+CAPTURED_SHIFT = 10
+PROMOTION_FLAG = 1 << 42
+SQUARE_BITS = 0x1F
+SET_BITS = 0xFFFFFFFF
+POSITION_WORDS = 2
+TYPECODE = 'Q'
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("NumPy views of packed arrays need NumPy (pip install numpy)")
+
+
+def compress(mask):
+    # 35-bit bitboard -> 32-bit square set, dropping the ghost bits at 8, 17 and 26.
+    return (mask & 0xFF) | ((mask >> 1) & 0xFF00) | ((mask >> 2) & 0xFF0000) | ((mask >> 3) & 0xFF000000)
+
+
+def expand(squares):
+    return (squares & 0xFF) | ((squares & 0xFF00) << 1) | ((squares & 0xFF0000) << 2) | ((squares & 0xFF000000) << 3)
+
+
+def pack_bitmove(bitmove, promotion=False):
+    word = ((compress(bitmove.start).bit_length() - 1) << START_SHIFT
+            | (compress(bitmove.end).bit_length() - 1) << END_SHIFT
+            | compress(bitmove.captured) << CAPTURED_SHIFT)
+    return word | PROMOTION_FLAG if promotion else word
+
+
+def unpack_bitmove(word):
+    return BitMove(SQUARE_MASKS[(word >> START_SHIFT) & SQUARE_BITS], SQUARE_MASKS[(word >> END_SHIFT) & SQUARE_BITS],
+                   expand((word >> CAPTURED_SHIFT) & SET_BITS))
+
+
+def is_promotion(word):
+    return bool(word & PROMOTION_FLAG)
+
+
+def pack_position(position):
+    pieces = compress(position.player1_men | position.player1_kings) | compress(
+        position.player2_men | position.player2_kings) << 32
+    kings = compress(position.player1_kings | position.player2_kings) | int(position.player1_to_move) << 32
+    return pieces, kings
+
+
+def unpack_position(pieces, kings):
+    player1 = expand(pieces & SET_BITS)
+    player2 = expand(pieces >> 32)
+    king_squares = expand(kings & SET_BITS)
+    return Position(player1 & ~king_squares, player1 & king_squares, player2 & ~king_squares, player2 & king_squares,
+                    bool(kings >> 32))
+
+
+# Converters for the GUI's Move and Board objects.
+
+def pack_move(move, position):
+    # A Move only keeps its end squares and whether it took one, two or
+    # more pieces, so the captured squares come from the moves generated in
+    # position, the position it was played from. Two captures these do not
+    # tell apart raise ValueError rather than packing either.
+    start = SQUARE_MASKS[(move.start_row * 8 + move.start_col) // 2]
+    end = SQUARE_MASKS[(move.end_row * 8 + move.end_col) // 2]
+    name = f"{move.start_row},{move.start_col}-{move.end_row},{move.end_col}"
+    candidates = [bitmove for bitmove in position.moves_from(start) if bitmove.end == end]
+    if len(candidates) > 1:
+        captures = (move.is_capture, move.is_double_capture, move.is_triple_capture)
+        candidates = [bitmove for bitmove in candidates
+                      if tuple(bitmove.captured.bit_count() > count for count in range(3)) == captures]
+    if len(candidates) > 1:
+        raise ValueError(f"Move {name} matches {len(candidates)} captures here")
+    if not candidates:
+        raise ValueError(f"Move {name} is not legal here")
+    return pack_bitmove(candidates[0], move.is_promotion)
+
+
+def unpack_move(word):
+    move = move_from_bitmove(unpack_bitmove(word))
+    move.is_promotion = is_promotion(word)
+    return move
+
+
+def pack_board(board, player1_to_move):
+    bitboards = [0, 0, 0, 0]
+    for row in board.cells:
+        for cell in row:
+            kind = PIECE_KINDS.get(cell.cell_type)
+            if kind is not None:
+                bitboards[kind] |= SQUARE_MASKS[(cell.row * 8 + cell.col) // 2]
+    return pack_position(Position(*bitboards, player1_to_move))
+
+
+def unpack_board(pieces, kings, board=None):
+    # Returns the board (a new one unless given) and whether Player 1 is to move.
+    board = board if board is not None else Board()
+    position = unpack_position(pieces, kings)
+    for row in board.cells:
+        for cell in row:
+            cell.cell_type = CellType.EMPTY
+    for kind, bitboard in enumerate((position.player1_men, position.player1_kings, position.player2_men,
+                                     position.player2_kings)):
+        for mask in iter_bits(bitboard):
+            square = SQUARE_MASKS.index(mask)
+            row = square // 4
+            board.cells[row][2 * (square % 4) + (1 if row % 2 == 0 else 0)].cell_type = PIECE_TYPES[kind]
+    return board, position.player1_to_move
+
+
+class MoveArray:
+    # Packed moves stored contiguously, 8 bytes each.
+    def __init__(self, words=()):
+        self.words = array(TYPECODE, words)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __getitem__(self, index):
+        return unpack_bitmove(self.words[index])
+
+    def __iter__(self):
+        return map(unpack_bitmove, self.words)
+
+    def append(self, bitmove, promotion=False):
+        self.words.append(pack_bitmove(bitmove, promotion))
+
+    def is_promotion(self, index):
+        return is_promotion(self.words[index])
+
+    def nbytes(self):
+        return self.words.itemsize * len(self.words)
+
+    def to_numpy(self):
+        # A view of the same memory, not a copy.
+        _require_numpy()
+        return np.frombuffer(self.words, dtype=np.uint64)
+
+    @classmethod
+    def from_numpy(cls, words):
+        _require_numpy()
+        moves = cls()
+        moves.words.frombytes(np.ascontiguousarray(words, dtype=np.uint64).tobytes())
+        return moves
+
+    def tofile(self, outfile):
+        self.words.tofile(outfile)
+
+    @classmethod
+    def fromfile(cls, infile, count):
+        moves = cls()
+        moves.words.fromfile(infile, count)
+        return moves
+
+
+class PositionArray:
+    # Packed positions stored contiguously, 16 bytes each.
+    def __init__(self, words=()):
+        self.words = array(TYPECODE, words)
+
+    def __len__(self):
+        return len(self.words) // POSITION_WORDS
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        return unpack_position(self.words[POSITION_WORDS * index], self.words[POSITION_WORDS * index + 1])
+
+    def __iter__(self):
+        words = self.words
+        return (unpack_position(words[index], words[index + 1]) for index in range(0, len(words), POSITION_WORDS))
+
+    def append(self, position):
+        self.words.extend(pack_position(position))
+
+    def nbytes(self):
+        return self.words.itemsize * len(self.words)
+
+    def to_numpy(self):
+        # An (N, 2) view of the same memory, not a copy.
+        _require_numpy()
+        return np.frombuffer(self.words, dtype=np.uint64).reshape(-1, POSITION_WORDS)
+
+    @classmethod
+    def from_numpy(cls, words):
+        _require_numpy()
+        positions = cls()
+        positions.words.frombytes(np.ascontiguousarray(words, dtype=np.uint64).tobytes())
+        return positions
+
+    def tofile(self, outfile):
+        self.words.tofile(outfile)
+
+    @classmethod
+    def fromfile(cls, infile, count):
+        positions = cls()
+        positions.words.fromfile(infile, POSITION_WORDS * count)
+        return positions
+
+
+def crowns(position, bitmove):
+    return bool(bitmove.start & (position.player1_men | position.player2_men)
+                and bitmove.end & (PLAYER1_KING_ROW | PLAYER2_KING_ROW))
+
+
+def load_corpus(paths):
+    # Every position of every game in paths with the move played from it.
+    positions = PositionArray()
+    moves = MoveArray()
+    for _, record in iter_games(paths):
+        for position, bitmove in record.bitmoves():
+            positions.append(position)
+            moves.append(bitmove, crowns(position, bitmove))
+    return positions, moves
+
+
+def random_corpus(count, seed=1):
+    rng = random.Random(seed)
+    positions = PositionArray()
+    moves = MoveArray()
+    position = Position.initial()
+    while len(moves) < count:
+        legal = position.generate_moves()
+        if not legal or rng.random() < 0.01:
+            position = Position.initial()
+            continue
+        bitmove = rng.choice(legal)
+        positions.append(position)
+        moves.append(bitmove, crowns(position, bitmove))
+        position.make(bitmove)
+    return positions, moves
+
+
+def measure(build):
+    # Bytes allocated per item by build(), which returns a list of items.
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = build()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return allocated / max(1, len(items))
+
+
+def report(positions, moves):
+    count = len(moves)
+    rows = [
+        ("per move", "Move", measure(lambda: [move_from_bitmove(bitmove) for bitmove in moves])),
+        ("", "BitMove", measure(lambda: list(moves))),
+        ("", "MoveArray", moves.nbytes() / count),
+        ("per position", "Board", measure(lambda: [unpack_board(*pack_position(position))[0]
+                                                   for position in itertools.islice(positions, 5000)])),
+        ("", "Position", measure(lambda: list(positions))),
+        ("", "PositionArray", positions.nbytes() / count),
+    ]
+    for label, name, size in rows:
+        print(f"{label:>12} {name:>13} {size:9.1f} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack games into compact move and position arrays and report "
+                                                 "their memory use against the object forms.")
+    parser.add_argument('paths', nargs='*', help="game records, PDN files or saved games (default: random games)")
+    parser.add_argument('--moves', type=int, default=100000, help="moves of random games when no paths are given")
+    parser.add_argument('--output', help="write the packed positions to OUTPUT.positions and moves to OUTPUT.moves")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    positions, moves = load_corpus(args.paths) if args.paths else random_corpus(args.moves)
+    if not moves:
+        sys.exit("No moves found")
+    print(f"{len(moves)} moves packed in {time.perf_counter() - start_time:.2f}s")
+    if args.output:
+        with open(args.output + '.positions', 'wb') as outfile:
+            positions.tofile(outfile)
+        with open(args.output + '.moves', 'wb') as outfile:
+            moves.tofile(outfile)
+    report(positions, moves)
+
+
+if __name__ == "__main__":
+    main()
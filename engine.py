@@ -0,0 +1,572 @@
+import random
+import time
+from enum import Enum
+
+from bitboard import Position, ROWCOL_TO_MASK, MASK_TO_ROWCOL, iter_bits
+from gamestatus import MOVE_LIMIT_PLIES, GameStatus
+from history import History, undo_captured_kings, undo_hash, undo_promoted
+from search import Searcher
+from tablebase import Tablebase
+from zobrist import SIDE_KEY, TranspositionTable
+
+# Enums
+class CellType(Enum):
+    EMPTY = 0
+    PLAYER1_QORKI = 1
+    PLAYER2_QORKI = 2
+    PLAYER1_KING_QORKI = 3
+    PLAYER2_KING_QORKI = 4
+
+# Index of each piece type in Position bitboards and Zobrist keys
+PIECE_KINDS = {
+    CellType.PLAYER1_QORKI: 0,
+    CellType.PLAYER1_KING_QORKI: 1,
+    CellType.PLAYER2_QORKI: 2,
+    CellType.PLAYER2_KING_QORKI: 3,
+}
+PIECE_TYPES = list(PIECE_KINDS)
+
+class Difficulty(Enum):
+    EASY = 0
+    MEDIUM = 1
+    HARD = 2
+
+# Difficulty levels played by the search engine, with their per-move
+# (seconds, nodes) budget. A budget of None means no limit of that kind.
+SEARCH_BUDGETS = {
+    Difficulty.HARD: (1.0, None),
+}
+
+# The search engine's transposition table is shared by every search in the process.
+TRANSPOSITION_TABLE_MB = 16
+_transposition_table = None
+
+# Endgame tablebases are used by the AI when they have been generated. With
+# TABLEBASE_ADJUDICATION, check_game_over also ends games they have decided.
+TABLEBASE_ADJUDICATION = False
+_tablebase = None
+
+# The opening book is consulted before any search or random choice when it
+# has been built (see openingbook.py).
+_opening_book = None
+
+# Number of positions whose legal moves a Game keeps, so undoing, redoing or
+# stepping through a game does not regenerate them. A few hundred bytes each.
+MOVE_CACHE_SIZE = 1024
+
+class MoveCache:
+    # Legal moves of recently seen positions, keyed on the Zobrist hash of the
+    # board with a given side to move. The hash only changes when move_piece,
+    # undo_move or a load changes the board, so every query in between (move
+    # hints while a piece is selected, check_game_over, the AI) is served from
+    # one generation pass per side.
+    #
+    # This is kept apart from the TranspositionTable: its slots are three
+    # fixed 64-bit words with room for one best move, not a move list, and
+    # the search generates its moves straight from Position bitboards rather
+    # than through a Game. Entries are evicted least recently used first.
+    def __init__(self, size=MOVE_CACHE_SIZE):
+        self.size = size
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries = {}
+
+    def entry(self, game, player1_to_move):
+        # Returns (moves, moves by start square) for player1_to_move on the current board.
+        key = game.hash if player1_to_move == game.is_player1_turn else game.hash ^ SIDE_KEY
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.hits += 1
+            self.entries[key] = entry
+            return entry
+        self.misses += 1
+        moves = position_from_game(game, player1_to_move).generate_moves()
+        by_square = {}
+        for move in moves:
+            by_square.setdefault(move.start, []).append(move)
+        if len(self.entries) >= self.size:
+            del self.entries[next(iter(self.entries))]
+        entry = self.entries[key] = (moves, by_square)
+        return entry
+
+    def moves(self, game, player1_to_move=None):
+        if player1_to_move is None:
+            player1_to_move = game.is_player1_turn
+        return self.entry(game, player1_to_move)[0]
+
+    def moves_from(self, game, row, col):
+        piece = game.board.cells[row][col].cell_type
+        if piece == CellType.EMPTY:
+            return []
+        return self.entry(game, piece_owner_is_player1(piece))[1].get(ROWCOL_TO_MASK[(row, col)], [])
+
+    def has_moves(self, game, player1_to_move):
+        return bool(self.entry(game, player1_to_move)[0])
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate(), 'entries': len(self.entries)}
+
+class Cell:
+    __slots__ = ('row', 'col', 'cell_type')
+
+    def __init__(self, row, col, cell_type):
+        self.row = row
+        self.col = col
+        self.cell_type = cell_type
+
+class Board:
+    def __init__(self):
+        self.cells = [[Cell(row, col, CellType.EMPTY) for col in range(8)] for row in range(8)]
+
+class Player:
+    def __init__(self, name):
+        self.name = name
+        self.captured_pieces = 0
+        self.moves_made = 0
+        self.time_played = 0
+
+class Game:
+    def __init__(self):
+        self.board = Board()
+        self.player1 = Player("Player 1")
+        self.player2 = Player("Player 2")
+        self.is_player1_turn = True
+        self.piece_selected = False
+        self.selected_row = -1
+        self.selected_col = -1
+        self.difficulty = Difficulty.MEDIUM
+        self.move_history = []
+        self.history = History()
+        self.status = GameStatus()
+        self.last_move = None
+        self.last_search = None
+        self.hash = 0
+        self.hash_history = []
+        self.move_cache = MoveCache()
+        self.journal = None
+        self.start_time = time.time()
+        self.paused = False
+        self.pause_start_time = None
+
+    def toggle_pause(self):
+        if self.paused:
+            self.start_time += time.time() - self.pause_start_time
+            self.paused = False
+        else:
+            self.pause_start_time = time.time()
+            self.paused = True
+
+class Move:
+    __slots__ = ('start_row', 'start_col', 'end_row', 'end_col', 'is_capture', 'is_double_capture', 'is_triple_capture',
+                 'is_promotion')
+
+    def __init__(self, start_row, start_col, end_row, end_col, is_capture, is_double_capture, is_triple_capture, is_promotion=False):
+        self.start_row = start_row
+        self.start_col = start_col
+        self.end_row = end_row
+        self.end_col = end_col
+        self.is_capture = is_capture
+        self.is_double_capture = is_double_capture
+        self.is_triple_capture = is_triple_capture
+        self.is_promotion = is_promotion
+
+def init_game(game):
+    game.player1.name = "Player 1"
+    game.player2.name = "Player 2"
+    game.player1.captured_pieces = 0
+    game.player2.captured_pieces = 0
+    game.is_player1_turn = True
+    game.piece_selected = False
+    game.move_history = []
+    game.last_move = None
+    game.start_time = time.time()
+    init_board(game.board)
+    rehash_game(game)
+
+def init_board(board):
+    for row in range(8):
+        for col in range(8):
+            if (row + col) % 2 != 0:
+                if row < 3:
+                    board.cells[row][col].cell_type = CellType.PLAYER2_QORKI
+                elif row > 4:
+                    board.cells[row][col].cell_type = CellType.PLAYER1_QORKI
+                else:
+                    board.cells[row][col].cell_type = CellType.EMPTY
+            else:
+                board.cells[row][col].cell_type = CellType.EMPTY
+
+def move_piece(game, start_row, start_col, end_row, end_col):
+    bitmove = find_bitmove(game, start_row, start_col, end_row, end_col)
+    if bitmove is None:
+        return False
+    apply_bitmove(game, bitmove)
+    return True
+
+def apply_bitmove(game, bitmove):
+    start_row, start_col = MASK_TO_ROWCOL[bitmove.start]
+    end_row, end_col = MASK_TO_ROWCOL[bitmove.end]
+    start_cell = game.board.cells[start_row][start_col]
+    end_cell = game.board.cells[end_row][end_col]
+    # The game status plays the move on its bitboards first, so a move out
+    # of turn is refused before anything changes; the undo record it
+    # returns is the history step, and its position carries the hash.
+    undo = game.status.push(bitmove, piece_owner_is_player1(start_cell.cell_type))
+    if game.journal is not None:
+        game.journal.record(game, bitmove)
+
+    move = move_from_bitmove(bitmove)
+    game.move_history.append(move)
+    game.last_move = move
+
+    # A king's capture can end on the square it started from.
+    moving_piece = start_cell.cell_type
+    start_cell.cell_type = CellType.EMPTY
+    end_cell.cell_type = moving_piece
+
+    if bitmove.captured:
+        for mask in iter_bits(bitmove.captured):
+            row, col = MASK_TO_ROWCOL[mask]
+            captured_piece = game.board.cells[row][col].cell_type
+            game.board.cells[row][col].cell_type = CellType.EMPTY
+            if captured_piece in [CellType.PLAYER2_QORKI, CellType.PLAYER2_KING_QORKI]:
+                game.player1.captured_pieces += 1
+            elif captured_piece in [CellType.PLAYER1_QORKI, CellType.PLAYER1_KING_QORKI]:
+                game.player2.captured_pieces += 1
+
+    if end_row == 0 and end_cell.cell_type == CellType.PLAYER1_QORKI:
+        end_cell.cell_type = CellType.PLAYER1_KING_QORKI
+        move.is_promotion = True
+    if end_row == 7 and end_cell.cell_type == CellType.PLAYER2_QORKI:
+        end_cell.cell_type = CellType.PLAYER2_KING_QORKI
+        move.is_promotion = True
+
+    game.history.push(bitmove, undo)
+    game.hash = game.status.position.hash
+    game.hash_history.append(game.hash)
+
+def piece_owner_is_player1(cell_type):
+    return cell_type in [CellType.PLAYER1_QORKI, CellType.PLAYER1_KING_QORKI]
+
+def position_from_game(game, player1_to_move=None):
+    if player1_to_move is None:
+        player1_to_move = game.is_player1_turn
+    bitboards = [0, 0, 0, 0]
+    for row in range(8):
+        for col in range(8):
+            kind = PIECE_KINDS.get(game.board.cells[row][col].cell_type)
+            if kind is not None:
+                bitboards[kind] |= ROWCOL_TO_MASK[(row, col)]
+    return Position(*bitboards, player1_to_move)
+
+def set_position(game, position):
+    bitboards = (position.player1_men, position.player1_kings, position.player2_men, position.player2_kings)
+    for row in range(8):
+        for col in range(8):
+            mask = ROWCOL_TO_MASK.get((row, col), 0)
+            cell_type = CellType.EMPTY
+            for kind, bitboard in enumerate(bitboards):
+                if mask & bitboard:
+                    cell_type = PIECE_TYPES[kind]
+            game.board.cells[row][col].cell_type = cell_type
+    game.is_player1_turn = position.player1_to_move
+    game.piece_selected = False
+    rehash_game(game)
+
+def rehash_game(game):
+    # The board was rewritten wholesale, so cached moves and the steps that
+    # led to the old board cannot be trusted.
+    game.move_cache.clear()
+    game.history.clear()
+    game.status.reset(position_from_game(game))
+    game.hash = game.status.position.hash
+    game.hash_history = [game.hash]
+
+def position_for_piece(game, row, col):
+    piece = game.board.cells[row][col].cell_type
+    if piece == CellType.EMPTY:
+        return None
+    return position_from_game(game, piece_owner_is_player1(piece))
+
+def move_from_bitmove(bitmove):
+    start_row, start_col = MASK_TO_ROWCOL[bitmove.start]
+    end_row, end_col = MASK_TO_ROWCOL[bitmove.end]
+    captures = bitmove.captured.bit_count()
+    return Move(start_row, start_col, end_row, end_col, captures > 0, captures > 1, captures > 2)
+
+def find_bitmove(game, start_row, start_col, end_row, end_col):
+    if not (0 <= end_row < 8 and 0 <= end_col < 8):
+        return None
+    end = ROWCOL_TO_MASK.get((end_row, end_col))
+    if end is None or (start_row, start_col) not in ROWCOL_TO_MASK:
+        return None
+    for bitmove in game.move_cache.moves_from(game, start_row, start_col):
+        if bitmove.end == end:
+            return bitmove
+    return None
+
+def is_move_valid(game, start_row, start_col, end_row, end_col, must_capture):
+    must_capture[0] = False
+    bitmove = find_bitmove(game, start_row, start_col, end_row, end_col)
+    if bitmove is None:
+        return False
+    must_capture[0] = bitmove.captured != 0
+    return True
+
+def can_capture(game, row, col):
+    if (row, col) not in ROWCOL_TO_MASK:
+        return False
+    return any(bitmove.captured for bitmove in game.move_cache.moves_from(game, row, col))
+
+def check_game_over(game):
+    # Constant time: mobility and the draw rules are kept up to date by game.status.
+    player1_has_moves = game.status.has_moves(True)
+    player2_has_moves = game.status.has_moves(False)
+
+    if not player1_has_moves and not player2_has_moves:
+        if game.player1.captured_pieces == game.player2.captured_pieces:
+            return 3  # Game is a draw
+        elif game.player1.captured_pieces > game.player2.captured_pieces:
+            return 1  # Player 1 wins
+        else:
+            return 2  # Player 2 wins
+    elif not player1_has_moves:
+        return 2  # Player 2 wins
+    elif not player2_has_moves:
+        return 1  # Player 1 wins
+
+    if game.status.is_draw():
+        return 3  # Draw by repetition or the move limit
+
+    if TABLEBASE_ADJUDICATION:
+        position = game.status.position
+        entry = tablebase().probe(position) if tablebase().covers(position) else None
+        if entry is not None:
+            result, distance = entry
+            if result == 0:
+                return 3  # Game is a draw
+            # A result further away than the move limit may still become a draw.
+            if distance <= MOVE_LIMIT_PLIES - game.status.quiet_plies[-1]:
+                return 1 if (result > 0) == game.is_player1_turn else 2
+
+    return 0  # Game is still ongoing
+
+def has_any_moves(game, player_type):
+    _, by_square = game.move_cache.entry(game, piece_owner_is_player1(player_type))
+    for start in by_square:
+        row, col = MASK_TO_ROWCOL[start]
+        if game.board.cells[row][col].cell_type == player_type:
+            return True
+    return False
+
+def find_captures(game, start_row, start_col, valid_moves):
+    # Chained jumps are generated whole by the bitboard move generator, so each
+    # capture move already ends on its final landing square.
+    if (start_row, start_col) not in ROWCOL_TO_MASK:
+        return
+    for bitmove in game.move_cache.moves_from(game, start_row, start_col):
+        if bitmove.captured:
+            valid_moves.append(move_from_bitmove(bitmove))
+
+def get_valid_moves(game, start_row, start_col):
+    if (start_row, start_col) not in ROWCOL_TO_MASK:
+        return []
+    return [move_from_bitmove(bitmove) for bitmove in game.move_cache.moves_from(game, start_row, start_col)]
+
+def save_game(game, filename):
+    with open(filename, 'w') as outfile:
+        outfile.write(f"{game.player1.name}\n")
+        outfile.write(f"{game.player2.name}\n")
+        outfile.write(f"{int(game.is_player1_turn)}\n")
+        outfile.write(f"{game.player1.captured_pieces}\n")
+        outfile.write(f"{game.player2.captured_pieces}\n")
+        outfile.write(f"{game.player1.moves_made}\n")
+        outfile.write(f"{game.player2.moves_made}\n")
+        outfile.write(f"{game.start_time}\n")
+
+        for row in range(8):
+            for col in range(8):
+                outfile.write(f"{game.board.cells[row][col].cell_type.value} ")
+            outfile.write("\n")
+
+    print("Game saved successfully!")
+
+def load_game(game, filename):
+    try:
+        with open(filename, 'r') as infile:
+            game.player1.name = infile.readline().strip()
+            game.player2.name = infile.readline().strip()
+            game.is_player1_turn = bool(int(infile.readline().strip()))
+            game.player1.captured_pieces = int(infile.readline().strip())
+            game.player2.captured_pieces = int(infile.readline().strip())
+            game.player1.moves_made = int(infile.readline().strip())
+            game.player2.moves_made = int(infile.readline().strip())
+            game.start_time = float(infile.readline().strip())
+
+            for row in range(8):
+                cell_types = infile.readline().strip().split()
+                for col, cell_type in enumerate(cell_types):
+                    game.board.cells[row][col].cell_type = CellType(int(cell_type))
+
+        rehash_game(game)
+        print("Game loaded successfully!")
+        return True
+    except Exception as e:
+        print(f"Error: Could not load the game. {e}")
+        return False
+
+def transposition_table():
+    global _transposition_table
+    if _transposition_table is None:
+        _transposition_table = TranspositionTable(TRANSPOSITION_TABLE_MB)
+    return _transposition_table
+
+def tablebase():
+    global _tablebase
+    if _tablebase is None:
+        _tablebase = Tablebase()
+    return _tablebase
+
+def tablebase_move(position, quiet_plies=None):
+    # The exact best move when the position is in the tablebases, else None.
+    # quiet_plies, from a live game, leaves wins the move limit may cut short to the search.
+    if not tablebase().covers(position):
+        return None
+    budget = None if quiet_plies is None else MOVE_LIMIT_PLIES - quiet_plies
+    return tablebase().best_move(position, budget)
+
+def opening_book():
+    global _opening_book
+    if _opening_book is None:
+        # Imported here: the book builder reads games through pdn and
+        # gamerecord, which are built on this module.
+        from openingbook import OpeningBook
+        _opening_book = OpeningBook()
+    return _opening_book
+
+def book_move(position, difficulty, rng=random):
+    # A book move picked with the difficulty's weighting, else None.
+    if not len(opening_book()):
+        return None
+    return opening_book().choose(position, difficulty.name, rng)
+
+def search_move(position, difficulty, history=None):
+    time_limit, node_limit = SEARCH_BUDGETS[difficulty]
+    searcher = Searcher(tt=transposition_table(), tablebase=tablebase())
+    return searcher.search(position, time_limit=time_limit, node_limit=node_limit, history=history)
+
+def choose_move(position, difficulty, rng=random, valid_moves=None):
+    if valid_moves is None:
+        valid_moves = position.generate_moves()
+    if not valid_moves:
+        return None
+
+    if difficulty in SEARCH_BUDGETS:
+        return tablebase_move(position) or search_move(position, difficulty).best_move
+    elif difficulty == Difficulty.EASY:
+        return rng.choice(valid_moves)
+    else:  # MEDIUM
+        capture_moves = [move for move in valid_moves if move.captured]
+        if capture_moves:
+            return rng.choice(capture_moves)
+        return rng.choice(valid_moves)
+
+def think(position, difficulty, history=None, valid_moves=None, quiet_plies=None):
+    # The AI's move as (BitMove, SearchResult or None): from the opening
+    # book, then the tablebases and search or the random policies.
+    chosen_move = book_move(position, difficulty)
+    if chosen_move is None and difficulty in SEARCH_BUDGETS:
+        chosen_move = tablebase_move(position, quiet_plies)
+        if chosen_move is None:
+            result = search_move(position, difficulty, history)
+            return result.best_move, result
+    elif chosen_move is None:
+        chosen_move = choose_move(position, difficulty, valid_moves=valid_moves)
+    return chosen_move, None
+
+def ai_move(game):
+    valid_moves = game.move_cache.moves(game)
+    if not valid_moves:
+        return False
+
+    chosen_move, search_result = think(position_from_game(game), game.difficulty, game.hash_history[:-1], valid_moves,
+                                       game.status.quiet_plies[-1])
+    if search_result is not None:
+        game.last_search = search_result
+    if chosen_move is None:
+        return False
+
+    play_bitmove(game, chosen_move)
+    return True
+
+def play_bitmove(game, bitmove):
+    apply_bitmove(game, bitmove)
+    game.is_player1_turn = not game.is_player1_turn
+    if game.is_player1_turn:
+        game.player2.moves_made += 1
+    else:
+        game.player1.moves_made += 1
+
+def undo_move(game):
+    # Takes back the last move exactly, crowned men, captured kings and
+    # multi-jumps included, from its history step alone.
+    if not game.history.can_undo():
+        return False
+    if game.journal is not None:
+        game.journal.undo()
+    bitmove, undo = game.history.pop()
+    game.status.pop(bitmove, undo)
+    start_row, start_col = MASK_TO_ROWCOL[bitmove.start]
+    end_row, end_col = MASK_TO_ROWCOL[bitmove.end]
+    piece = game.board.cells[end_row][end_col].cell_type
+    player1 = piece_owner_is_player1(piece)
+    if undo_promoted(undo):
+        piece = CellType.PLAYER1_QORKI if player1 else CellType.PLAYER2_QORKI
+    game.board.cells[end_row][end_col].cell_type = CellType.EMPTY
+    game.board.cells[start_row][start_col].cell_type = piece
+
+    mover, opponent = (game.player1, game.player2) if player1 else (game.player2, game.player1)
+    if bitmove.captured:
+        man, king = ((CellType.PLAYER2_QORKI, CellType.PLAYER2_KING_QORKI) if player1
+                     else (CellType.PLAYER1_QORKI, CellType.PLAYER1_KING_QORKI))
+        captured_kings = undo_captured_kings(undo)
+        for mask in iter_bits(bitmove.captured):
+            row, col = MASK_TO_ROWCOL[mask]
+            game.board.cells[row][col].cell_type = king if mask & captured_kings else man
+        mover.captured_pieces -= bitmove.captured.bit_count()
+
+    game.is_player1_turn = player1
+    mover.moves_made -= 1
+    game.piece_selected = False
+    if game.move_history:
+        game.move_history.pop()
+    game.last_move = game.move_history[-1] if game.move_history else None
+    game.hash = undo_hash(undo)
+    if len(game.hash_history) > 1:
+        game.hash_history.pop()
+    return True
+
+def redo_move(game):
+    # Replays the last move taken back; apply_bitmove sees it is the step
+    # that was undone and keeps the rest of the redo line.
+    if not game.history.can_redo():
+        return False
+    bitmove, _ = game.history.next()
+    play_bitmove(game, bitmove)
+    return True
+
+def goto_ply(game, ply):
+    # Steps back or forward through the history to the position after ply
+    # moves, touching only the squares each step changed.
+    ply = max(0, min(ply, len(game.history)))
+    while game.history.ply > ply:
+        undo_move(game)
+    while game.history.ply < ply:
+        redo_move(game)
@@ -0,0 +1,63 @@
+import json
+
+from bitboard import ROW_BASES, ROWCOL_TO_MASK, SHIFTS, VALID
+
+ROW_MASKS = [0b1111 << base for base in ROW_BASES]
+CENTRE = 0
+for _row, _col in [(3, 2), (3, 4), (4, 3), (4, 5)]:
+    CENTRE |= ROWCOL_TO_MASK[(_row, _col)]
+
+# Every feature is Player 1's count minus Player 2's count.
+FEATURES = ['men', 'kings', 'advancement', 'back_rank', 'centre', 'mobility']
+WEIGHTS = [100, 160, 2, 10, 8, 3]
+
+WIN_SCORE = 100000
+
+
+def features(position):
+    player1_men = position.player1_men
+    player2_men = position.player2_men
+    player1 = player1_men | position.player1_kings
+    player2 = player2_men | position.player2_kings
+    empty = VALID & ~(player1 | player2)
+
+    advancement = 0
+    for row in range(8):
+        advancement += (7 - row) * (player1_men & ROW_MASKS[row]).bit_count()
+        advancement -= row * (player2_men & ROW_MASKS[row]).bit_count()
+
+    mobility = 0
+    for shift in SHIFTS:
+        mobility += ((player1 >> shift) & empty).bit_count() + ((position.player1_kings << shift) & empty).bit_count()
+        mobility -= ((player2 << shift) & empty).bit_count() + ((position.player2_kings >> shift) & empty).bit_count()
+
+    return [
+        player1_men.bit_count() - player2_men.bit_count(),
+        position.player1_kings.bit_count() - position.player2_kings.bit_count(),
+        advancement,
+        (player1_men & ROW_MASKS[7]).bit_count() - (player2_men & ROW_MASKS[0]).bit_count(),
+        (player1 & CENTRE).bit_count() - (player2 & CENTRE).bit_count(),
+        mobility,
+    ]
+
+
+def evaluate(position, weights=None):
+    if weights is None:
+        weights = WEIGHTS
+    score = 0
+    for weight, value in zip(weights, features(position)):
+        score += weight * value
+    score = int(score)
+    return score if position.player1_to_move else -score
+
+
+def load_weights(path):
+    # Weights saved by save_weights, e.g. by tuning.py, in FEATURES order.
+    with open(path) as infile:
+        data = json.load(infile)
+    return [data['weights'][feature] for feature in FEATURES]
+
+
+def save_weights(path, weights, **info):
+    with open(path, 'w') as outfile:
+        json.dump(dict(info, weights=dict(zip(FEATURES, weights))), outfile, indent=2)
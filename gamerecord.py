@@ -0,0 +1,291 @@
+import argparse
+import mmap
+import os
+import struct
+import time
+
+from bitboard import Position, format_move
+from engine import play_bitmove, position_from_game, set_position
+
+# A game record is a fixed header, the two player names, then one byte per
+# move: the index of the move in Position.generate_moves() for the position
+# it was played from. UNDO takes back the previous move and END, followed by
+# a result byte (the check_game_over status, 0 if unfinished), closes the
+# record. Move lists never get near UNDO/END in length, so a record's end is
+# the first END byte after its header. Archives are plain concatenations of
+# records; a journal is a single record that is still being appended to.
+MAGIC = b'CKR1'
+HEADER = struct.Struct('<4sBdQQQQHHHHBB')  # magic, flags, start time, bitboards, counters, name lengths
+FLAG_PLAYER1_TO_MOVE = 1
+UNDO = 0xFF
+END = 0xFE
+
+JOURNAL_FILE = 'saved_game.ckr'
+SYNC_EVERY = 8  # moves between fsyncs of the journal
+
+
+class RecordError(Exception):
+    pass
+
+
+class GameRecord:
+    def __init__(self, start=None, player1_name="Player 1", player2_name="Player 2", start_time=0.0,
+                 counters=(0, 0, 0, 0), data=b'', result=None):
+        # counters: captured pieces and moves made by each player before the first move.
+        self.start = start if start is not None else Position.initial()
+        self.player1_name = player1_name
+        self.player2_name = player2_name
+        self.start_time = start_time
+        self.counters = tuple(counters)
+        self.data = bytearray(data)
+        self.result = result
+
+    @classmethod
+    def from_game(cls, game):
+        return cls(position_from_game(game), game.player1.name, game.player2.name, game.start_time,
+                   (game.player1.captured_pieces, game.player2.captured_pieces,
+                    game.player1.moves_made, game.player2.moves_made))
+
+    def header_bytes(self):
+        player1_name = self.player1_name.encode()[:255]
+        player2_name = self.player2_name.encode()[:255]
+        start = self.start
+        header = HEADER.pack(MAGIC, FLAG_PLAYER1_TO_MOVE if start.player1_to_move else 0, self.start_time,
+                             start.player1_men, start.player1_kings, start.player2_men, start.player2_kings,
+                             *self.counters, len(player1_name), len(player2_name))
+        return header + player1_name + player2_name
+
+    def to_bytes(self):
+        return self.header_bytes() + bytes(self.data) + bytes((END, self.result or 0))
+
+    def append(self, index):
+        if index >= END:
+            raise RecordError(f"Move index {index} does not fit in a byte")
+        self.data.append(index)
+
+    def undo(self):
+        self.data.append(UNDO)
+
+    @property
+    def moves(self):
+        # Move indices left once undone moves are taken back.
+        moves = []
+        for byte in self.data:
+            if byte == UNDO:
+                if moves:
+                    moves.pop()
+            else:
+                moves.append(byte)
+        return moves
+
+    def __len__(self):
+        return len(self.moves)
+
+    def bitmoves(self):
+        # Yields (position, BitMove played from it) for every move in the game.
+        position = self.start.copy()
+        for index in self.moves:
+            moves = position.generate_moves()
+            if index >= len(moves):
+                raise RecordError(f"Move index {index} is not legal in {position.to_fen()}")
+            yield position.copy(), moves[index]
+            position.make(moves[index])
+
+    def positions(self):
+        # The start position followed by the position after every move.
+        position = self.start.copy()
+        yield position.copy()
+        for _, bitmove in self.bitmoves():
+            position.make(bitmove)
+            yield position.copy()
+
+    def position(self, ply):
+        for index, position in enumerate(self.positions()):
+            if index == ply:
+                return position
+        raise IndexError(f"Game has only {len(self)} moves")
+
+    def to_game(self, game):
+        # Rebuilds board, counters and move history by replaying the moves.
+        journal = game.journal
+        game.journal = None
+        set_position(game, self.start)
+        game.player1.name = self.player1_name
+        game.player2.name = self.player2_name
+        game.start_time = self.start_time
+        (game.player1.captured_pieces, game.player2.captured_pieces,
+         game.player1.moves_made, game.player2.moves_made) = self.counters
+        game.move_history = []
+        game.last_move = None
+        for _, bitmove in self.bitmoves():
+            play_bitmove(game, bitmove)
+        game.journal = journal
+
+
+def _parse_header(buffer, offset):
+    if len(buffer) - offset < HEADER.size:
+        raise RecordError(f"Truncated header at offset {offset}")
+    (magic, flags, start_time, player1_men, player1_kings, player2_men, player2_kings, captured1, captured2,
+     moves1, moves2, name1_length, name2_length) = HEADER.unpack_from(buffer, offset)
+    if magic != MAGIC:
+        raise RecordError(f"Not a game record at offset {offset}")
+    offset += HEADER.size
+    player1_name = bytes(buffer[offset:offset + name1_length]).decode()
+    offset += name1_length
+    player2_name = bytes(buffer[offset:offset + name2_length]).decode()
+    offset += name2_length
+    start = Position(player1_men, player1_kings, player2_men, player2_kings, bool(flags & FLAG_PLAYER1_TO_MOVE))
+    return GameRecord(start, player1_name, player2_name, start_time, (captured1, captured2, moves1, moves2)), offset
+
+
+def iter_records(buffer):
+    offset = 0
+    while offset < len(buffer):
+        record, offset = _parse_header(buffer, offset)
+        end = buffer.find(bytes((END,)), offset)
+        if end < 0:
+            # A journal whose game has not finished yet.
+            record.data = bytearray(buffer[offset:])
+            yield record
+            return
+        record.data = bytearray(buffer[offset:end])
+        record.result = buffer[end + 1] if end + 1 < len(buffer) else 0
+        offset = end + 2
+        yield record
+
+
+def read_records(path):
+    # Streams the records of a journal or archive through mmap, so scanning a
+    # large archive only touches the pages it reads.
+    with open(path, 'rb') as infile:
+        if os.fstat(infile.fileno()).st_size == 0:
+            return
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield from iter_records(buffer)
+
+
+def write_records(path, records, append=False):
+    with open(path, 'ab' if append else 'wb') as outfile:
+        for record in records:
+            outfile.write(record.to_bytes())
+
+
+class GameJournal:
+    # Appends the game being played to a record file as it happens. Writes
+    # are buffered and fsync'ed every sync_every moves, at the end of the game
+    # and on close, so a crash loses at most the last few moves. With
+    # keep_open=False the file is opened for each write and closed after it,
+    # so a process journalling many games at once holds no file descriptors
+    # between moves; what was written is then in the OS cache at once, and
+    # fsync'ed on the same schedule.
+    def __init__(self, path=JOURNAL_FILE, sync_every=SYNC_EVERY, keep_open=True):
+        self.path = path
+        self.sync_every = sync_every
+        self.keep_open = keep_open
+        self.file = None
+        self.active = False
+        self.unsynced = 0
+
+    def start(self, game, record=None):
+        # Starts a new record for game, or continues the unfinished record it
+        # was loaded from. Without a record the file is started afresh and
+        # whatever it held is dropped; after a loaded game that had already
+        # finished, that game is kept and the new record follows it.
+        self.close()
+        self.file = open(self.path, 'wb' if record is None else 'ab')
+        self.active = True
+        if record is None or record.result is not None:
+            self.file.write(GameRecord.from_game(game).header_bytes())
+            self.sync()
+        self._release()
+        game.journal = self
+
+    def record(self, game, bitmove):
+        # Called by apply_bitmove before the move changes the board.
+        moves = game.move_cache.moves(game, game.is_player1_turn)
+        self._write(bytes((moves.index(bitmove),)))
+
+    def undo(self):
+        self._write(bytes((UNDO,)))
+
+    def finish(self, result):
+        if self.active:
+            self._acquire()
+            self.file.write(bytes((END, result)))
+            self.close()
+
+    def _acquire(self):
+        if self.file is None:
+            self.file = open(self.path, 'ab')
+
+    def _release(self):
+        if not self.keep_open and self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _write(self, data):
+        if not self.active:
+            return
+        self._acquire()
+        self.file.write(data)
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every:
+            self.sync()
+        self._release()
+
+    def sync(self):
+        if not self.active:
+            return
+        if self.unsynced or self.file is not None:
+            self._acquire()
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self._release()
+        self.unsynced = 0
+
+    def close(self):
+        if self.active:
+            self.sync()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            self.active = False
+
+
+def load_journal(game, path=JOURNAL_FILE):
+    # Restores the last game in a journal file. Returns its record, or None.
+    try:
+        record = None
+        for record in read_records(path):
+            pass
+        if record is None:
+            return None
+        record.to_game(game)
+        return record
+    except (OSError, ValueError, RecordError) as e:
+        print(f"Error: Could not load the game. {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List or replay binary game records.")
+    parser.add_argument('path')
+    parser.add_argument('--moves', action='store_true', help="print the moves of every game")
+    parser.add_argument('--fen', type=int, metavar='PLY', help="print the position after PLY moves of every game")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    games = moves = 0
+    for record in read_records(args.path):
+        games += 1
+        moves += len(record)
+        if args.moves:
+            print(' '.join(format_move(bitmove) for _, bitmove in record.bitmoves()))
+        if args.fen is not None:
+            print(record.position(args.fen).to_fen())
+    elapsed = time.perf_counter() - start_time
+    print(f"{games} games, {moves} moves in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+from bitboard import Position
+
+# Draw rules: the same position with the same side to move for the third
+# time, or 40 moves by each side without a capture or a man moving.
+REPETITION_LIMIT = 3
+MOVE_LIMIT_PLIES = 80
+
+
+class GameStatus:
+    # Follows a game move by move and keeps what decides its end: the
+    # position as bitboards, piece counts, whether each side can move, how
+    # often each position has been reached and the plies since the last
+    # capture or man move. Push and pop update the counts from the move
+    # alone and recompute only whether each side can move, from the
+    # bitboards, so the status is always at hand without scanning the board.
+    def __init__(self, position=None):
+        self.reset(position if position is not None else Position.initial())
+
+    def reset(self, position):
+        self.position = position.copy()
+        self.pieces = [(position.player1_men | position.player1_kings).bit_count(),
+                       (position.player2_men | position.player2_kings).bit_count()]
+        self.repetitions = {position.hash: 1}
+        self.quiet_plies = [0]
+        self._update_mobility()
+
+    def _update_mobility(self):
+        position = self.position
+        self.mobility = [bool(self.pieces[0]) and position.with_side(True).has_moves(),
+                         bool(self.pieces[1]) and position.with_side(False).has_moves()]
+
+    def push(self, bitmove, player1=None):
+        # Plays bitmove for the side to move and returns the Position.make
+        # undo record that pop() takes back. player1, when given, is checked
+        # against the side to move, as a move out of turn could not be popped.
+        position = self.position
+        if player1 is not None and player1 != position.player1_to_move:
+            raise ValueError(f"Player {1 if player1 else 2} moved out of turn in {position.to_fen()}")
+        player1 = position.player1_to_move
+        man_moved = bitmove.start & (position.player1_men if player1 else position.player2_men)
+        undo = position.make(bitmove)
+        if bitmove.captured:
+            self.pieces[player1] -= bitmove.captured.bit_count()
+        self.quiet_plies.append(0 if bitmove.captured or man_moved else self.quiet_plies[-1] + 1)
+        self.repetitions[position.hash] = self.repetitions.get(position.hash, 0) + 1
+        self._update_mobility()
+        return undo
+
+    def pop(self, bitmove, undo):
+        position = self.position
+        count = self.repetitions[position.hash] - 1
+        if count:
+            self.repetitions[position.hash] = count
+        else:
+            del self.repetitions[position.hash]
+        self.quiet_plies.pop()
+        position.unmake(bitmove, undo)
+        if bitmove.captured:
+            self.pieces[position.player1_to_move] += bitmove.captured.bit_count()
+        self._update_mobility()
+
+    def has_moves(self, player1):
+        return self.mobility[not player1]
+
+    def repetition_draw(self):
+        return self.repetitions[self.position.hash] >= REPETITION_LIMIT
+
+    def move_limit_draw(self):
+        return self.quiet_plies[-1] >= MOVE_LIMIT_PLIES
+
+    def is_draw(self):
+        return self.repetition_draw() or self.move_limit_draw()
+
+    def result(self):
+        # check_game_over codes: 1 or 2 when that player has won because the
+        # side to move cannot move, 3 for a draw, 0 while the game goes on.
+        if not self.has_moves(self.position.player1_to_move):
+            return 2 if self.position.player1_to_move else 1
+        if self.is_draw():
+            return 3
+        return 0
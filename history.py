@@ -0,0 +1,65 @@
+from bitboard import VALID
+
+# One step of a game's history is (BitMove, undo) with undo the record
+# Position.make returns for the search: previous hash << 36 | captured kings
+# << 1 | promoted. Together with the move that is all a step changed: the
+# captured squares and which of them held kings, whether the man that moved
+# was crowned, and the hash to go back to. The counters follow from the
+# move itself (one move made by the mover, one captured piece per captured
+# square), so taking back or replaying a step never looks at more than the
+# squares it touched.
+PROMOTED = 1
+
+
+def undo_hash(undo):
+    return undo >> 36
+
+
+def undo_captured_kings(undo):
+    return (undo >> 1) & VALID
+
+
+def undo_promoted(undo):
+    return bool(undo & PROMOTED)
+
+
+class History:
+    def __init__(self):
+        self.steps = []  # every step played, including taken back ones that can still be redone
+        self.ply = 0  # steps[:ply] are on the board
+
+    def clear(self):
+        self.steps = []
+        self.ply = 0
+
+    def __len__(self):
+        return len(self.steps)
+
+    def can_undo(self):
+        return self.ply > 0
+
+    def can_redo(self):
+        return self.ply < len(self.steps)
+
+    def push(self, bitmove, undo):
+        # Playing the step that would be redone keeps the steps after it;
+        # any other move starts a new line and drops them.
+        step = (bitmove, undo)
+        if self.ply < len(self.steps):
+            if self.steps[self.ply] == step:
+                self.ply += 1
+                return
+            del self.steps[self.ply:]
+        self.steps.append(step)
+        self.ply += 1
+
+    def pop(self):
+        self.ply -= 1
+        return self.steps[self.ply]
+
+    def next(self):
+        return self.steps[self.ply]
+
+    def line(self):
+        # The (BitMove, undo) pairs on the board, oldest first, as Position.unmake takes them.
+        return self.steps[:self.ply]
@@ -0,0 +1,208 @@
+import argparse
+import heapq
+import mmap
+import multiprocessing
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+
+from bitboard import Position, format_move
+from pdn import iter_games
+
+# An opening book is a header followed by fixed-size entries sorted by
+# position hash and move: the Zobrist hash, the index of the move in
+# Position.generate_moves(), the number of games that played it and the
+# half-points those games scored for the side that played it. Lookups
+# binary search the mmapped file, so a book of any size costs no memory.
+MAGIC = b'CKB1'
+HEADER_SIZE = 8
+ENTRY = struct.Struct('<QB3xII')
+OPENING_BOOK_FILE = 'opening_book.bin'
+BOOK_PLIES = 16
+MIN_GAMES = 2
+
+# How strongly each difficulty prefers moves that scored well: a move's
+# weight is its game count times its score fraction to this power. HARD
+# also ignores moves played in fewer than MIN_GAMES games.
+SCORE_POWERS = {'EASY': 0, 'MEDIUM': 1, 'HARD': 4}
+
+
+class OpeningBook:
+    def __init__(self, path=OPENING_BOOK_FILE):
+        self.path = path
+        self.file = None
+        self.data = None
+        self.entries = 0
+        if os.path.exists(path) and os.path.getsize(path) > HEADER_SIZE:
+            self.file = open(path, 'rb')
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.data[:4] != MAGIC:
+                raise ValueError(f"{path} is not an opening book")
+            self.entries = (len(self.data) - HEADER_SIZE) // ENTRY.size
+
+    def __len__(self):
+        return self.entries
+
+    def _hash_at(self, index):
+        return struct.unpack_from('<Q', self.data, HEADER_SIZE + index * ENTRY.size)[0]
+
+    def lookup(self, position):
+        # [(BitMove, games, score fraction)] for the position, most played first.
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) // 2
+            if self._hash_at(middle) < position.hash:
+                low = middle + 1
+            else:
+                high = middle
+        moves = position.generate_moves()
+        found = []
+        for index in range(low, self.entries):
+            key, move_index, games, half_points = ENTRY.unpack_from(self.data, HEADER_SIZE + index * ENTRY.size)
+            if key != position.hash:
+                break
+            if move_index < len(moves):
+                found.append((moves[move_index], games, half_points / (2 * games)))
+        found.sort(key=lambda entry: entry[1], reverse=True)
+        return found
+
+    def choose(self, position, difficulty_name, rng=random):
+        power = SCORE_POWERS.get(difficulty_name, 1)
+        candidates = self.lookup(position)
+        if difficulty_name == 'HARD':
+            candidates = [entry for entry in candidates if entry[1] >= MIN_GAMES]
+        weights = [games * score ** power for _, games, score in candidates]
+        if not candidates or not any(weights):
+            return None
+        return rng.choices([move for move, _, _ in candidates], weights)[0]
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.file.close()
+            self.data = self.file = None
+
+
+def write_book(path, entries):
+    # entries: (hash, move index, games, half points), already sorted.
+    count = 0
+    with open(path + '.tmp', 'wb') as outfile:
+        outfile.write(MAGIC + bytes(HEADER_SIZE - len(MAGIC)))
+        for entry in entries:
+            outfile.write(ENTRY.pack(*entry))
+            count += 1
+    os.replace(path + '.tmp', path)
+    return count
+
+
+def read_book(path):
+    with open(path, 'rb') as infile:
+        if infile.read(HEADER_SIZE)[:4] != MAGIC:
+            raise ValueError(f"{path} is not an opening book")
+        while True:
+            data = infile.read(ENTRY.size * 4096)
+            if not data:
+                break
+            yield from ENTRY.iter_unpack(data)
+
+
+def merge_entries(sources, min_games=1):
+    # Merges sorted entry streams, adding up the statistics of equal moves.
+    current = None
+    for key, move_index, games, half_points in heapq.merge(*sources):
+        if current is not None and current[0] == key and current[1] == move_index:
+            current[2] += games
+            current[3] += half_points
+            continue
+        if current is not None and current[2] >= min_games:
+            yield tuple(current)
+        current = [key, move_index, games, half_points]
+    if current is not None and current[2] >= min_games:
+        yield tuple(current)
+
+
+def merge_books(paths, output, min_games=1):
+    return write_book(output, merge_entries([read_book(path) for path in paths], min_games))
+
+
+def _build_partial(task):
+    # Worker entry point: statistics for every workers-th game of the input, as a partial book.
+    paths, worker, workers, plies, directory = task
+    stats = {}
+    for _, record in iter_games(paths, worker, workers):
+        if not record.result:
+            continue
+        for ply, (position, bitmove) in enumerate(record.bitmoves()):
+            if ply >= plies:
+                break
+            if record.result == 3:
+                half_points = 1
+            else:
+                half_points = 2 if (record.result == 1) == position.player1_to_move else 0
+            key = (position.hash, position.generate_moves().index(bitmove))
+            entry = stats.get(key)
+            if entry is None:
+                stats[key] = [1, half_points]
+            else:
+                entry[0] += 1
+                entry[1] += half_points
+    fd, partial = tempfile.mkstemp(suffix='.bin', dir=directory)
+    os.close(fd)
+    write_book(partial, (key + tuple(value) for key, value in sorted(stats.items())))
+    return partial
+
+
+def build_book(paths, output=OPENING_BOOK_FILE, plies=BOOK_PLIES, min_games=MIN_GAMES, processes=None):
+    # Games with an unknown result are skipped. Each worker builds a partial
+    # book from a share of the games, and the partial books are merged.
+    processes = processes or os.cpu_count()
+    directory = os.path.dirname(os.path.abspath(output))
+    tasks = [(paths, worker, processes, plies, directory) for worker in range(processes)]
+    with multiprocessing.Pool(processes) as pool:
+        partials = pool.map(_build_partial, tasks)
+    try:
+        return merge_books(partials, output, min_games)
+    finally:
+        for partial in partials:
+            os.remove(partial)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, merge or query an opening book.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="build a book from game records and PDN files")
+    build_parser.add_argument('games', nargs='+')
+    build_parser.add_argument('--output', default=OPENING_BOOK_FILE)
+    build_parser.add_argument('--plies', type=int, default=BOOK_PLIES, help="opening plies taken from each game")
+    build_parser.add_argument('--min-games', type=int, default=MIN_GAMES, help="drop moves played less often")
+    build_parser.add_argument('--processes', type=int, default=None, help="worker processes (default: all cores)")
+    merge_parser = subparsers.add_parser('merge', help="merge books into one")
+    merge_parser.add_argument('books', nargs='+')
+    merge_parser.add_argument('--output', default=OPENING_BOOK_FILE)
+    probe_parser = subparsers.add_parser('probe', help="list the book moves of a position")
+    probe_parser.add_argument('fen', nargs='?', help="position (default: the start position)")
+    probe_parser.add_argument('--book', default=OPENING_BOOK_FILE)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    if args.command == 'build':
+        entries = build_book(args.games, args.output, args.plies, args.min_games, args.processes)
+        print(f"{entries} book moves written to {args.output} in {time.perf_counter() - start_time:.1f}s")
+    elif args.command == 'merge':
+        entries = merge_books(args.books, args.output)
+        print(f"{entries} book moves written to {args.output} in {time.perf_counter() - start_time:.1f}s")
+    else:
+        book = OpeningBook(args.book)
+        position = Position.from_fen(args.fen) if args.fen else Position.initial()
+        moves = book.lookup(position)
+        if not moves:
+            print("not in the book", file=sys.stderr)
+        for move, games, score in moves:
+            print(f"{format_move(move):8s} {games:8d} games  {score:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+import argparse
+import itertools
+import multiprocessing
+import re
+import sys
+import time
+
+from bitboard import MASK_TO_ROWCOL, ROWCOL_TO_MASK, SQUARE_MASKS, Position, mask_to_square
+from engine import Game, load_game
+from gamerecord import GameRecord, read_records
+
+# Portable Draughts Notation for English draughts (GameType 21). Squares are
+# numbered 1-32 with Black on 1-12 and White on 21-32. Standard PDN has Black
+# move first, which is the default start position below; games from this
+# project start with White (Player 1) to move, so they are written with a FEN
+# tag. Results are given from White's side: "2-0"/"1-0" White (Player 1) wins.
+DEFAULT_FEN = 'B:W21-32:B1-12'
+RESULTS = {
+    '2-0': 1, '1-0': 1,
+    '0-2': 2, '0-1': 2,
+    '1-1': 3, '1/2-1/2': 3,
+    '*': 0, '0-0': 0,
+}
+RESULT_TEXT = {1: '2-0', 2: '0-2', 3: '1-1', 0: '*'}
+TAG_ORDER = ['Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result', 'GameType', 'FEN']
+
+TAG_RE = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN_RE = re.compile(r'\{[^}]*\}|1/2-1/2|[012]-[012](?![-x\d])|\d+(?:[-x]\d+)+|\d+\.(?:\.\.)?|\$\d+|\*|[()]|[!?]+|\S+')
+
+BATCH_GAMES = 200  # games per task sent to a worker process
+
+
+class PDNError(Exception):
+    pass
+
+
+class PDNGame:
+    def __init__(self, tags=None, moves=None, result=0):
+        self.tags = tags if tags is not None else {}
+        self.moves = moves if moves is not None else []  # move strings, e.g. "22-18" or "15x22x31"
+        self.result = result
+
+    def start_position(self):
+        return Position.from_fen(self.tags.get('FEN', DEFAULT_FEN))
+
+    def bitmoves(self):
+        # Yields (position, BitMove) for every move, checking each against the
+        # legal moves of the position it is played from.
+        position = self.start_position()
+        for number, text in enumerate(self.moves):
+            bitmove = parse_move(position, text)
+            if bitmove is None:
+                raise PDNError(f"Illegal move {text} (ply {number + 1}) in {position.to_fen()}")
+            yield position.copy(), bitmove
+            position.make(bitmove)
+
+    def positions(self):
+        position = self.start_position()
+        yield position.copy()
+        for _, bitmove in self.bitmoves():
+            position.make(bitmove)
+            yield position.copy()
+
+    def to_record(self):
+        record = GameRecord(self.start_position(), self.tags.get('White', "Player 1"),
+                            self.tags.get('Black', "Player 2"), result=self.result)
+        for position, bitmove in self.bitmoves():
+            record.append(position.generate_moves().index(bitmove))
+        return record
+
+    @classmethod
+    def from_record(cls, record, tags=None):
+        game = cls(dict(tags or {}), result=record.result or 0)
+        game.tags.setdefault('White', record.player1_name)
+        game.tags.setdefault('Black', record.player2_name)
+        game.tags.setdefault('GameType', '21')
+        if record.start != Position.from_fen(DEFAULT_FEN):
+            game.tags['FEN'] = record.start.to_fen()
+        game.moves = [format_pdn_move(position, bitmove) for position, bitmove in record.bitmoves()]
+        return game
+
+
+def _midpoint(square_a, square_b):
+    row_a, col_a = MASK_TO_ROWCOL[SQUARE_MASKS[square_a - 1]]
+    row_b, col_b = MASK_TO_ROWCOL[SQUARE_MASKS[square_b - 1]]
+    if abs(row_a - row_b) != 2 or abs(col_a - col_b) != 2:
+        return None
+    return ROWCOL_TO_MASK[((row_a + row_b) // 2, (col_a + col_b) // 2)]
+
+
+def parse_move(position, text):
+    # Matches "a-b", "axb" or a full jump path "axbxc" against the legal moves.
+    # Returns None for an illegal move; a short capture that more than one
+    # legal capture matches raises PDNError, as its path has to be given.
+    squares = [int(square) for square in re.split('[-x]', text)]
+    if any(not 1 <= square <= 32 for square in squares):
+        return None
+    start, end = SQUARE_MASKS[squares[0] - 1], SQUARE_MASKS[squares[-1] - 1]
+    candidates = [move for move in position.generate_moves() if move.start == start and move.end == end]
+    if len(candidates) > 1 and len(squares) > 2:
+        captured = 0
+        for square_a, square_b in zip(squares, squares[1:]):
+            captured |= _midpoint(square_a, square_b) or 0
+        candidates = [move for move in candidates if move.captured == captured]
+    if len(candidates) > 1:
+        raise PDNError(f"Ambiguous move {text} in {position.to_fen()}: give its full jump path")
+    return candidates[0] if candidates else None
+
+
+def _jump_path(start, end, captured):
+    # Landing squares of a capture, found by walking over the captured pieces.
+    def walk(square, remaining, path):
+        if not remaining:
+            return path if square == end else None
+        row, col = MASK_TO_ROWCOL[square]
+        for row_step, col_step in ((-1, -1), (-1, 1), (1, -1), (1, 1)):
+            middle = ROWCOL_TO_MASK.get((row + row_step, col + col_step))
+            landing = ROWCOL_TO_MASK.get((row + 2 * row_step, col + 2 * col_step))
+            if middle is not None and landing is not None and middle & remaining:
+                found = walk(landing, remaining ^ middle, path + [landing])
+                if found:
+                    return found
+        return None
+
+    return walk(start, captured, [start])
+
+
+def format_pdn_move(position, bitmove):
+    # Short form unless another capture shares the same start and end squares.
+    if not bitmove.captured:
+        return f"{mask_to_square(bitmove.start) + 1}-{mask_to_square(bitmove.end) + 1}"
+    ambiguous = sum(move.start == bitmove.start and move.end == bitmove.end for move in position.generate_moves()) > 1
+    path = _jump_path(bitmove.start, bitmove.end, bitmove.captured) if ambiguous else [bitmove.start, bitmove.end]
+    return 'x'.join(str(mask_to_square(square) + 1) for square in path)
+
+
+def iter_game_texts(lines):
+    # Splits a PDN stream into the text of each game without parsing it, so
+    # memory use stays bounded by the longest game.
+    chunk = []
+    seen_moves = False
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith('[') and seen_moves:
+            yield ''.join(chunk)
+            chunk = []
+            seen_moves = False
+        if stripped and not stripped.startswith('['):
+            seen_moves = True
+        chunk.append(line)
+    if any(line.strip() for line in chunk):
+        yield ''.join(chunk)
+
+
+def parse_game(text):
+    tags = {}
+    for name, value in TAG_RE.findall(text):
+        tags[name] = value.replace('\\"', '"')
+    movetext = TAG_RE.sub(' ', text)
+    moves = []
+    result = RESULTS.get(tags.get('Result'), 0)
+    depth = 0  # variation nesting
+    for token in TOKEN_RE.findall(movetext):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth or token.startswith('{') or token.startswith('$') or token[0] in '!?' or token.endswith('.'):
+            continue
+        elif token in RESULTS:
+            result = RESULTS[token]
+        elif token[0].isdigit() and ('-' in token or 'x' in token):
+            moves.append(token)
+        else:
+            raise PDNError(f"Unexpected token {token!r}")
+    return PDNGame(tags, moves, result)
+
+
+def read_games(lines):
+    for text in iter_game_texts(lines):
+        yield parse_game(text)
+
+
+def read_pdn(path):
+    with open(path, encoding='utf-8', errors='replace') as infile:
+        yield from read_games(infile)
+
+
+def format_game(game, line_length=80):
+    tags = dict(game.tags)
+    tags['Result'] = RESULT_TEXT[game.result]
+    names = [name for name in TAG_ORDER if name in tags] + [name for name in tags if name not in TAG_ORDER]
+    lines = ['[{} "{}"]'.format(name, str(tags[name]).replace('"', '\\"')) for name in names]
+    lines.append('')
+
+    # Move numbers count full moves from the side that moved first.
+    tokens = []
+    for ply, move in enumerate(game.moves):
+        if ply % 2 == 0:
+            tokens.append(f"{ply // 2 + 1}.")
+        tokens.append(move)
+    tokens.append(RESULT_TEXT[game.result])
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > line_length:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+
+def write_pdn(outfile, games):
+    for game in games:
+        outfile.write(format_game(game))
+
+
+def iter_games(paths, worker=0, workers=1):
+    # Yields (game id, GameRecord) from record archives or journals, PDN files
+    # and saved_game.txt snapshots, which hold a single position. With
+    # workers > 1 only every workers-th game from worker on is yielded, and
+    # the others are skipped before they are parsed, so processes sharing
+    # the input each parse only their own games.
+    index = 0
+    for path in paths:
+        if path.endswith('.pdn'):
+            with open(path, encoding='utf-8', errors='replace') as infile:
+                for number, text in enumerate(iter_game_texts(infile)):
+                    index += 1
+                    if (index - 1) % workers != worker:
+                        continue
+                    try:
+                        yield f"{path}:{number}", parse_game(text).to_record()
+                    except (PDNError, ValueError) as e:
+                        print(f"{path}:{number}: skipped: {e}", file=sys.stderr)
+        elif path.endswith('.txt'):
+            index += 1
+            if (index - 1) % workers != worker:
+                continue
+            game = Game()
+            if load_game(game, path):
+                yield path, GameRecord.from_game(game)
+        else:
+            for number, record in enumerate(read_records(path)):
+                index += 1
+                if (index - 1) % workers == worker:
+                    yield f"{path}:{number}", record
+
+
+def _convert_batch(texts):
+    # Worker entry point: PDN game texts to concatenated record bytes.
+    data = bytearray()
+    errors = []
+    for text in texts:
+        try:
+            data += parse_game(text).to_record().to_bytes()
+        except (PDNError, ValueError) as e:
+            errors.append(str(e))
+    return len(texts) - len(errors), bytes(data), errors
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def convert_pdn(input_path, output_path, processes=1, report=None):
+    # Converts a PDN file to a game record archive, validating every move.
+    # With processes > 1 batches of games are parsed in a pool, a bounded
+    # number at a time so memory stays flat however large the input.
+    games = 0
+    errors = []
+    start_time = time.perf_counter()
+    with open(input_path, encoding='utf-8', errors='replace') as infile, open(output_path, 'wb') as outfile:
+        batches = _batches(iter_game_texts(infile), BATCH_GAMES)
+        if processes > 1:
+            pool = multiprocessing.Pool(processes)
+            results = itertools.chain.from_iterable(pool.imap(_convert_batch, window)
+                                                    for window in _batches(batches, processes * 4))
+        else:
+            pool = None
+            results = map(_convert_batch, batches)
+        try:
+            for count, data, batch_errors in results:
+                outfile.write(data)
+                games += count
+                errors += batch_errors
+                if report:
+                    report(games, time.perf_counter() - start_time)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+    elapsed = time.perf_counter() - start_time
+    return {'games': games, 'errors': errors, 'seconds': elapsed,
+            'games_per_second': games / elapsed if elapsed > 0 else 0.0}
+
+
+def export_records(input_path, outfile):
+    games = 0
+    for record in read_records(input_path):
+        write_pdn(outfile, [PDNGame.from_record(record)])
+        games += 1
+    return games
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between PDN files and binary game records.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    to_records = subparsers.add_parser('import', help="validate a PDN file and write a game record archive")
+    to_records.add_argument('input')
+    to_records.add_argument('output')
+    to_records.add_argument('--processes', type=int, default=1)
+    to_pdn = subparsers.add_parser('export', help="write a game record archive or journal as PDN")
+    to_pdn.add_argument('input')
+    to_pdn.add_argument('output', nargs='?', help="PDN file (default: stdout)")
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        def report(games, elapsed):
+            print(f"\r{games} games  {games / elapsed if elapsed > 0 else 0:.0f} games/s", end='', file=sys.stderr)
+
+        summary = convert_pdn(args.input, args.output, args.processes, report)
+        print(file=sys.stderr)
+        for error in summary['errors'][:20]:
+            print(f"skipped: {error}", file=sys.stderr)
+        print(f"{summary['games']} games converted, {len(summary['errors'])} skipped in {summary['seconds']:.2f}s "
+              f"({summary['games_per_second']:.0f} games/s)")
+    else:
+        start_time = time.perf_counter()
+        if args.output:
+            with open(args.output, 'w') as outfile:
+                games = export_records(args.input, outfile)
+        else:
+            games = export_records(args.input, sys.stdout)
+        elapsed = time.perf_counter() - start_time
+        print(f"{games} games exported in {elapsed:.2f}s ({games / elapsed if elapsed > 0 else 0:.0f} games/s)",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import sys
+import time
+
+from bitboard import Position, format_move
+
+# (name, FEN, leaf counts for depth 1, 2, ...). The start position counts are
+# the published English draughts figures; the others were cross-checked
+# against an independent square-by-square move generator.
+PERFT_POSITIONS = [
+    ('start', 'W:W21-32:B1-12',
+     [7, 49, 302, 1469, 7361, 36768, 179740, 845931]),
+    ('multi_jump', 'W:W25,27,30,32:B1,2,3,9,11,18,19,26',
+     [2, 11, 48, 266, 1075, 5949, 23333, 127622]),
+    ('promotion_capture', 'W:W11,15,K29:B5,6,7,8,10,12',
+     [2, 2, 3, 17, 71, 501, 1813, 12661]),
+    ('king_capture_cycle', 'W:WK10,29,31:B1,2,3,14,15,22,23',
+     [1, 6, 28, 97, 482, 1971, 10079, 42582]),
+    ('kings_endgame', 'B:WK22,24,K31:B7,K5,K14',
+     [8, 50, 292, 1899, 12272, 83288, 520854, 3415761]),
+    ('midgame_1', 'W:W18,19,22,24,27,29,32:B1,4,5,6,8,11,12,13',
+     [9, 45, 228, 902, 3838, 15058, 61653, 246083]),
+    ('midgame_2', 'W:W15,23,25,26,27,28,29,31:B1,4,5,7,13,16',
+     [9, 58, 325, 1892, 9992, 51550, 264936, 1253211]),
+]
+
+
+def perft(position, depth):
+    if depth == 0:
+        return 1
+    moves = position.generate_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        undo = position.make(move)
+        nodes += perft(position, depth - 1)
+        position.unmake(move, undo)
+    return nodes
+
+
+def divide(position, depth):
+    counts = []
+    for move in position.generate_moves():
+        undo = position.make(move)
+        counts.append((format_move(move), perft(position, depth - 1)))
+        position.unmake(move, undo)
+    return counts
+
+
+def run_perft(depth, names=None, report=None):
+    results = []
+    for name, fen, expected_counts in PERFT_POSITIONS:
+        if names and name not in names:
+            continue
+        position = Position.from_fen(fen)
+        position_depth = min(depth, len(expected_counts))
+        start_time = time.perf_counter()
+        nodes = perft(position, position_depth)
+        elapsed = time.perf_counter() - start_time
+        expected = expected_counts[position_depth - 1]
+        result = {
+            'name': name,
+            'depth': position_depth,
+            'nodes': nodes,
+            'expected': expected,
+            'ok': nodes == expected,
+            'seconds': elapsed,
+            'nps': int(nodes / elapsed) if elapsed > 0 else nodes,
+        }
+        results.append(result)
+        if report:
+            report(result)
+    return results
+
+
+def print_result(result):
+    status = 'ok' if result['ok'] else f"MISMATCH (expected {result['expected']})"
+    print(f"{result['name']:20s} depth {result['depth']}  nodes {result['nodes']:9d}  "
+          f"{result['seconds']:7.3f}s  {result['nps']:9d} nps  {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count move generator leaf nodes and check them against reference values.")
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--position', action='append', help="only run the named position (repeatable)")
+    parser.add_argument('--fen', help="run perft (or --divide) on this position instead of the corpus")
+    parser.add_argument('--divide', action='store_true', help="print the count below each root move")
+    args = parser.parse_args()
+
+    if args.fen:
+        position = Position.from_fen(args.fen)
+        if args.divide:
+            for move, count in divide(position, args.depth):
+                print(f"{move:8s} {count}")
+        start_time = time.perf_counter()
+        nodes = perft(position, args.depth)
+        elapsed = time.perf_counter() - start_time
+        print(f"nodes {nodes}  {elapsed:.3f}s  {int(nodes / elapsed) if elapsed > 0 else nodes} nps")
+        return
+
+    results = run_perft(args.depth, args.position, print_result)
+    nodes = sum(result['nodes'] for result in results)
+    elapsed = sum(result['seconds'] for result in results)
+    print(f"total nodes {nodes}  {elapsed:.3f}s  {int(nodes / elapsed) if elapsed > 0 else nodes} nps")
+    if not all(result['ok'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
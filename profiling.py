@@ -0,0 +1,167 @@
+import csv
+import functools
+import json
+import math
+import os
+import sys
+import time
+
+import engine
+
+# Opt-in instrumentation of the rules hot paths and the drawing code. enable()
+# swaps each function for a timing wrapper wherever a loaded module refers
+# to it, and disable() puts the originals back, so when profiling is off
+# nothing is wrapped and nothing is paid. The bitboard move generator and
+# MoveCache do the work the old validate_multiple_capture did, so the move
+# lookups that reach them (find_bitmove, can_capture, get_valid_moves) are
+# timed in its place.
+HOT_PATHS = ['is_move_valid', 'find_bitmove', 'can_capture', 'find_captures', 'get_valid_moves', 'has_any_moves',
+             'check_game_over', 'ai_move', 'apply_bitmove', 'undo_move']
+DRAW_FUNCTIONS = ['draw_main_menu', 'draw_settings_menu']
+DUMP_INTERVAL = 5.0
+OVERLAY_REFRESH = 1.0  # seconds between overlay updates
+OVERLAY_FONT_SIZE = 20
+
+
+class Profiler:
+    def __init__(self, path=None, interval=DUMP_INTERVAL):
+        # path: periodic dump file, CSV if it ends in .csv and JSON otherwise.
+        self.path = path
+        self.interval = interval
+        self.timings = {}  # name -> [calls, seconds, last seconds, max seconds]
+        self.patched = []
+        self.visible = False
+        self.overlay_rect = None
+        self.start_time = time.perf_counter()
+        self.next_dump = self.start_time + interval
+        self.next_refresh = self.start_time
+
+    def _wrap(self, name, function):
+        timing = self.timings.setdefault(name, [0, 0.0, 0.0, 0.0])
+        perf_counter = time.perf_counter
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                timing[0] += 1
+                timing[1] += elapsed
+                timing[2] = elapsed
+                if elapsed > timing[3]:
+                    timing[3] = elapsed
+        return wrapper
+
+    def _patch(self, owner, name, original, label):
+        wrapper = self._wrap(label, original)
+        for module in list(sys.modules.values()):
+            if getattr(module, name, None) is original:
+                setattr(module, name, wrapper)
+                self.patched.append((module, name, original))
+        if owner is not None and getattr(owner, name, None) is original:
+            setattr(owner, name, wrapper)
+            self.patched.append((owner, name, original))
+
+    def enable(self, renderer_class=None):
+        for name in HOT_PATHS:
+            self._patch(None, name, getattr(engine, name), name)
+        for module in list(sys.modules.values()):
+            for name in DRAW_FUNCTIONS:
+                function = getattr(module, name, None)
+                if callable(function) and name not in self.timings:
+                    self._patch(None, name, function, name)
+        if renderer_class is not None:
+            self._patch(renderer_class, 'draw', renderer_class.draw, 'Renderer.draw')
+
+    def disable(self):
+        for owner, name, original in reversed(self.patched):
+            setattr(owner, name, original)
+        self.patched = []
+
+    def reset(self):
+        for timing in self.timings.values():
+            timing[:] = [0, 0.0, 0.0, 0.0]
+
+    def snapshot(self, game=None):
+        functions = {name: {'calls': calls, 'total_ms': 1000 * seconds, 'mean_us': 1e6 * seconds / calls if calls else 0.0,
+                            'max_ms': 1000 * longest}
+                     for name, (calls, seconds, _, longest) in self.timings.items()}
+        draw = self.timings.get('Renderer.draw', [0, 0.0, 0.0, 0.0])
+        snapshot = {
+            'time': round(time.perf_counter() - self.start_time, 3),
+            'functions': functions,
+            'frame_ms': 1000 * draw[2],
+            'mean_frame_ms': 1000 * draw[1] / draw[0] if draw[0] else 0.0,
+            'nps': 0,
+            'move_cache_hit_rate': 0.0,
+            'tt_hit_rate': engine.transposition_table().stats()['hit_rate'] if engine._transposition_table is not None else 0.0,
+        }
+        if game is not None:
+            snapshot['nps'] = game.last_search.nps if game.last_search is not None else 0
+            snapshot['move_cache_hit_rate'] = game.move_cache.hit_rate()
+        return snapshot
+
+    def dump(self, game=None):
+        snapshot = self.snapshot(game)
+        if self.path.endswith('.csv'):
+            # One row per dump: the totals, then calls and total milliseconds per function.
+            row = {key: value for key, value in snapshot.items() if key != 'functions'}
+            for name, timing in sorted(snapshot['functions'].items()):
+                row[f'{name}_calls'] = timing['calls']
+                row[f'{name}_ms'] = round(timing['total_ms'], 3)
+            new_file = not os.path.exists(self.path)
+            with open(self.path, 'a', newline='') as outfile:
+                writer = csv.DictWriter(outfile, fieldnames=list(row))
+                if new_file:
+                    writer.writeheader()
+                writer.writerow(row)
+        else:
+            with open(self.path + '.tmp', 'w') as outfile:
+                json.dump(snapshot, outfile, indent=2)
+            os.replace(self.path + '.tmp', self.path)
+
+    def tick(self, game=None):
+        # Called once per loop iteration; dumps when the interval has passed.
+        if self.path and time.perf_counter() >= self.next_dump:
+            self.dump(game)
+            self.next_dump = time.perf_counter() + self.interval
+
+    def wait_ms(self):
+        # Milliseconds until the next dump or overlay refresh is due, or None.
+        due = [self.next_dump] if self.path else []
+        if self.visible:
+            due.append(self.next_refresh)
+        if not due:
+            return None
+        return max(0, math.ceil((min(due) - time.perf_counter()) * 1000))
+
+    def lines(self, game=None):
+        snapshot = self.snapshot(game)
+        lines = [f"frame {snapshot['frame_ms']:.2f} ms (mean {snapshot['mean_frame_ms']:.2f})",
+                 f"search {snapshot['nps']:,} nodes/s",
+                 f"move cache {snapshot['move_cache_hit_rate']:.0%}  tt {snapshot['tt_hit_rate']:.0%}"]
+        for name, timing in sorted(snapshot['functions'].items(), key=lambda item: -item[1]['total_ms']):
+            if timing['calls']:
+                lines.append(f"{name} {timing['calls']}x {timing['mean_us']:.0f} us")
+        return lines
+
+    def draw_overlay(self, renderer, game=None):
+        # Drawn over the frame the renderer just drew. Before the next frame
+        # the caller passes overlay_rect to Renderer.invalidate_rect so the
+        # squares under the panel are repainted.
+        import pygame  # the rest of the module works without it, e.g. from headless tools
+
+        surfaces = [renderer.text(line, (255, 255, 255), OVERLAY_FONT_SIZE) for line in self.lines(game)]
+        width = max(surface.get_width() for surface in surfaces) + 12
+        height = sum(surface.get_height() + 2 for surface in surfaces) + 10
+        panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 180))
+        y = 5
+        for surface in surfaces:
+            panel.blit(surface, (6, y))
+            y += surface.get_height() + 2
+        self.overlay_rect = renderer.screen.blit(panel, (4, 4))
+        pygame.display.update(self.overlay_rect)
+        self.next_refresh = time.perf_counter() + OVERLAY_REFRESH
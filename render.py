@@ -0,0 +1,257 @@
+import time
+
+import pygame
+
+from engine import CellType, get_valid_moves
+
+# Constants
+CELL_SIZE = 80
+BOARD_WIDTH = (CELL_SIZE * 8) + 200
+BOARD_HEIGHT = CELL_SIZE * 8
+QORKI_SIZE = 30
+
+# Colors
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+BLUE = (0, 0, 255)
+GRAY = (128, 128, 128)
+LIGHTGRAY = (211, 211, 211)
+GREEN = (0, 255, 0)
+ORANGE = (255, 165, 0)
+GOLD = (255, 215, 0)
+DARKPURPLE = (48, 25, 52)
+
+# Images, loaded when a Renderer is created so importing this module needs no file or display
+CROWN_FILE = 'crown.png'
+
+SIDEBAR_RECT = pygame.Rect(CELL_SIZE * 8, 0, BOARD_WIDTH - CELL_SIZE * 8, BOARD_HEIGHT)
+SCOREBOARD_X = BOARD_WIDTH - 180
+TEXT_CACHE_SIZE = 256
+
+
+class Renderer:
+    # Draws the game screen from cached surfaces and only pushes the parts
+    # that changed since the last frame to the display.
+    #
+    # The board background and one sprite per piece type are rendered once.
+    # Each frame, every square is reduced to a small state tuple (piece,
+    # last-move border, move-hint border) and only squares whose tuple changed
+    # are repainted. The sidebar is repainted only when its text changes,
+    # which for the timer means once a second. Text surfaces are cached by
+    # (text, colour, size). With full_redraw=True every frame is repainted and
+    # flipped, which is how the old renderer behaved and is kept to compare.
+    def __init__(self, screen, full_redraw=False):
+        self.screen = screen
+        self.full_redraw = full_redraw
+        self.fonts = {}
+        self.text_cache = {}
+        self.crown_img = pygame.transform.scale(pygame.image.load(CROWN_FILE), (QORKI_SIZE, QORKI_SIZE))
+        self.board_surface = self._render_board()
+        self.sprites = self._render_sprites()
+        self.square_states = {}
+        self.sidebar_state = None
+        self.overlay_state = None
+        self.hint_key = None
+        self.hints = {}
+        self.frames = 0
+        self.frame_time = 0.0
+        self.pixels_updated = 0
+
+    def invalidate(self):
+        self.square_states = {}
+        self.sidebar_state = None
+        self.overlay_state = None
+
+    def invalidate_rect(self, rect):
+        # Repaints whatever lies under rect on the next draw, e.g. after something was drawn over it.
+        for row in range(8):
+            for col in range(8):
+                if rect.colliderect((col * CELL_SIZE, row * CELL_SIZE, CELL_SIZE, CELL_SIZE)):
+                    self.square_states.pop((row, col), None)
+        if rect.colliderect(SIDEBAR_RECT):
+            self.sidebar_state = None
+
+    def stats(self):
+        frames = max(self.frames, 1)
+        return {
+            'frames': self.frames,
+            'ms_per_frame': 1000 * self.frame_time / frames,
+            'pixels_per_frame': self.pixels_updated / frames,
+            'cached_texts': len(self.text_cache),
+        }
+
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = self.fonts[size] = pygame.font.Font(None, size)
+        return font
+
+    def text(self, text, color, size=36):
+        key = (text, color, size)
+        surface = self.text_cache.get(key)
+        if surface is None:
+            if len(self.text_cache) >= TEXT_CACHE_SIZE:
+                self.text_cache.clear()
+            surface = self.text_cache[key] = self.font(size).render(text, True, color)
+        return surface
+
+    def _render_board(self):
+        surface = pygame.Surface((CELL_SIZE * 8, BOARD_HEIGHT))
+        for row in range(8):
+            for col in range(8):
+                color = WHITE if (row + col) % 2 == 0 else GRAY
+                pygame.draw.rect(surface, color, (col * CELL_SIZE, row * CELL_SIZE, CELL_SIZE, CELL_SIZE))
+        return surface
+
+    def _render_sprites(self):
+        sprites = {}
+        center = (CELL_SIZE // 2, CELL_SIZE // 2)
+        for cell_type in CellType:
+            if cell_type == CellType.EMPTY:
+                continue
+            sprite = pygame.Surface((CELL_SIZE, CELL_SIZE), pygame.SRCALPHA)
+            is_player1 = cell_type in [CellType.PLAYER1_QORKI, CellType.PLAYER1_KING_QORKI]
+            pygame.draw.circle(sprite, RED if is_player1 else BLUE, center, QORKI_SIZE)
+            if cell_type in [CellType.PLAYER1_KING_QORKI, CellType.PLAYER2_KING_QORKI]:
+                sprite.blit(self.crown_img, (center[0] - QORKI_SIZE // 2, center[1] - QORKI_SIZE // 2))
+            sprites[cell_type] = sprite
+        return sprites
+
+    def _move_hints(self, game):
+        # Colour of the hint border per destination square, recomputed only
+        # when the selection or the position changes.
+        if not game.piece_selected:
+            return {}
+        key = (game.hash, game.selected_row, game.selected_col)
+        if key != self.hint_key:
+            self.hint_key = key
+            self.hints = {}
+            for move in get_valid_moves(game, game.selected_row, game.selected_col):
+                if move.is_capture:
+                    color = RED if move.is_triple_capture else (ORANGE if move.is_double_capture else GREEN)
+                else:
+                    color = GREEN
+                self.hints[(move.end_row, move.end_col)] = color
+        return self.hints
+
+    def _draw_square(self, row, col, state):
+        cell_type, last_move, hint = state
+        rect = pygame.Rect(col * CELL_SIZE, row * CELL_SIZE, CELL_SIZE, CELL_SIZE)
+        self.screen.blit(self.board_surface, rect, rect)
+        if last_move:
+            pygame.draw.rect(self.screen, ORANGE, rect, 3)
+        if cell_type != CellType.EMPTY:
+            self.screen.blit(self.sprites[cell_type], rect)
+        if hint:
+            pygame.draw.rect(self.screen, hint, rect, 4)
+        return rect
+
+    def _sidebar(self, game, ai_worker):
+        elapsed_time = int(time.time() - game.start_time)
+        if game.paused:
+            elapsed_time = int(game.pause_start_time - game.start_time)
+        minutes, seconds = divmod(elapsed_time, 60)
+        thinking = None
+        if ai_worker is not None and ai_worker.pending:
+            thinking = ai_worker.progress.depth if ai_worker.progress is not None else 0
+        return (game.player1.name, game.player2.name, game.player1.captured_pieces, game.player2.captured_pieces,
+                game.is_player1_turn, f"Time: {minutes:02d}:{seconds:02d}", game.difficulty.name,
+                thinking)
+
+    def _draw_sidebar(self, state):
+        (player1_name, player2_name, player1_captured, player2_captured, is_player1_turn, timer_text,
+         difficulty_name, thinking) = state
+        screen = self.screen
+        screen.fill(WHITE, SIDEBAR_RECT)
+        screen.blit(self.text("Scoreboard", BLACK), (SCOREBOARD_X, 20))
+        screen.blit(self.text(player1_name, RED), (SCOREBOARD_X, 60))
+        if is_player1_turn:
+            pygame.draw.polygon(screen, DARKPURPLE, [(760, 70), (780, 80), (780, 60)])
+        screen.blit(self.text(f"Captured: {player1_captured}", BLACK), (SCOREBOARD_X, 90))
+
+        screen.blit(self.text(player2_name, BLUE), (SCOREBOARD_X, 160))
+        if not is_player1_turn:
+            pygame.draw.polygon(screen, DARKPURPLE, [(760, 170), (780, 180), (780, 160)])
+        screen.blit(self.text(f"Captured: {player2_captured}", BLACK), (SCOREBOARD_X, 190))
+
+        screen.blit(self.text(timer_text, BLACK), (SCOREBOARD_X, 250))
+
+        screen.blit(self.text(f"Difficulty: {difficulty_name}", BLACK), (SCOREBOARD_X, 350))
+
+        if thinking is not None:
+            screen.blit(self.text("Thinking...", BLACK, 28), (SCOREBOARD_X, 400))
+            if thinking:
+                screen.blit(self.text(f"Depth: {thinking}", BLACK, 28), (SCOREBOARD_X, 425))
+        return SIDEBAR_RECT
+
+    def _draw_overlay(self, state):
+        game_over_status, paused = state
+        if game_over_status is not None:
+            if game_over_status == 0:
+                text = self.text("Game Over", BLACK)
+            elif game_over_status == 1:
+                text = self.text("Player 1 Wins!", BLACK)
+            elif game_over_status == 2:
+                text = self.text("Player 2 Wins!", BLACK)
+            else:
+                text = self.text("It's a Draw!", BLACK)
+            self.screen.blit(text, (BOARD_WIDTH // 2 - text.get_width() // 2, BOARD_HEIGHT // 2))
+
+            return_text = self.text("Press 'R' to return to Main Menu", BLACK)
+            self.screen.blit(return_text, (BOARD_WIDTH // 2 - return_text.get_width() // 2, BOARD_HEIGHT // 2 + 40))
+
+        if paused:
+            pause_text = self.text("PAUSED", RED, 72)
+            self.screen.blit(pause_text, (BOARD_WIDTH // 2 - pause_text.get_width() // 2,
+                                          BOARD_HEIGHT // 2 - pause_text.get_height() // 2))
+
+    def draw(self, game, game_over_status=None, ai_worker=None):
+        # game_over_status is None while the game is still being played.
+        start_time = time.perf_counter()
+        hints = self._move_hints(game)
+        last_move = game.last_move
+        last_squares = set()
+        if last_move:
+            last_squares = {(last_move.start_row, last_move.start_col), (last_move.end_row, last_move.end_col)}
+
+        square_states = {}
+        for row in range(8):
+            cells = game.board.cells[row]
+            for col in range(8):
+                square_states[(row, col)] = (cells[col].cell_type, (row, col) in last_squares, hints.get((row, col)))
+        sidebar_state = self._sidebar(game, ai_worker)
+        overlay_state = (game_over_status, game.paused)
+        has_overlay = game_over_status is not None or game.paused
+
+        changed = [square for square, state in square_states.items() if self.square_states.get(square) != state]
+        full = self.full_redraw or overlay_state != self.overlay_state or \
+            (has_overlay and (changed or sidebar_state != self.sidebar_state))
+
+        dirty = []
+        if full:
+            # Overlays straddle the board and the sidebar, so anything that
+            # changes under them repaints the whole screen.
+            for (row, col), state in square_states.items():
+                self._draw_square(row, col, state)
+            self._draw_sidebar(sidebar_state)
+            self._draw_overlay(overlay_state)
+            dirty.append(self.screen.get_rect())
+        else:
+            for row, col in changed:
+                dirty.append(self._draw_square(row, col, square_states[(row, col)]))
+            if sidebar_state != self.sidebar_state:
+                dirty.append(self._draw_sidebar(sidebar_state))
+
+        self.square_states = square_states
+        self.sidebar_state = sidebar_state
+        self.overlay_state = overlay_state
+
+        if full:
+            pygame.display.flip()
+        elif dirty:
+            pygame.display.update(dirty)
+        self.frames += 1
+        self.frame_time += time.perf_counter() - start_time
+        self.pixels_updated += sum(rect.width * rect.height for rect in dirty)
+        return dirty
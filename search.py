@@ -0,0 +1,303 @@
+import argparse
+import time
+
+from bitboard import Position, format_move, pack_move, unpack_move
+from evaluation import evaluate, WIN_SCORE
+from zobrist import EXACT, LOWER_BOUND, UPPER_BOUND, TranspositionTable
+
+MAX_PLY = 128
+INFINITY = WIN_SCORE + 1000
+# Tablebase wins score below the mate scores found by the search itself.
+TABLEBASE_WIN = WIN_SCORE // 2
+CHECK_INTERVAL = 1024
+
+
+class SearchAborted(Exception):
+    pass
+
+
+class SearchResult:
+    def __init__(self, best_move, score, depth, nodes, elapsed):
+        self.best_move = best_move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.nps = int(nodes / elapsed) if elapsed > 0 else nodes
+
+    def __repr__(self):
+        move = format_move(self.best_move) if self.best_move else None
+        return (f"SearchResult(best_move={move}, score={self.score}, depth={self.depth}, "
+                f"nodes={self.nodes}, nps={self.nps})")
+
+
+class Searcher:
+    def __init__(self, time_limit=None, node_limit=None, max_depth=MAX_PLY - 1, evaluate=evaluate, on_iteration=None,
+                 tt=None, stop_check=None, tablebase=None):
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.max_depth = max_depth
+        self.evaluate = evaluate
+        self.on_iteration = on_iteration
+        self.tt = tt
+        self.stop_check = stop_check
+        self.tablebase = tablebase
+        # Depths for which skip_depth(depth) is true are left out of the
+        # iterative deepening, except the last; see smp.py.
+        self.skip_depth = None
+        self.repetitions = {}
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = {}
+        self.nodes = 0
+        self.start_time = None
+        self.deadline = None
+        self.soft_deadline = None
+        self.nodes_budget = None
+        self.stopped = False
+
+    def stop(self):
+        # Safe to call from another thread, also before search() has started.
+        self.stopped = True
+
+    def ponderhit(self, time_limit=None, node_limit=None):
+        # Puts limits on a running search as if it had been started with
+        # them, so the time and nodes already spent pondering count.
+        self.deadline = self.start_time + time_limit if time_limit else None
+        self.soft_deadline = self.start_time + time_limit / 2 if time_limit else None
+        self.nodes_budget = node_limit
+
+    def search(self, position, time_limit=None, node_limit=None, max_depth=None, history=None):
+        # history holds the hashes of the positions played before this one, for repetition checks.
+        time_limit = self.time_limit if time_limit is None else time_limit
+        node_limit = self.node_limit if node_limit is None else node_limit
+        max_depth = self.max_depth if max_depth is None else max_depth
+
+        start_time = self.start_time = time.perf_counter()
+        self.deadline = start_time + time_limit if time_limit else None
+        # The next iteration costs several times this one, so do not start what cannot finish.
+        self.soft_deadline = start_time + time_limit / 2 if time_limit else None
+        self.nodes_budget = node_limit
+        self.nodes = 0
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        for key in self.history:
+            self.history[key] >>= 1
+        self.repetitions = {}
+        for key in history or ():
+            self.repetitions[key] = self.repetitions.get(key, 0) + 1
+        if self.tt is not None:
+            self.tt.new_search()
+
+        moves = self._order(position.generate_moves(), 0)
+        if not moves:
+            self.stopped = False
+            return SearchResult(None, -WIN_SCORE, 0, 0, time.perf_counter() - start_time)
+
+        best_move = moves[0]
+        best_score = self.evaluate(position)
+        depth_reached = 0
+        for depth in range(1, max_depth + 1):
+            if self.skip_depth and depth < max_depth and self.skip_depth(depth):
+                continue
+            try:
+                score, move = self._search_root(position, moves, depth)
+            except SearchAborted:
+                break
+            best_move, best_score, depth_reached = move, score, depth
+            moves.remove(move)
+            moves.insert(0, move)
+
+            elapsed = time.perf_counter() - start_time
+            if self.on_iteration:
+                self.on_iteration(SearchResult(best_move, best_score, depth_reached, self.nodes, elapsed))
+            if abs(best_score) >= WIN_SCORE - MAX_PLY:
+                break
+            if self.soft_deadline and start_time + elapsed > self.soft_deadline:
+                break
+
+        self.stopped = False
+        return SearchResult(best_move, best_score, depth_reached, self.nodes, time.perf_counter() - start_time)
+
+    def _check_limits(self):
+        if self.stopped or (self.deadline and time.perf_counter() >= self.deadline) or \
+           (self.nodes_budget and self.nodes >= self.nodes_budget) or (self.stop_check and self.stop_check()):
+            self.stopped = True
+            raise SearchAborted()
+
+    def _search_root(self, position, moves, depth):
+        alpha = -INFINITY
+        best_move = moves[0]
+        # An aborted search leaves the position and repetition counts half
+        # unwound, so every iteration works on its own copy.
+        position = position.copy()
+        self._enter(position)
+        for move in moves:
+            undo = position.make(move)
+            score = -self._negamax(position, depth - 1, -INFINITY, -alpha, 1)
+            position.unmake(move, undo)
+            if score > alpha:
+                alpha = score
+                best_move = move
+        self._leave(position)
+        if self.tt is not None:
+            self.tt.store(position.hash, depth, alpha, EXACT, pack_move(best_move))
+        return alpha, best_move
+
+    def _enter(self, position):
+        if position.player1_kings or position.player2_kings:
+            self.repetitions[position.hash] = self.repetitions.get(position.hash, 0) + 1
+
+    def _leave(self, position):
+        if position.player1_kings or position.player2_kings:
+            self.repetitions[position.hash] -= 1
+
+    def _is_repetition(self, position):
+        # Without kings every move is irreversible, so no earlier position can recur.
+        return (position.player1_kings or position.player2_kings) and self.repetitions.get(position.hash, 0) > 0
+
+    def _negamax(self, position, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0 or self.stopped:
+            self._check_limits()
+
+        if self._is_repetition(position):
+            return 0
+        if self.tablebase is not None and self.tablebase.covers(position):
+            entry = self.tablebase.probe(position)
+            if entry is not None:
+                result, distance = entry
+                return result * (TABLEBASE_WIN - ply - distance)
+        if depth <= 0:
+            return self._quiesce(position, alpha, beta, ply)
+
+        tt_move = None
+        if self.tt is not None:
+            entry = self.tt.probe(position.hash)
+            if entry is not None:
+                entry_depth, score, flag, packed_move = entry
+                if packed_move:
+                    tt_move = unpack_move(packed_move)
+                if entry_depth >= depth:
+                    score = _score_from_tt(score, ply)
+                    if flag == EXACT or (flag == LOWER_BOUND and score >= beta) or \
+                       (flag == UPPER_BOUND and score <= alpha):
+                        return score
+
+        moves = position.generate_moves()
+        if not moves:
+            return -WIN_SCORE + ply
+        if ply >= MAX_PLY - 1:
+            return self.evaluate(position)
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        self._enter(position)
+        for move in self._order(moves, ply, tt_move):
+            undo = position.make(move)
+            score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake(move, undo)
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score >= beta:
+                if not move.captured:
+                    self._record_cutoff(move, depth, ply)
+                break
+            if score > alpha:
+                alpha = score
+        self._leave(position)
+
+        if self.tt is not None:
+            if best_score >= beta:
+                flag = LOWER_BOUND
+            elif best_score <= original_alpha:
+                flag = UPPER_BOUND
+            else:
+                flag = EXACT
+            self.tt.store(position.hash, depth, _score_to_tt(best_score, ply), flag, pack_move(best_move))
+        return best_score
+
+    def _quiesce(self, position, alpha, beta, ply):
+        # Captures are compulsory, so a position with a capture pending has no
+        # stand-pat score and is searched until it is quiet.
+        if not position.has_captures() or ply >= MAX_PLY - 1:
+            if not position.has_moves():
+                return -WIN_SCORE + ply
+            return self.evaluate(position)
+
+        for move in self._order(position.generate_moves(), ply):
+            self.nodes += 1
+            undo = position.make(move)
+            score = -self._quiesce(position, -beta, -alpha, ply + 1)
+            position.unmake(move, undo)
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _order(self, moves, ply, tt_move=None):
+        if len(moves) < 2:
+            return moves
+        if moves[0].captured:
+            return sorted(moves, key=lambda move: (move == tt_move, move.captured.bit_count()), reverse=True)
+        killers = self.killers[ply]
+        history = self.history
+
+        def score(move):
+            if move == tt_move:
+                return INFINITY * 3
+            if move == killers[0]:
+                return INFINITY * 2
+            if move == killers[1]:
+                return INFINITY
+            return history.get((move.start, move.end), 0)
+
+        return sorted(moves, key=score, reverse=True)
+
+    def _record_cutoff(self, move, depth, ply):
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        key = (move.start, move.end)
+        self.history[key] = self.history.get(key, 0) + depth * depth
+
+
+def _score_to_tt(score, ply):
+    # Win scores are stored relative to the node, not the root.
+    if score >= WIN_SCORE - MAX_PLY:
+        return score + ply
+    if score <= -WIN_SCORE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def _score_from_tt(score, ply):
+    if score >= WIN_SCORE - MAX_PLY:
+        return score - ply
+    if score <= -WIN_SCORE + MAX_PLY:
+        return score + ply
+    return score
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the starting position and report search statistics.")
+    parser.add_argument('--time', type=float, default=5.0, help="time budget in seconds")
+    parser.add_argument('--nodes', type=int, default=None, help="node budget")
+    parser.add_argument('--depth', type=int, default=MAX_PLY - 1, help="maximum depth")
+    parser.add_argument('--tt-mb', type=int, default=16, help="transposition table size in MB")
+    args = parser.parse_args()
+
+    def report(result):
+        print(f"depth {result.depth:2d}  score {result.score:6d}  nodes {result.nodes:9d}  "
+              f"nps {result.nps:7d}  best {format_move(result.best_move)}")
+
+    searcher = Searcher(on_iteration=report, tt=TranspositionTable(args.tt_mb))
+    result = searcher.search(Position.initial(), time_limit=args.time, node_limit=args.nodes, max_depth=args.depth)
+    print(result)
+    print(searcher.tt.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import secrets
+import signal
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import (SEARCH_BUDGETS, Difficulty, Game, check_game_over, init_game, play_bitmove, position_from_game,
+                    think)
+from gamerecord import SYNC_EVERY, GameJournal, load_journal
+from pdn import PDNError, format_pdn_move, parse_move
+
+# Line-delimited JSON over TCP or a Unix socket. Each request is an object
+# with an "op" and an optional "id" that the reply echoes:
+#   {"op": "new", "difficulty": "HARD"}    start a game; the client plays Player 1
+#   {"op": "resume", "session": "..."}     reattach to a game, also after a server restart
+#   {"op": "move", "move": "22-18"}        play a move and get the AI's reply
+#   {"op": "state"}
+# Replies carry "ok" and either "error" or the session state. Every game is
+# journalled to SESSIONS_DIR/<session>.ckr, and sessions left without a
+# connection for IDLE_SECONDS are dropped from memory but stay resumable.
+# Journals open their file only while writing a move, so the number of open
+# files does not grow with the number of sessions.
+SESSIONS_DIR = 'sessions'
+DEFAULT_PORT = 8765
+IDLE_SECONDS = 300
+SESSION_ID_RE = re.compile('[0-9a-f]{16}')
+AI_NAME = "AI"  # Player 2's name in the journal is AI_NAME and the difficulty
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class Session:
+    def __init__(self, session_id, game, journal, result=0):
+        self.id = session_id
+        self.game = game
+        self.journal = journal
+        self.result = result
+        self.lock = asyncio.Lock()
+        self.connection = None
+        self.last_active = time.monotonic()
+
+    def state(self, **extra):
+        game = self.game
+        position = position_from_game(game)
+        moves = []
+        if not self.result and game.is_player1_turn:
+            moves = [format_pdn_move(position, bitmove) for bitmove in position.generate_moves()]
+        state = {'session': self.id, 'fen': position.to_fen(), 'difficulty': game.difficulty.name,
+                 'player1_to_move': game.is_player1_turn, 'moves': moves, 'result': self.result}
+        state.update(extra)
+        return state
+
+
+def _init_pool(budget):
+    if budget is not None:
+        SEARCH_BUDGETS[Difficulty.HARD] = budget
+
+
+def _think_task(position, history, difficulty_name, quiet_plies):
+    return think(position, Difficulty[difficulty_name], history, quiet_plies=quiet_plies)[0]
+
+
+class GameServer:
+    def __init__(self, directory=SESSIONS_DIR, processes=None, budget=None, sync_every=SYNC_EVERY,
+                 idle_seconds=IDLE_SECONDS):
+        self.directory = directory
+        self.sync_every = sync_every
+        self.idle_seconds = idle_seconds
+        self.sessions = {}
+        self.pool = ProcessPoolExecutor(processes, initializer=_init_pool, initargs=(budget,))
+        self.connections = 0
+        self.moves = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id):
+        return os.path.join(self.directory, session_id + '.ckr')
+
+    def new_session(self, difficulty):
+        session_id = secrets.token_hex(8)
+        game = Game()
+        init_game(game)
+        game.difficulty = difficulty
+        game.player2.name = f"{AI_NAME} {difficulty.name}"
+        journal = GameJournal(self._path(session_id), self.sync_every, keep_open=False)
+        journal.start(game)
+        session = self.sessions[session_id] = Session(session_id, game, journal)
+        return session
+
+    def load_session(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is not None:
+            return session
+        if not SESSION_ID_RE.fullmatch(session_id) or not os.path.exists(self._path(session_id)):
+            raise ProtocolError(f"unknown session {session_id}")
+        game = Game()
+        record = load_journal(game, self._path(session_id))
+        if record is None:
+            raise ProtocolError(f"session {session_id} could not be loaded")
+        difficulty_name = game.player2.name.rpartition(' ')[2]
+        game.difficulty = Difficulty[difficulty_name] if difficulty_name in Difficulty.__members__ \
+            else Difficulty.MEDIUM
+        journal = None
+        if not record.result:
+            journal = GameJournal(self._path(session_id), self.sync_every, keep_open=False)
+            journal.start(game, record)
+        session = self.sessions[session_id] = Session(session_id, game, journal, record.result or 0)
+        return session
+
+    def _check_over(self, session):
+        session.result = check_game_over(session.game)
+        if session.result and session.journal is not None:
+            session.journal.finish(session.result)
+            session.journal = None
+
+    async def _ai_reply(self, session):
+        # Plays the AI's move. The random policies are instant, searches go to the process pool.
+        game = session.game
+        position = position_from_game(game)
+        if game.difficulty in SEARCH_BUDGETS:
+            bitmove = await asyncio.get_running_loop().run_in_executor(
+                self.pool, _think_task, position, game.hash_history[:-1], game.difficulty.name,
+                game.status.quiet_plies[-1])
+        else:
+            bitmove = think(position, game.difficulty)[0]
+        if bitmove is None:
+            return None
+        text = format_pdn_move(position, bitmove)
+        play_bitmove(game, bitmove)
+        self.moves += 1
+        self._check_over(session)
+        return text
+
+    async def _play(self, session, text):
+        game = session.game
+        if session.result:
+            raise ProtocolError("the game is over")
+        if not game.is_player1_turn:
+            raise ProtocolError("not your move")
+        try:
+            bitmove = parse_move(position_from_game(game), str(text))
+        except PDNError:
+            raise ProtocolError(f"ambiguous move {text}, give its full jump path")
+        except ValueError:
+            bitmove = None
+        if bitmove is None:
+            raise ProtocolError(f"illegal move {text}")
+        play_bitmove(game, bitmove)
+        self.moves += 1
+        self._check_over(session)
+        reply = None
+        if not session.result:
+            reply = await self._ai_reply(session)
+        return session.state(reply=reply)
+
+    def _attach(self, session, connection):
+        if connection.session is not None and connection.session is not session:
+            connection.session.connection = None
+        if session.connection is not None and session.connection is not connection:
+            session.connection.session = None
+        session.connection = connection
+        connection.session = session
+
+    async def dispatch(self, connection, request):
+        op = request.get('op')
+        if op == 'new':
+            try:
+                difficulty = Difficulty[request.get('difficulty', 'MEDIUM')]
+            except KeyError:
+                raise ProtocolError(f"unknown difficulty {request.get('difficulty')}")
+            session = self.new_session(difficulty)
+            self._attach(session, connection)
+            return session.state()
+        if op == 'resume':
+            session = self.load_session(str(request.get('session')))
+            self._attach(session, connection)
+            async with session.lock:
+                reply = None
+                # The server may have stopped between the player's move and the AI's reply.
+                if not session.result and not session.game.is_player1_turn:
+                    reply = await self._ai_reply(session)
+                return session.state(reply=reply)
+        session = connection.session
+        if session is None:
+            raise ProtocolError("no session: send new or resume first")
+        session.last_active = time.monotonic()
+        async with session.lock:
+            if op == 'move':
+                return await self._play(session, request.get('move'))
+            if op == 'state':
+                return session.state()
+        raise ProtocolError(f"unknown op {op}")
+
+    async def handle_client(self, reader, writer):
+        connection = Connection()
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ProtocolError("requests must be JSON objects")
+                    request_id = request.get('id')
+                    reply = {'ok': True}
+                    reply.update(await self.dispatch(connection, request))
+                except (ProtocolError, ValueError) as e:
+                    reply = {'ok': False, 'error': str(e)}
+                except Exception as e:
+                    # A failed search, a broken process pool or a journal
+                    # that cannot be written: answer the request rather than
+                    # dropping the connection.
+                    traceback.print_exc()
+                    reply = {'ok': False, 'error': f"internal error: {e!r}"}
+                if request_id is not None:
+                    reply['id'] = request_id
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            session = connection.session
+            if session is not None:
+                session.connection = None
+                session.last_active = time.monotonic()
+                if session.journal is not None:
+                    session.journal.sync()
+            writer.close()
+
+    async def evict_idle(self):
+        while True:
+            await asyncio.sleep(self.idle_seconds / 4)
+            now = time.monotonic()
+            for session in list(self.sessions.values()):
+                if session.connection is None and not session.lock.locked() and \
+                   now - session.last_active > self.idle_seconds:
+                    if session.journal is not None:
+                        session.journal.close()
+                    del self.sessions[session.id]
+
+    def close(self):
+        for session in self.sessions.values():
+            if session.journal is not None:
+                session.journal.close()
+        self.pool.shutdown(cancel_futures=True)
+
+
+class Connection:
+    def __init__(self):
+        self.session = None
+
+
+async def serve(server, host=None, port=DEFAULT_PORT, unix_path=None):
+    if unix_path:
+        listener = await asyncio.start_unix_server(server.handle_client, unix_path, backlog=4096)
+    else:
+        listener = await asyncio.start_server(server.handle_client, host, port, backlog=4096)
+    evictor = asyncio.create_task(server.evict_idle())
+    serving = asyncio.create_task(listener.serve_forever())
+    # Stop cleanly on a signal so every journal is synced.
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(signal_number, serving.cancel)
+    try:
+        await serving
+    except asyncio.CancelledError:
+        pass
+    finally:
+        evictor.cancel()
+        listener.close()
+        server.close()
+
+
+async def _open(host, port, unix_path):
+    if unix_path:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+
+async def _request(reader, writer, request):
+    writer.write(json.dumps(request).encode() + b'\n')
+    await writer.drain()
+    reply = json.loads(await reader.readline())
+    if not reply['ok']:
+        raise ProtocolError(reply['error'])
+    return reply
+
+
+async def _play_session(address, difficulty, max_moves, reconnect_every, rng, latencies):
+    # One simulated player: random legal moves until the game ends or max_moves,
+    # reconnecting and resuming every reconnect_every moves.
+    reader, writer = await _open(*address)
+    state = await _request(reader, writer, {'op': 'new', 'difficulty': difficulty})
+    for number in range(max_moves):
+        if state['result'] or not state['moves']:
+            break
+        if reconnect_every and number and number % reconnect_every == 0:
+            writer.close()
+            await writer.wait_closed()
+            reader, writer = await _open(*address)
+            state = await _request(reader, writer, {'op': 'resume', 'session': state['session']})
+        start_time = time.perf_counter()
+        state = await _request(reader, writer, {'op': 'move', 'move': rng.choice(state['moves'])})
+        latencies.append(time.perf_counter() - start_time)
+    writer.close()
+
+
+def raise_file_limit():
+    # Every connection is a file descriptor; allow as many as the hard limit does.
+    try:
+        import resource
+    except ImportError:  # not on Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+async def load_test(address, sessions, difficulty, max_moves, reconnect_every, seed=1):
+    latencies = []
+    rng = random.Random(seed)
+    start_time = time.perf_counter()
+    results = await asyncio.gather(*(
+        _play_session(address, difficulty, max_moves, reconnect_every, random.Random(rng.getrandbits(32)), latencies)
+        for _ in range(sessions)), return_exceptions=True)
+    elapsed = time.perf_counter() - start_time
+    errors = [result for result in results if isinstance(result, Exception)]
+    return latencies, elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many headless games, or load test a running server.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('serve', "run the game server"), ('load', "simulate many players against a server")):
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument('--host', default='127.0.0.1')
+        subparser.add_argument('--port', type=int, default=DEFAULT_PORT)
+        subparser.add_argument('--unix', metavar='PATH', help="use a Unix socket instead of TCP")
+    serve_parser = subparsers.choices['serve']
+    serve_parser.add_argument('--sessions-dir', default=SESSIONS_DIR)
+    serve_parser.add_argument('--processes', type=int, default=None, help="AI search processes (default: all cores)")
+    serve_parser.add_argument('--time', type=float, default=None, help="HARD search seconds per move")
+    serve_parser.add_argument('--nodes', type=int, default=None, help="HARD search nodes per move")
+    serve_parser.add_argument('--idle', type=float, default=IDLE_SECONDS,
+                              help="seconds before a disconnected session leaves memory")
+    load_parser = subparsers.choices['load']
+    load_parser.add_argument('--sessions', type=int, default=1000, help="concurrent players")
+    load_parser.add_argument('--difficulty', default='MEDIUM', choices=[level.name for level in Difficulty])
+    load_parser.add_argument('--moves', type=int, default=40, help="moves per player at most")
+    load_parser.add_argument('--reconnect-every', type=int, default=10, help="moves between reconnects (0: never)")
+    args = parser.parse_args()
+    raise_file_limit()
+
+    if args.command == 'serve':
+        budget = None
+        if args.time is not None or args.nodes is not None:
+            budget = (args.time, args.nodes)
+        server = GameServer(args.sessions_dir, args.processes, budget, idle_seconds=args.idle)
+        print(f"Serving on {args.unix or f'{args.host}:{args.port}'}")
+        asyncio.run(serve(server, args.host, args.port, args.unix))
+        return
+
+    address = (args.host, args.port, args.unix)
+    latencies, elapsed, errors = asyncio.run(load_test(address, args.sessions, args.difficulty, args.moves,
+                                                       args.reconnect_every))
+    cores = os.cpu_count() or 1
+    print(f"{args.sessions} sessions, {len(latencies)} moves in {elapsed:.1f}s "
+          f"({len(latencies) / elapsed:,.0f} moves/s, {args.sessions / cores:,.0f} sessions per core)")
+    print("move latency: " + "  ".join(f"p{int(fraction * 100)} {percentile(latencies, fraction) * 1000:.1f}ms"
+                                       for fraction in (0.5, 0.9, 0.99)) +
+          f"  max {max(latencies, default=0) * 1000:.1f}ms")
+    if errors:
+        print(f"{len(errors)} sessions failed, e.g. {errors[0]!r}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
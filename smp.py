@@ -0,0 +1,303 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import random
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from search import MAX_PLY, SearchResult, Searcher
+from tournament import random_opening
+from zobrist import SCORE_OFFSET, TranspositionTable
+
+# Lazy SMP: helper processes search the same root as the main search, all
+# sharing one transposition table, and the results they store steer and cut
+# short the main search. Helpers skip some iterations (the skip pattern of
+# Stockfish's helper threads) so they spread over neighbouring depths
+# instead of repeating the main search move for move.
+SKIP_SIZE = [1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3, 4, 4, 4, 4, 4, 4, 4, 4]
+SKIP_PHASE = [0, 1, 0, 1, 2, 3, 0, 1, 2, 3, 4, 5, 0, 1, 2, 3, 4, 5, 6, 7]
+
+HEADER_WORDS = 1  # the search generation, shared by every process
+
+# A stopped helper answers within one stop check, so one that has not after
+# STOP_TIMEOUT seconds is taken to be dead or stuck and its result is dropped.
+STOP_TIMEOUT = 5.0
+STOP_POLL_SECONDS = 0.1
+
+
+class SharedTranspositionTable(TranspositionTable):
+    # A TranspositionTable in shared memory. Entries are written without
+    # locks; each key slot holds key ^ data ^ move, so an entry torn by two
+    # processes writing it at once no longer matches its key and reads as
+    # a miss. Searches do not age the table themselves: whoever starts a
+    # parallel search calls next_search() once for all the processes.
+    def __init__(self, size_mb=16, replacement='depth'):
+        self.shm = None
+        super().__init__(size_mb, replacement)
+
+    def _allocate(self):
+        self.shm = shared_memory.SharedMemory(create=True, size=8 * (HEADER_WORDS + 3 * self.size))
+        self.owner = True
+        self._map()
+
+    def _map(self):
+        words = self.shm.buf[:8 * (HEADER_WORDS + 3 * self.size)].cast('Q')
+        self.header = words[:HEADER_WORDS]
+        self.keys = words[HEADER_WORDS:HEADER_WORDS + self.size]
+        self.data = words[HEADER_WORDS + self.size:HEADER_WORDS + 2 * self.size]
+        self.moves = words[HEADER_WORDS + 2 * self.size:]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ('shm', 'header', 'keys', 'data', 'moves'):
+            del state[name]
+        state['name'] = self.shm.name
+        return state
+
+    def __setstate__(self, state):
+        name = state.pop('name')
+        self.__dict__.update(state)
+        self.shm = shared_memory.SharedMemory(name=name)
+        # Only the creating process may unlink the block.
+        resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.owner = False
+        self._map()
+
+    @property
+    def generation(self):
+        return self.header[0]
+
+    @generation.setter
+    def generation(self, value):
+        self.header[0] = value
+
+    def new_search(self):
+        pass
+
+    def next_search(self):
+        self.generation = (self.generation + 1) & 0xFF
+
+    def clear(self):
+        for table in (self.keys, self.data, self.moves):
+            table.cast('B')[:] = bytes(8 * self.size)
+        self.generation = 0
+        self.reset_stats()
+
+    def _key_at(self, slot):
+        return self.keys[slot] ^ self.data[slot] ^ self.moves[slot]
+
+    def probe(self, key):
+        index = (key & self.bucket_mask) * self.slots_per_bucket
+        occupied = False
+        for slot in range(index, index + self.slots_per_bucket):
+            data = self.data[slot]
+            packed_move = self.moves[slot]
+            stored = self.keys[slot] ^ data ^ packed_move
+            if stored == key:
+                self.hits += 1
+                return ((data >> 21) & 0x7F, (data & 0x1FFFFF) - SCORE_OFFSET, (data >> 28) & 0x3, packed_move)
+            if stored:
+                occupied = True
+        self.misses += 1
+        if occupied:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, score, flag, packed_move=0):
+        index = (key & self.bucket_mask) * self.slots_per_bucket
+        slot = index
+        generation = self.generation
+        if self.slots_per_bucket == 2:
+            data = self.data[index]
+            stored = self._key_at(index)
+            stale = (data >> 30) != generation
+            if not (stored == key or stale or depth >= (data >> 21) & 0x7F or not stored):
+                slot = index + 1
+        if not packed_move and self._key_at(slot) == key:
+            packed_move = self.moves[slot]
+        data = (score + SCORE_OFFSET) | (min(depth, 0x7F) << 21) | (flag << 28) | (generation << 30)
+        self.data[slot] = data
+        self.moves[slot] = packed_move
+        self.keys[slot] = key ^ data ^ packed_move
+        self.stores += 1
+
+    def close(self):
+        if self.shm is not None:
+            for name in ('header', 'keys', 'data', 'moves'):
+                getattr(self, name).release()
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+            self.shm = None
+
+
+def skip_depth(helper):
+    size = SKIP_SIZE[(helper - 1) % len(SKIP_SIZE)]
+    phase = SKIP_PHASE[(helper - 1) % len(SKIP_PHASE)]
+    return lambda depth: ((depth + phase) // size) % 2 == 1
+
+
+class HelperPool:
+    # The helper processes of a parallel search. start() hands them the
+    # root and stop() ends their searches and collects their results.
+    def __init__(self, count, tt, tablebase=None, niceness=0):
+        self.tt = tt
+        self.generation = 0
+        self.stopped = multiprocessing.RawValue('l', 0)
+        self.replies = multiprocessing.Queue()
+        self.requests = [multiprocessing.Queue() for _ in range(count)]
+        self.processes = [multiprocessing.Process(target=_helper_main,
+                                                  args=(helper + 1, tt, requests, self.replies, self.stopped,
+                                                        tablebase, niceness), daemon=True)
+                          for helper, requests in enumerate(self.requests)]
+        for process in self.processes:
+            process.start()
+
+    def __len__(self):
+        return len(self.requests)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['processes']
+        return state
+
+    def start(self, position, history, max_depth):
+        self.generation += 1
+        self.tt.next_search()
+        for requests in self.requests:
+            requests.put((self.generation, position, history, max_depth))
+        return self.generation
+
+    def stop(self, generation):
+        # The results of the helpers that answer; a helper process that has
+        # died is not waited for, and none is waited for past STOP_TIMEOUT.
+        self.stopped.value = generation
+        results = {}
+        deadline = time.monotonic() + STOP_TIMEOUT
+        while len(results) < len(self.requests):
+            try:
+                reply_generation, helper, result = self.replies.get(timeout=STOP_POLL_SECONDS)
+            except queue.Empty:
+                if time.monotonic() >= deadline or not self._waiting_for_live_helpers(results):
+                    break
+                continue
+            if reply_generation == generation:
+                results[helper] = result
+        return list(results.values())
+
+    def _waiting_for_live_helpers(self, results):
+        # Only the process that started the helpers can see whether they are alive.
+        processes = getattr(self, 'processes', None)
+        if processes is None:
+            return True
+        return any(process.is_alive() for helper, process in enumerate(processes, 1) if helper not in results)
+
+    def close(self):
+        self.stopped.value = self.generation
+        for requests in self.requests:
+            requests.put(None)
+        for process in getattr(self, 'processes', ()):
+            process.join(1)
+
+
+def _helper_main(helper, tt, requests, replies, stopped, tablebase, niceness):
+    if niceness and hasattr(os, 'nice'):
+        try:
+            os.nice(niceness)
+        except OSError:
+            pass
+    searcher = Searcher(tt=tt, tablebase=tablebase)
+    searcher.skip_depth = skip_depth(helper)
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        generation, position, history, max_depth = request
+        searcher.stop_check = lambda: stopped.value >= generation
+        replies.put((generation, helper, searcher.search(position, max_depth=max_depth, history=history)))
+
+
+class ParallelSearcher(Searcher):
+    # A Searcher whose searches run alongside the helpers of a HelperPool.
+    # Its own limits decide when the search ends; the deepest completed
+    # iteration of any process gives the move.
+    def __init__(self, helpers, **kwargs):
+        kwargs.setdefault('tt', helpers.tt)
+        super().__init__(**kwargs)
+        self.helpers = helpers
+
+    def search(self, position, time_limit=None, node_limit=None, max_depth=None, history=None):
+        max_depth = self.max_depth if max_depth is None else max_depth
+        generation = self.helpers.start(position, history, max_depth)
+        try:
+            result = super().search(position, time_limit, node_limit, max_depth, history)
+        finally:
+            helper_results = self.helpers.stop(generation)
+        best = result
+        for helper_result in helper_results:
+            if helper_result.best_move is not None and helper_result.depth > best.depth:
+                best = helper_result
+        nodes = result.nodes + sum(helper_result.nodes for helper_result in helper_results)
+        return SearchResult(best.best_move, best.score, best.depth, nodes, result.elapsed)
+
+
+def make_searcher(helpers=None, **kwargs):
+    if helpers:
+        return ParallelSearcher(helpers, **kwargs)
+    return Searcher(**kwargs)
+
+
+def benchmark_positions(count, seed=1, opening_plies=8):
+    return [random_opening(random.Random(seed + index), opening_plies) for index in range(count)]
+
+
+def benchmark(workers, positions, depth, time_limit, tt_mb):
+    # (seconds to reach depth, nodes, mean depth reached in time_limit) summed over positions.
+    # One worker is the plain single-process search.
+    tt = SharedTranspositionTable(tt_mb) if workers > 1 else TranspositionTable(tt_mb)
+    helpers = HelperPool(workers - 1, tt) if workers > 1 else None
+    searcher = make_searcher(helpers, tt=tt)
+    seconds = nodes = depths = 0
+    try:
+        for position in positions:
+            tt.clear()
+            result = searcher.search(position, max_depth=depth)
+            seconds += result.elapsed
+            nodes += result.nodes
+            tt.clear()
+            depths += searcher.search(position, time_limit=time_limit).depth
+    finally:
+        if helpers:
+            helpers.close()
+            tt.close()
+    return seconds, nodes, depths / len(positions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the lazy SMP search against a single process.")
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help="worker counts to compare (default: 1, 2, 4, 8, ... up to twice the cores)")
+    parser.add_argument('--positions', type=int, default=8)
+    parser.add_argument('--depth', type=int, default=8, help="depth timed for the speedup")
+    parser.add_argument('--time', type=float, default=1.0, help="seconds per search for the depth reached")
+    parser.add_argument('--tt-mb', type=int, default=64)
+    args = parser.parse_args()
+
+    counts = args.workers
+    if counts is None:
+        counts = [1]
+        while counts[-1] < 2 * os.cpu_count():
+            counts.append(counts[-1] * 2)
+    positions = benchmark_positions(args.positions)
+    print(f"{os.cpu_count()} cores, {len(positions)} positions, depth {args.depth}, {args.time}s searches")
+    print(f"{'workers':>7} {'time':>8} {'speedup':>8} {'nodes/s':>10} {'depth':>6}")
+    baseline = None
+    for workers in counts:
+        seconds, nodes, depth = benchmark(workers, positions, min(args.depth, MAX_PLY - 1), args.time, args.tt_mb)
+        baseline = baseline or seconds
+        print(f"{workers:7d} {seconds:7.2f}s {baseline / seconds:7.2f}x {nodes / seconds:10,.0f} {depth:6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+import argparse
+import itertools
+import math
+import mmap
+import multiprocessing
+import os
+import time
+
+from bitboard import PLAYER1_KING_ROW, PLAYER2_KING_ROW, SHIFTS, SQUARE_MASKS, VALID, Position, format_move
+
+# Endgame tablebases for every position with up to a few pieces, solved by
+# retrograde analysis. Positions are grouped by material signature: the
+# number of Player 1 men, Player 1 kings, Player 2 men and Player 2 kings.
+# Within a signature a position is indexed combinatorially, piece type by
+# piece type, with the side to move as the lowest bit. Each entry is one
+# byte: 0 for a draw (or an impossible index), 1-127 for a win for the side
+# to move in 2 * value - 1 plies, and 128-255 for a loss in
+# 2 * (value - 128) plies. Every capture or promotion leaves the signature,
+# so the tables are built smallest first and later ones look earlier ones up.
+#
+# Distances count plies to the end of the game and know nothing of the
+# draw after MOVE_LIMIT_PLIES quiet plies (gamestatus.py). A live game passes
+# its remaining quiet-move budget to best_move, and a win that may take
+# longer than that is not trusted.
+TABLEBASE_DIR = 'tablebases'
+MAX_PIECES = 4
+WIN, DRAW, LOSS = 1, 0, -1
+MAX_DISTANCE = 253
+
+BIT_TO_SQUARE = {mask: square for square, mask in enumerate(SQUARE_MASKS)}
+# Men never stand on their own king row, so they only have 28 squares.
+PLAYER1_MAN_SQUARES = [square for square, mask in enumerate(SQUARE_MASKS) if not mask & PLAYER1_KING_ROW]
+PLAYER2_MAN_SQUARES = [square for square, mask in enumerate(SQUARE_MASKS) if not mask & PLAYER2_KING_ROW]
+KING_SQUARES = list(range(32))
+PIECE_SQUARES = [PLAYER1_MAN_SQUARES, KING_SQUARES, PLAYER2_MAN_SQUARES, KING_SQUARES]
+# Position in the allowed square list of each piece type, by square.
+SQUARE_RANKS = [{square: rank for rank, square in enumerate(squares)} for squares in PIECE_SQUARES]
+
+
+def signature(position):
+    return (position.player1_men.bit_count(), position.player1_kings.bit_count(),
+            position.player2_men.bit_count(), position.player2_kings.bit_count())
+
+
+def signature_name(sig):
+    return ''.join(str(count) for count in sig)
+
+
+def signatures(max_pieces):
+    # Every signature with both sides on the board, in an order where each
+    # comes after those its captures (fewer pieces) and promotions (fewer
+    # men) lead to.
+    found = []
+    for counts in itertools.product(range(max_pieces + 1), repeat=4):
+        player1, player2 = counts[0] + counts[1], counts[2] + counts[3]
+        if player1 and player2 and player1 + player2 <= max_pieces:
+            found.append(counts)
+    return sorted(found, key=lambda sig: (sum(sig), sig[0] + sig[2], sig))
+
+
+def table_size(sig):
+    size = 2
+    for count, squares in zip(sig, PIECE_SQUARES):
+        size *= math.comb(len(squares), count)
+    return size
+
+
+def _rank(bitboard, ranks):
+    # Combinatorial number system rank of a set of squares.
+    index = 0
+    count = 0
+    while bitboard:
+        bit = bitboard & -bitboard
+        bitboard ^= bit
+        count += 1
+        index += math.comb(ranks[BIT_TO_SQUARE[bit]], count)
+    return index
+
+
+def position_index(position, sig):
+    index = 0
+    for bitboard, ranks, squares, count in zip(
+            (position.player1_men, position.player1_kings, position.player2_men, position.player2_kings),
+            SQUARE_RANKS, PIECE_SQUARES, sig):
+        index = index * math.comb(len(squares), count) + _rank(bitboard, ranks)
+    return index * 2 + (0 if position.player1_to_move else 1)
+
+
+def iter_positions(sig):
+    # Every legal placement for sig, with either side to move.
+    player1_men_sets = itertools.combinations(PLAYER1_MAN_SQUARES, sig[0])
+    for player1_men_squares in player1_men_sets:
+        player1_men = _mask(player1_men_squares)
+        for player1_king_squares in itertools.combinations(KING_SQUARES, sig[1]):
+            player1_kings = _mask(player1_king_squares)
+            if player1_kings & player1_men:
+                continue
+            player1 = player1_men | player1_kings
+            for player2_men_squares in itertools.combinations(PLAYER2_MAN_SQUARES, sig[2]):
+                player2_men = _mask(player2_men_squares)
+                if player2_men & player1:
+                    continue
+                for player2_king_squares in itertools.combinations(KING_SQUARES, sig[3]):
+                    player2_kings = _mask(player2_king_squares)
+                    if player2_kings & (player1 | player2_men):
+                        continue
+                    yield Position(player1_men, player1_kings, player2_men, player2_kings, True)
+                    yield Position(player1_men, player1_kings, player2_men, player2_kings, False)
+
+
+def _mask(squares):
+    mask = 0
+    for square in squares:
+        mask |= SQUARE_MASKS[square]
+    return mask
+
+
+def encode(result, distance):
+    # Wins have odd distances up to MAX_DISTANCE (value 127), losses even
+    # ones up to MAX_DISTANCE + 1 (value 255).
+    if result != DRAW and distance > MAX_DISTANCE + (result == LOSS):
+        raise ValueError(f"Distance {distance} is too long to encode")
+    if result == WIN:
+        return (distance + 1) // 2
+    if result == LOSS:
+        return 128 + distance // 2
+    return 0
+
+
+def decode(value):
+    if value == 0:
+        return DRAW, 0
+    if value < 128:
+        return WIN, 2 * value - 1
+    return LOSS, 2 * (value - 128)
+
+
+def _is_internal(position, move):
+    # Simple moves that do not crown stay in the same signature.
+    if move.captured:
+        return False
+    if position.player1_to_move:
+        return not (move.start & position.player1_men and move.end & PLAYER1_KING_ROW)
+    return not (move.start & position.player2_men and move.end & PLAYER2_KING_ROW)
+
+
+def _predecessors(position):
+    # Positions one simple, non-crowning move before this one, for the side that just moved.
+    empty = VALID & ~position.occupied()
+    if position.player1_to_move:
+        men, kings = position.player2_men, position.player2_kings
+        backward_men = [lambda mask, shift=shift: mask >> shift for shift in SHIFTS]
+    else:
+        men, kings = position.player1_men, position.player1_kings
+        backward_men = [lambda mask, shift=shift: mask << shift for shift in SHIFTS]
+    steps = [lambda mask, shift=shift: mask << shift for shift in SHIFTS] + \
+        [lambda mask, shift=shift: mask >> shift for shift in SHIFTS]
+    mover_is_player1 = not position.player1_to_move
+    for pieces, directions, is_king in ((men, backward_men, False), (kings, steps, True)):
+        while pieces:
+            end = pieces & -pieces
+            pieces ^= end
+            for step in directions:
+                start = step(end) & empty
+                if not start:
+                    continue
+                boards = [position.player1_men, position.player1_kings, position.player2_men, position.player2_kings]
+                kind = (0 if mover_is_player1 else 2) + is_king
+                boards[kind] ^= start | end
+                previous = Position(*boards, mover_is_player1)
+                # The move was only legal if the mover had no capture.
+                if not previous.has_captures():
+                    yield previous
+
+
+class Tablebase:
+    # Reads tablebase files through mmap, so every process probing them
+    # shares one copy in the page cache.
+    def __init__(self, directory=TABLEBASE_DIR):
+        self.directory = directory
+        self.tables = {}
+        self.max_pieces = 0
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.endswith('.tb') and len(name) == 7:
+                    sig = tuple(int(digit) for digit in name[:4])
+                    self.max_pieces = max(self.max_pieces, sum(sig))
+
+    def table(self, sig):
+        table = self.tables.get(sig)
+        if table is None and sig not in self.tables:
+            path = os.path.join(self.directory, signature_name(sig) + '.tb')
+            if os.path.exists(path) and os.path.getsize(path) == table_size(sig):
+                with open(path, 'rb') as infile:
+                    table = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+            self.tables[sig] = table
+        return table
+
+    def covers(self, position):
+        return position.occupied().bit_count() <= self.max_pieces
+
+    def probe(self, position):
+        # (WIN/DRAW/LOSS for the side to move, distance in plies), or None if not in the tables.
+        sig = signature(position)
+        if not (sig[0] or sig[1]) or not (sig[2] or sig[3]):
+            # One side has no pieces left: whoever is to move with none has lost.
+            player1_has_pieces = bool(sig[0] or sig[1])
+            return (WIN if player1_has_pieces == position.player1_to_move else LOSS), 0
+        table = self.table(sig)
+        if table is None:
+            return None
+        return decode(table[position_index(position, sig)])
+
+    def best_move(self, position, budget=None):
+        # The move keeping the best result: the quickest win, the slowest loss.
+        # With a budget of plies, a win further away than that is left to
+        # the search, since the game may be drawn before it ends.
+        if budget is not None:
+            entry = self.probe(position)
+            if entry is None or (entry[0] == WIN and entry[1] > budget):
+                return None
+        best = None
+        best_key = None
+        for move in position.generate_moves():
+            entry = self.probe(position.play(move))
+            if entry is None:
+                return None
+            result, distance = entry
+            key = (-result, -distance if result == LOSS else distance)
+            if best_key is None or key > best_key:
+                best, best_key = move, key
+        return best
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables = {}
+
+
+def solve(sig, directory=TABLEBASE_DIR):
+    # Builds the table for sig. Tables for signatures it captures or crowns
+    # into must already exist in directory.
+    lookup = Tablebase(directory)
+    size = table_size(sig)
+    values = bytearray(size)
+    solved = bytearray(size)
+    remaining = bytearray(size)  # internal successors not yet known to win for the opponent
+    longest = bytearray(size)    # longest opponent win among successors seen so far
+    saving = bytearray(size)     # 1: an outside successor is a draw, 2: an outside successor wins
+    buckets = [[] for _ in range(MAX_DISTANCE + 2)]
+    positions = {}
+
+    for position in iter_positions(sig):
+        index = position_index(position, sig)
+        positions[index] = position
+        moves = position.generate_moves()
+        if not moves:
+            buckets[0].append((index, LOSS))
+            continue
+        internal = 0
+        win_distance = None
+        for move in moves:
+            if _is_internal(position, move):
+                internal += 1
+                continue
+            result, distance = lookup.probe(position.play(move))
+            if result == LOSS:
+                if win_distance is None or distance + 1 < win_distance:
+                    win_distance = distance + 1
+            elif result == DRAW:
+                saving[index] |= 1
+            else:
+                longest[index] = max(longest[index], distance)
+        remaining[index] = internal
+        if win_distance is not None:
+            saving[index] |= 2
+            buckets[win_distance].append((index, WIN))
+        elif not internal and not saving[index]:
+            buckets[longest[index] + 1].append((index, LOSS))
+    lookup.close()
+
+    # Settle positions in order of distance, so each is settled with its
+    # quickest win or, once every move loses, its slowest loss.
+    for distance, bucket in enumerate(buckets):
+        for index, result in bucket:
+            if solved[index]:
+                continue
+            solved[index] = 1
+            values[index] = encode(result, distance)
+            for previous in _predecessors(positions[index]):
+                previous_index = position_index(previous, sig)
+                if solved[previous_index]:
+                    continue
+                if result == LOSS:
+                    if distance + 1 > MAX_DISTANCE:
+                        raise ValueError(f"Distance to win is too long to encode in {signature_name(sig)}")
+                    saving[previous_index] |= 2
+                    buckets[distance + 1].append((previous_index, WIN))
+                else:
+                    remaining[previous_index] -= 1
+                    longest[previous_index] = max(longest[previous_index], distance)
+                    if not remaining[previous_index] and not saving[previous_index]:
+                        buckets[longest[previous_index] + 1].append((previous_index, LOSS))
+
+    path = os.path.join(directory, signature_name(sig) + '.tb')
+    with open(path + '.tmp', 'wb') as outfile:
+        outfile.write(values)
+    os.replace(path + '.tmp', path)
+    wins = sum(1 for index in positions if values[index] and values[index] < 128)
+    losses = sum(1 for index in positions if values[index] >= 128)
+    return {'signature': signature_name(sig), 'positions': len(positions), 'wins': wins, 'losses': losses,
+            'draws': len(positions) - wins - losses}
+
+
+def _solve_task(task):
+    return solve(*task)
+
+
+def generate(max_pieces=MAX_PIECES, directory=TABLEBASE_DIR, processes=None, report=None):
+    # Signatures with the same piece and man counts never capture or crown
+    # into one another, so each such group is solved in parallel.
+    os.makedirs(directory, exist_ok=True)
+    results = []
+    with multiprocessing.Pool(processes) as pool:
+        for _, group in itertools.groupby(signatures(max_pieces), key=lambda sig: (sum(sig), sig[0] + sig[2])):
+            tasks = [(sig, directory) for sig in group
+                     if not os.path.exists(os.path.join(directory, signature_name(sig) + '.tb'))]
+            for result in pool.imap_unordered(_solve_task, tasks):
+                results.append(result)
+                if report:
+                    report(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate endgame tablebases or probe a position.")
+    parser.add_argument('--pieces', type=int, default=MAX_PIECES, help="largest number of pieces on the board")
+    parser.add_argument('--directory', default=TABLEBASE_DIR)
+    parser.add_argument('--processes', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--probe', metavar='FEN', help="print the result for this position instead")
+    args = parser.parse_args()
+
+    if args.probe:
+        tablebase = Tablebase(args.directory)
+        position = Position.from_fen(args.probe)
+        entry = tablebase.probe(position)
+        if entry is None:
+            print("not in the tablebases")
+        else:
+            result, distance = entry
+            best = tablebase.best_move(position)
+            print({WIN: 'win', DRAW: 'draw', LOSS: 'loss'}[result], f"in {distance} plies" if result else '',
+                  f"best {format_move(best)}" if best else '')
+        return
+
+    start_time = time.perf_counter()
+
+    def report(result):
+        print(f"{result['signature']}: {result['positions']:9d} positions  {result['wins']} wins  "
+              f"{result['losses']} losses  {result['draws']} draws  ({time.perf_counter() - start_time:.0f}s)")
+
+    generate(args.pieces, args.directory, args.processes, report)
+
+
+if __name__ == "__main__":
+    main()
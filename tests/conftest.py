@@ -0,0 +1,97 @@
+import os
+import random
+import sys
+
+import pytest
+
+# The modules live at the top of the repository rather than in a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bitboard import Position  # noqa: E402
+from engine import Game, check_game_over, init_game, play_bitmove, redo_move, undo_move  # noqa: E402
+from gamerecord import GameRecord  # noqa: E402
+
+
+def snapshot(game):
+    # Everything a move, an undo or a load has to leave as a replay would.
+    return ([[cell.cell_type for cell in row] for row in game.board.cells], game.is_player1_turn,
+            game.player1.captured_pieces, game.player2.captured_pieces, game.player1.moves_made,
+            game.player2.moves_made, game.hash, list(game.hash_history), len(game.move_history))
+
+
+def new_game():
+    game = Game()
+    init_game(game)
+    return game
+
+
+def play_random(game, rng, plies, undo_rate=0.0):
+    # Random moves, sometimes taking one or two back and replaying one.
+    # Returns the snapshot after every ply of the line left on the board.
+    snapshots = [snapshot(game)]
+    for _ in range(plies):
+        if check_game_over(game):
+            break
+        play_bitmove(game, rng.choice(game.move_cache.moves(game)))
+        snapshots.append(snapshot(game))
+        if undo_rate and rng.random() < undo_rate:
+            undo_move(game)
+            snapshots.pop()
+            if len(snapshots) > 1 and rng.random() < 0.5:
+                undo_move(game)
+                redo_move(game)
+    return snapshots
+
+
+def random_walk(seed, plies=200):
+    # (position, move) pairs along a random game, restarting when one ends.
+    rng = random.Random(seed)
+    position = Position.initial()
+    for _ in range(plies):
+        moves = position.generate_moves()
+        if not moves:
+            position = Position.initial()
+            continue
+        move = rng.choice(moves)
+        yield position, move
+        position = position.play(move)
+
+
+def random_record(seed, plies=150, start=None):
+    rng = random.Random(seed)
+    record = GameRecord(start or Position.initial(), "White", "Black")
+    position = record.start.copy()
+    for _ in range(plies):
+        moves = position.generate_moves()
+        if not moves:
+            break
+        move = rng.choice(moves)
+        record.append(moves.index(move))
+        position.make(move)
+    record.result = rng.choice([1, 2, 3, 0])
+    return record
+
+
+@pytest.fixture(name='snapshot')
+def snapshot_fixture():
+    return snapshot
+
+
+@pytest.fixture(name='new_game')
+def new_game_fixture():
+    return new_game
+
+
+@pytest.fixture(name='play_random')
+def play_random_fixture():
+    return play_random
+
+
+@pytest.fixture(name='random_walk')
+def random_walk_fixture():
+    return random_walk
+
+
+@pytest.fixture(name='random_record')
+def random_record_fixture():
+    return random_record
@@ -0,0 +1,128 @@
+import time
+
+import pytest
+
+import engine
+from ai_worker import AIWorker
+from bitboard import Position
+from engine import SEARCH_BUDGETS, Difficulty, play_bitmove, position_from_game, set_position
+
+BUDGET = 0.5
+PONDER_SECONDS = 1.5
+# Player 2 to move, and whichever move it plays Player 1 has a single reply,
+# so the reply the worker ponders on is known.
+FORCED_REPLY = 'B:W14,19,21,23,25,26,27,28,29,30,31,32:B1,2,3,4,5,6,7,8,9,10,12,20'
+
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    # No opening book or tablebases, and a short HARD budget.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(engine, '_opening_book', None)
+    monkeypatch.setattr(engine, '_tablebase', None)
+    monkeypatch.setitem(SEARCH_BUDGETS, Difficulty.HARD, (BUDGET, None))
+    workers = []
+
+    def make_worker(**options):
+        workers.append(AIWorker(**options))
+        return workers[-1]
+    yield make_worker
+    for started in workers:
+        started.close()
+
+
+def wait_for_reply(worker, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        reply = worker.poll()
+        if reply is not None:
+            return reply
+        time.sleep(0.01)
+    raise AssertionError("no reply from the worker")
+
+
+def game_at(new_game, fen, difficulty=Difficulty.HARD):
+    game = new_game()
+    set_position(game, Position.from_fen(fen))
+    game.difficulty = difficulty
+    return game
+
+
+def test_search_reply(worker, new_game):
+    progress = []
+    ai = worker(on_progress=progress.append)
+    game = game_at(new_game, FORCED_REPLY)
+    ai.start(game)
+    assert ai.pending
+    move, result = wait_for_reply(ai)
+    assert not ai.pending
+    assert move in position_from_game(game).generate_moves() and result.best_move == move
+    assert progress and progress[-1].depth <= result.depth
+
+
+def test_random_policy_reply(worker, new_game):
+    ai = worker()
+    game = game_at(new_game, FORCED_REPLY, Difficulty.EASY)
+    ai.start(game)
+    move, result = wait_for_reply(ai)
+    assert move in position_from_game(game).generate_moves() and result is None
+
+
+def test_cancelled_request_is_dropped(worker, new_game):
+    ai = worker()
+    game = game_at(new_game, FORCED_REPLY)
+    ai.start(game)
+    ai.cancel()
+    time.sleep(BUDGET + 0.5)
+    assert ai.poll() is None and not ai.pending
+
+
+def play_ai_move_and_forced_reply(ai, game):
+    # Returns once the worker has been pondering for PONDER_SECONDS.
+    ai.start(game)
+    move, _ = wait_for_reply(ai)
+    play_bitmove(game, move)
+    replies = game.move_cache.moves(game)
+    assert len(replies) == 1
+    play_bitmove(game, replies[0])
+    time.sleep(PONDER_SECONDS)
+
+
+def test_ponder_hit_answers_with_the_pondered_search(worker, new_game):
+    ai = worker(ponder=True)
+    game = game_at(new_game, FORCED_REPLY)
+    play_ai_move_and_forced_reply(ai, game)
+    start_time = time.monotonic()
+    ai.start(game)
+    move, result = wait_for_reply(ai)
+    # The budget was used up while pondering, so the answer is immediate.
+    assert time.monotonic() - start_time < BUDGET
+    assert result.elapsed >= PONDER_SECONDS
+    assert move in position_from_game(game).generate_moves() and result.best_move == move
+
+
+def test_ponder_miss_searches_afresh(worker, new_game):
+    ai = worker(ponder=True)
+    game = game_at(new_game, FORCED_REPLY)
+    play_ai_move_and_forced_reply(ai, game)
+    other = position_from_game(game).play(game.move_cache.moves(game)[-1])
+    set_position(game, other.play(other.generate_moves()[0]))
+    ai.start(game)
+    move, result = wait_for_reply(ai)
+    assert result.elapsed < PONDER_SECONDS
+    assert move in position_from_game(game).generate_moves()
+    time.sleep(BUDGET)
+    assert ai.poll() is None
+
+
+def test_cancelled_ponder_searches_afresh(worker, new_game):
+    ai = worker(ponder=True)
+    game = game_at(new_game, FORCED_REPLY)
+    play_ai_move_and_forced_reply(ai, game)
+    ai.cancel()
+    ai.start(game)
+    move, result = wait_for_reply(ai)
+    assert result.elapsed < PONDER_SECONDS
+    assert move in position_from_game(game).generate_moves()
+    time.sleep(BUDGET)
+    assert ai.poll() is None
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+import analysis
+from analysis import analyse_games, load_cache
+from gamerecord import write_records
+
+
+@pytest.fixture
+def games(tmp_path, random_record):
+    # Every game starts from the same position, and the first game is played twice.
+    records = [random_record(seed, plies=12) for seed in range(4)]
+    path = str(tmp_path / 'games.ckr')
+    write_records(path, records + records[:1])
+    return path
+
+
+def analyse(tmp_path, games, **options):
+    output = str(tmp_path / 'analysis.jsonl')
+    summary = analyse_games([games], output, str(tmp_path / 'cache.jsonl'), processes=2, **options)
+    with open(output) as infile:
+        return summary, infile.read()
+
+
+def test_positions_are_searched_once(tmp_path, games):
+    summary, lines = analyse(tmp_path, games, depth=2)
+    assert summary['games'] == 5 and summary['moves'] == 5 * 12
+    assert summary['positions'] == 5 * 13 and summary['unique_positions'] < 4 * 13
+    assert summary['searched'] == summary['unique_positions'] and summary['cached'] == 0
+    assert len(lines.splitlines()) == summary['moves']
+    line = json.loads(lines.splitlines()[0])
+    assert line['game'] == games + ':0' and line['ply'] == 0 and line['depth'] == 2
+    with open(tmp_path / 'cache.jsonl') as infile:
+        assert len(infile.readlines()) == summary['unique_positions'] + 1
+
+
+def test_second_run_searches_nothing(tmp_path, games):
+    first, first_lines = analyse(tmp_path, games, depth=2)
+    second, second_lines = analyse(tmp_path, games, depth=2)
+    assert second['searched'] == 0 and second['cached'] == first['unique_positions']
+    assert second_lines == first_lines
+
+
+@pytest.mark.parametrize('changed', [{'depth': 3}, {'depth': 2, 'node_limit': 50}])
+def test_other_settings_invalidate_the_cache(tmp_path, games, changed):
+    first, _ = analyse(tmp_path, games, depth=2)
+    assert load_cache(str(tmp_path / 'cache.jsonl'), {'depth': 2, 'nodes': None})
+    second, _ = analyse(tmp_path, games, **changed)
+    assert second['searched'] == first['unique_positions']
+    settings = {'depth': changed['depth'], 'nodes': changed.get('node_limit')}
+    assert load_cache(str(tmp_path / 'cache.jsonl'), {'depth': 2, 'nodes': None}) is None
+    assert len(load_cache(str(tmp_path / 'cache.jsonl'), settings)) == first['unique_positions']
+
+
+def test_interrupted_run_is_resumed(tmp_path, games):
+    first, first_lines = analyse(tmp_path, games, depth=2)
+    path = tmp_path / 'cache.jsonl'
+    lines = path.read_text().splitlines(keepends=True)
+    path.write_text(''.join(lines[:-3]) + lines[-3][:20])
+    second, second_lines = analyse(tmp_path, games, depth=2)
+    assert second['searched'] == 3
+    assert second_lines == first_lines
+
+
+def test_small_batches(tmp_path, games, monkeypatch):
+    (tmp_path / 'whole').mkdir()
+    _, expected = analyse(tmp_path / 'whole', games, depth=2)
+    monkeypatch.setattr(analysis, 'BATCH_POSITIONS', 5)
+    summary, lines = analyse(tmp_path, games, depth=2)
+    assert summary['searched'] == summary['unique_positions']
+    assert lines == expected
@@ -0,0 +1,46 @@
+import pytest
+
+from bitboard import MASK_TO_ROWCOL, SQUARE_MASKS
+from engine import Game, init_game, set_position
+from evaluation import WEIGHTS, evaluate, features
+
+np = pytest.importorskip('numpy')
+
+from batch_evaluation import (batch_evaluate, batch_features, pack_positions, pack_squares, random_positions,
+                              unpack_positions)
+
+
+@pytest.fixture(scope='module')
+def positions():
+    return random_positions(500, seed=3, max_plies=120)
+
+
+def test_features_match_scalar(positions):
+    assert batch_features(pack_positions(positions)).tolist() == [features(position) for position in positions]
+
+
+@pytest.mark.parametrize('weights', [None, [w * 1.37 for w in WEIGHTS], [-3, 250, 0, 7, -1, 11]])
+def test_scores_match_scalar(positions, weights):
+    assert batch_evaluate(pack_positions(positions), weights).tolist() == \
+        [evaluate(position, weights) for position in positions]
+
+
+def test_popcount_without_bitwise_count(positions, monkeypatch):
+    monkeypatch.delattr(np, 'bitwise_count', raising=False)
+    assert batch_evaluate(pack_positions(positions)).tolist() == [evaluate(position) for position in positions]
+
+
+def test_pack_round_trip(positions):
+    assert unpack_positions(pack_positions(positions)) == positions
+
+
+def test_pack_squares_matches_game_boards(positions):
+    game = Game()
+    init_game(game)
+    squares = []
+    for position in positions:
+        set_position(game, position)
+        squares.append([game.board.cells[row][col].cell_type.value
+                        for row, col in (MASK_TO_ROWCOL[mask] for mask in SQUARE_MASKS)])
+    packed = pack_squares(squares, [position.player1_to_move for position in positions])
+    assert np.array_equal(packed, pack_positions(positions))
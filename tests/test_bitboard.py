@@ -0,0 +1,81 @@
+import pytest
+
+from bitboard import Position
+from perft import PERFT_POSITIONS, perft
+
+MAX_LEAVES = 100000  # deeper counts are left to perft.py and benchmark.py
+
+
+def perft_cases():
+    for name, fen, counts in PERFT_POSITIONS:
+        for depth, count in enumerate(counts, 1):
+            if count <= MAX_LEAVES:
+                yield pytest.param(fen, depth, count, id=f"{name}-{depth}")
+
+
+@pytest.mark.parametrize('fen, depth, count', list(perft_cases()))
+def test_perft(fen, depth, count):
+    assert perft(Position.from_fen(fen), depth) == count
+
+
+@pytest.mark.parametrize('fen', [fen for _, fen, _ in PERFT_POSITIONS])
+def test_perft_leaves_position_unchanged(fen):
+    position = Position.from_fen(fen)
+    before = position.copy()
+    perft(position, 3)
+    assert position == before
+    assert position.hash == before.hash
+
+
+@pytest.mark.parametrize('fen', [fen for _, fen, _ in PERFT_POSITIONS])
+def test_fen_round_trip(fen):
+    position = Position.from_fen(fen)
+    assert Position.from_fen(position.to_fen()) == position
+
+
+def test_initial_position_matches_fen():
+    assert Position.initial() == Position.from_fen('W:W21-32:B1-12')
+    assert Position.initial().hash == Position.from_fen('W:W21-32:B1-12').hash
+
+
+def test_king_capture_back_to_its_start():
+    # The king on 10 takes 14, 15, 22 and 23 in a ring and lands on 10 again, still a king.
+    position = Position.from_fen('W:WK10,29,31:B1,2,3,14,15,22,23')
+    (move,) = position.generate_moves()
+    assert move.start == move.end
+    after = position.play(move)
+    assert after.player1_kings == position.player1_kings
+    assert after.occupied() == position.occupied() & ~move.captured
+
+
+def test_captures_are_compulsory_and_jumps_continue():
+    # 22 must take 18 and go on to take 11 rather than step to 17.
+    position = Position.from_fen('W:W22,30:B18,11,1')
+    moves = position.generate_moves()
+    assert len(moves) == 1 and moves[0].captured.bit_count() == 2
+    after = position.play(moves[0])
+    assert after == Position.from_fen('B:W8,30:B1')
+
+
+def test_crowning_ends_the_move():
+    # The man crowned on 3 does not go on to take 8 as a king.
+    position = Position.from_fen('W:W10:B7,8')
+    moves = position.generate_moves()
+    assert len(moves) == 1 and moves[0].captured.bit_count() == 1
+    after = position.play(moves[0])
+    assert after == Position.from_fen('B:WK3:B8')
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_move_queries_agree_with_generation(seed, random_walk):
+    for position, _ in random_walk(seed):
+        moves = position.generate_moves()
+        captures = [move for move in moves if move.captured]
+        assert position.has_moves() == bool(moves)
+        assert position.has_captures() == bool(captures)
+        assert not captures or captures == moves
+        for start in {move.start for move in moves}:
+            assert position.moves_from(start) == [move for move in moves if move.start == start]
+        other = position.with_side(not position.player1_to_move)
+        assert other.player1_to_move != position.player1_to_move and other.occupied() == position.occupied()
+        assert other.has_moves() == bool(other.generate_moves())
@@ -0,0 +1,106 @@
+import pytest
+
+from bitboard import SQUARE_MASKS, Position
+from compact import (MoveArray, PositionArray, compress, crowns, expand, is_promotion, pack_bitmove, pack_board,
+                     pack_move, pack_position, random_corpus, unpack_bitmove, unpack_board, unpack_move,
+                     unpack_position)
+from engine import Game, init_game, move_from_bitmove, set_position
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    return random_corpus(5000, seed=2)
+
+
+def test_compress_expand_round_trip():
+    for square in range(32):
+        assert compress(expand(1 << square)) == 1 << square
+    assert compress(expand(0xFFFFFFFF)) == 0xFFFFFFFF
+
+
+def test_move_round_trip(corpus):
+    positions, moves = corpus
+    for index, (position, bitmove) in enumerate(zip(positions, moves)):
+        promotion = crowns(position, bitmove)
+        word = pack_bitmove(bitmove, promotion)
+        assert unpack_bitmove(word) == bitmove
+        assert is_promotion(word) == promotion == moves.is_promotion(index)
+
+
+def test_position_round_trip(corpus):
+    positions, _ = corpus
+    for position in positions:
+        unpacked = unpack_position(*pack_position(position))
+        assert unpacked == position
+        assert unpacked.hash == position.hash
+
+
+def test_arrays_index_and_iterate_alike(corpus):
+    positions, moves = corpus
+    assert len(positions) == len(moves) == 5000
+    assert list(positions)[123] == positions[123] and positions[-1] == list(positions)[-1]
+    assert list(moves)[456] == moves[456]
+    assert positions.nbytes() == 16 * len(positions) and moves.nbytes() == 8 * len(moves)
+
+
+def test_arrays_file_round_trip(corpus, tmp_path):
+    positions, moves = corpus
+    with open(tmp_path / 'corpus.positions', 'wb') as outfile:
+        positions.tofile(outfile)
+    with open(tmp_path / 'corpus.moves', 'wb') as outfile:
+        moves.tofile(outfile)
+    with open(tmp_path / 'corpus.positions', 'rb') as infile:
+        assert PositionArray.fromfile(infile, len(positions)).words == positions.words
+    with open(tmp_path / 'corpus.moves', 'rb') as infile:
+        assert MoveArray.fromfile(infile, len(moves)).words == moves.words
+
+
+def test_numpy_views_round_trip(corpus):
+    pytest.importorskip('numpy')
+    positions, moves = corpus
+    assert PositionArray.from_numpy(positions.to_numpy()).words == positions.words
+    assert MoveArray.from_numpy(moves.to_numpy()).words == moves.words
+
+
+def test_game_objects_round_trip(corpus):
+    positions, moves = corpus
+    game = Game()
+    init_game(game)
+    for index in range(0, len(moves), 50):
+        position, bitmove = positions[index], moves[index]
+        set_position(game, position)
+        board, player1_to_move = unpack_board(*pack_board(game.board, position.player1_to_move))
+        assert [[cell.cell_type for cell in row] for row in board.cells] == \
+            [[cell.cell_type for cell in row] for row in game.board.cells]
+        assert player1_to_move == position.player1_to_move
+
+        move = move_from_bitmove(bitmove)
+        move.is_promotion = moves.is_promotion(index)
+        word = pack_move(move, position)
+        assert word == moves.words[index]
+        unpacked = unpack_move(word)
+        assert (unpacked.start_row, unpacked.start_col, unpacked.end_row, unpacked.end_col, unpacked.is_promotion) == \
+            (move.start_row, move.start_col, move.end_row, move.end_col, move.is_promotion)
+
+
+def test_pack_move_rejects_illegal_moves():
+    move = move_from_bitmove(Position.initial().generate_moves()[0])
+    with pytest.raises(ValueError):
+        pack_move(move, Position.initial().with_side(False))
+
+
+def test_pack_move_tells_captures_apart_by_their_count():
+    # The king on 20 reaches 4 over two pieces or over four.
+    position = Position.from_fen('W:WK20:B8,15,16,23,24')
+    for bitmove in position.generate_moves():
+        assert unpack_bitmove(pack_move(move_from_bitmove(bitmove), position)) == bitmove
+
+
+def test_pack_move_rejects_ambiguous_captures():
+    # The king on 27 reaches 4 over three pieces, by way of 20 or of 18.
+    position = Position.from_fen('W:WK27:B8,15,16,21,23,24,25')
+    start, end = SQUARE_MASKS[26], SQUARE_MASKS[3]
+    captures = [bitmove for bitmove in position.generate_moves() if bitmove.start == start and bitmove.end == end]
+    assert len(captures) == 2
+    with pytest.raises(ValueError):
+        pack_move(move_from_bitmove(captures[0]), position)
@@ -0,0 +1,66 @@
+import os
+import random
+import subprocess
+import sys
+
+from bitboard import MASK_TO_ROWCOL, Position
+from engine import (Difficulty, Game, ai_move, check_game_over, init_game, load_game, move_piece, position_from_game,
+                    save_game, set_position)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def new_game():
+    game = Game()
+    init_game(game)
+    return game
+
+
+def test_engine_imports_without_pygame():
+    # A None entry in sys.modules makes "import pygame" fail.
+    code = "import sys; sys.modules['pygame'] = None; import engine"
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True)
+
+
+def test_start_board_is_the_initial_position():
+    assert position_from_game(new_game()) == Position.initial()
+
+
+def test_ai_plays_legal_moves():
+    random.seed(1)
+    game = new_game()
+    for plies in range(200):
+        if check_game_over(game):
+            break
+        position = position_from_game(game)
+        game.difficulty = Difficulty.EASY if plies % 2 else Difficulty.MEDIUM
+        assert ai_move(game)
+        assert position_from_game(game) in [position.play(move) for move in position.generate_moves()]
+        assert game.hash == position_from_game(game).hash
+    assert check_game_over(game)
+
+
+def test_king_capture_ring():
+    game = new_game()
+    position = Position.from_fen('W:WK10,29,31:B1,2,3,14,15,22,23')
+    set_position(game, position)
+    (move,) = position.generate_moves()
+    row, col = MASK_TO_ROWCOL[move.start]
+    assert move_piece(game, row, col, row, col)
+    assert position_from_game(game, False) == position.play(move)
+    assert game.player1.captured_pieces == 4
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / 'saved_game.txt')
+    game = new_game()
+    random.seed(2)
+    for _ in range(15):
+        ai_move(game)
+    save_game(game, path)
+    loaded = Game()
+    assert load_game(loaded, path)
+    assert position_from_game(loaded) == position_from_game(game)
+    assert (loaded.player1.captured_pieces, loaded.player2.moves_made) == \
+        (game.player1.captured_pieces, game.player2.moves_made)
+    assert not load_game(Game(), str(tmp_path / 'missing.txt'))
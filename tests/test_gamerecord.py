@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from engine import check_game_over
+from gamerecord import GameJournal, load_journal, read_records, write_records
+
+
+@pytest.mark.parametrize('keep_open', [True, False])
+@pytest.mark.parametrize('seed', range(5))
+def test_journal_round_trip_with_undo(tmp_path, seed, keep_open, new_game, play_random, snapshot):
+    path = str(tmp_path / 'journal.ckr')
+    game = new_game()
+    journal = GameJournal(path, sync_every=3, keep_open=keep_open)
+    journal.start(game)
+    play_random(game, random.Random(seed), 60, undo_rate=0.3)
+    journal.close()
+
+    loaded = new_game()
+    record = load_journal(loaded, path)
+    assert record is not None and record.result is None
+    assert snapshot(loaded) == snapshot(game)
+    assert loaded.player1.name == game.player1.name and loaded.start_time == game.start_time
+
+
+def test_finished_game_keeps_its_result(tmp_path, new_game, play_random, snapshot):
+    path = str(tmp_path / 'journal.ckr')
+    game = new_game()
+    journal = GameJournal(path)
+    journal.start(game)
+    play_random(game, random.Random(1), 1000)
+    result = check_game_over(game)
+    assert result
+    journal.finish(result)
+
+    loaded = new_game()
+    record = load_journal(loaded, path)
+    assert record.result == result
+    assert check_game_over(loaded) == result
+    assert snapshot(loaded) == snapshot(game)
+
+
+def test_new_game_follows_a_finished_one_and_replaces_the_rest(tmp_path, new_game, play_random, snapshot):
+    path = str(tmp_path / 'journal.ckr')
+    game = new_game()
+    journal = GameJournal(path)
+    journal.start(game)
+    play_random(game, random.Random(1), 1000)
+    journal.finish(check_game_over(game))
+
+    following = new_game()
+    journal.start(following, load_journal(new_game(), path))
+    play_random(following, random.Random(2), 10)
+    journal.close()
+    records = list(read_records(path))
+    assert len(records) == 2 and records[0].result and records[1].result is None
+    loaded = new_game()
+    load_journal(loaded, path)
+    assert snapshot(loaded) == snapshot(following)
+
+    journal.start(new_game())
+    journal.close()
+    assert len(list(read_records(path))) == 1
+
+
+def test_loaded_journal_continues(tmp_path, new_game, play_random, snapshot):
+    path = str(tmp_path / 'journal.ckr')
+    game = new_game()
+    journal = GameJournal(path)
+    journal.start(game)
+    rng = random.Random(2)
+    play_random(game, rng, 20, undo_rate=0.2)
+    journal.close()
+
+    resumed = new_game()
+    journal = GameJournal(path)
+    journal.start(resumed, load_journal(resumed, path))
+    play_random(resumed, rng, 20, undo_rate=0.2)
+    journal.close()
+
+    loaded = new_game()
+    load_journal(loaded, path)
+    assert snapshot(loaded) == snapshot(resumed)
+    assert len(list(read_records(path))) == 1
+
+
+def test_archive_round_trip(tmp_path, random_record):
+    path = str(tmp_path / 'archive.ckr')
+    records = [random_record(seed, plies=30) for seed in range(4)]
+    write_records(path, records)
+
+    read = list(read_records(path))
+    assert [record.to_bytes() for record in read] == [record.to_bytes() for record in records]
+    assert [list(record.positions())[-1] for record in read] == [list(record.positions())[-1] for record in records]
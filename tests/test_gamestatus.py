@@ -0,0 +1,118 @@
+import random
+
+import pytest
+
+from bitboard import Position
+from engine import Game, check_game_over, init_game, play_bitmove, position_from_game, set_position, undo_move
+from gamestatus import MOVE_LIMIT_PLIES, REPETITION_LIMIT, GameStatus
+from pdn import parse_move
+
+KINGS = 'W:WK29:BK4'
+
+
+def game_at(fen):
+    game = Game()
+    init_game(game)
+    set_position(game, Position.from_fen(fen))
+    return game
+
+
+def play(game, text):
+    bitmove = parse_move(game.status.position, text)
+    assert bitmove is not None, text
+    play_bitmove(game, bitmove)
+
+
+def test_third_repetition_is_a_draw():
+    game = game_at(KINGS)
+    shuffle = ['29-25', '4-8', '25-29', '8-4']
+    for repetition in range(1, REPETITION_LIMIT):
+        assert game.status.repetitions[game.hash] == repetition
+        assert check_game_over(game) == 0
+        for text in shuffle:
+            play(game, text)
+    assert game.status.repetition_draw()
+    assert check_game_over(game) == 3
+
+    undo_move(game)
+    assert not game.status.repetition_draw()
+    assert check_game_over(game) == 0
+
+
+def test_move_limit_draw_after_quiet_plies():
+    # Kings wander without repeating a position three times or capturing.
+    rng = random.Random(4)
+    game = game_at('W:WK29,K32:BK1,K4')
+    while len(game.move_history) < MOVE_LIMIT_PLIES:
+        assert not game.status.move_limit_draw()
+        assert check_game_over(game) == 0
+        moves = game.move_cache.moves(game)
+        assert not any(move.captured for move in moves)
+        quiet = [move for move in moves
+                 if not game.status.position.play(move).has_captures()
+                 and game.status.repetitions.get(game.status.position.play(move).hash, 0) < REPETITION_LIMIT - 1]
+        play_bitmove(game, rng.choice(quiet))
+    assert game.status.quiet_plies[-1] == MOVE_LIMIT_PLIES
+    assert game.status.move_limit_draw()
+    assert not game.status.repetition_draw()
+    assert check_game_over(game) == 3
+
+    undo_move(game)
+    assert check_game_over(game) == 0
+
+
+def test_man_moves_and_captures_reset_the_quiet_count():
+    game = game_at('W:WK29,22:BK4,14')
+    play(game, '29-25')
+    play(game, '4-8')
+    assert game.status.quiet_plies[-1] == 2
+    play(game, '22-18')  # a man moves
+    assert game.status.quiet_plies[-1] == 0
+    play(game, '14x23')  # Black must capture
+    assert game.status.quiet_plies[-1] == 0
+    undo_move(game)
+    undo_move(game)
+    assert game.status.quiet_plies[-1] == 2
+
+
+def test_side_without_moves_loses():
+    # The side to move has pieces left, but they are all blocked.
+    game = game_at('B:W5,6,10:B1')
+    assert check_game_over(game) == 1
+    game = game_at('W:W32:BK23,K27,K28')
+    assert check_game_over(game) == 2
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_status_follows_random_games(seed, new_game):
+    rng = random.Random(seed)
+    game = new_game()
+    for _ in range(300):
+        status = game.status
+        position = position_from_game(game)
+        assert status.position == position and status.position.hash == game.hash
+        assert status.pieces == [(position.player1_men | position.player1_kings).bit_count(),
+                                 (position.player2_men | position.player2_kings).bit_count()]
+        assert status.repetitions[game.hash] == game.hash_history.count(game.hash)
+        assert status.has_moves(position.player1_to_move) == bool(position.generate_moves())
+        if check_game_over(game):
+            break
+        play_bitmove(game, rng.choice(game.move_cache.moves(game)))
+        if rng.random() < 0.1:
+            undo_move(game)
+
+
+def test_move_out_of_turn_is_refused(snapshot):
+    game = game_at('B:W5,6,10,24:B1,20')
+    white_move = Position.from_fen('W:W5,6,10,24:B1,20').generate_moves()[0]
+    before = snapshot(game)
+    with pytest.raises(ValueError):
+        play_bitmove(game, white_move)
+    assert snapshot(game) == before
+    assert game.status.position == position_from_game(game) and not game.history.can_undo()
+
+
+def test_status_reset():
+    status = GameStatus(Position.from_fen(KINGS))
+    assert status.pieces == [1, 1] and status.quiet_plies == [0] and not status.is_draw()
+    assert status.result() == 0
@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+from bitboard import Position
+from engine import goto_ply, play_bitmove, position_from_game, redo_move, undo_move
+
+
+@pytest.fixture
+def play_game(new_game, play_random):
+    # A random game and the snapshot after every ply, the start included.
+    def play_game(seed, plies=300):
+        game = new_game()
+        return game, play_random(game, random.Random(seed), plies)
+    return play_game
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_undo_and_redo_match_the_replay(seed, play_game, snapshot):
+    game, snapshots = play_game(seed)
+    plies = len(snapshots) - 1
+    for ply in range(plies, 0, -1):
+        assert undo_move(game)
+        assert snapshot(game) == snapshots[ply - 1]
+    assert not undo_move(game)
+    for ply in range(1, plies + 1):
+        assert redo_move(game)
+        assert snapshot(game) == snapshots[ply]
+    assert not redo_move(game)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_goto_ply_matches_the_replay(seed, play_game, snapshot):
+    game, snapshots = play_game(seed)
+    rng = random.Random(seed)
+    for _ in range(20):
+        ply = rng.randrange(len(snapshots))
+        goto_ply(game, ply)
+        assert snapshot(game) == snapshots[ply]
+    assert position_from_game(game).hash == game.hash
+
+
+def test_history_steps_unmake_to_the_start(play_game):
+    game, _ = play_game(1)
+    position = position_from_game(game)
+    for bitmove, undo in reversed(game.history.line()):
+        position.unmake(bitmove, undo)
+    assert position == Position.initial()
+    assert position.hash == Position.initial().hash
+
+
+def test_new_move_after_undo_drops_the_redo_line(play_game, snapshot):
+    game, snapshots = play_game(2, plies=10)
+    undo_move(game)
+    undo_move(game)
+    moves = game.move_cache.moves(game)
+    undone = game.history.next()[0]
+    other = next(move for move in moves if move != undone)
+    play_bitmove(game, other)
+    assert not game.history.can_redo()
+    assert len(game.history) == len(snapshots) - 2
+    undo_move(game)
+    assert snapshot(game) == snapshots[-3]
+    redo_move(game)
+    assert game.history.line()[-1][0] == other
+
+
+def test_replaying_the_undone_move_keeps_the_redo_line(play_game, snapshot):
+    game, snapshots = play_game(3, plies=10)
+    undo_move(game)
+    undo_move(game)
+    play_bitmove(game, game.history.next()[0])
+    assert game.history.can_redo()
+    assert redo_move(game)
+    assert snapshot(game) == snapshots[-1]
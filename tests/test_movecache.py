@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from bitboard import ROWCOL_TO_MASK
+from engine import (CellType, MoveCache, check_game_over, load_game, piece_owner_is_player1, play_bitmove,
+                    position_from_game, redo_move, save_game, set_position, undo_move)
+
+
+def assert_cache_matches(game):
+    moves = {}
+    for player1_to_move in (True, False):
+        moves[player1_to_move] = position_from_game(game, player1_to_move).generate_moves()
+        assert game.move_cache.moves(game, player1_to_move) == moves[player1_to_move]
+    for (row, col), mask in ROWCOL_TO_MASK.items():
+        piece = game.board.cells[row][col].cell_type
+        expected = [] if piece == CellType.EMPTY else \
+            [move for move in moves[piece_owner_is_player1(piece)] if move.start == mask]
+        assert game.move_cache.moves_from(game, row, col) == expected
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_cached_moves_match_generation(tmp_path, seed, new_game, random_walk):
+    rng = random.Random(seed)
+    positions = [position for position, _ in random_walk(seed, plies=100)]
+    path = str(tmp_path / 'saved.txt')
+    game = new_game()
+    # A small cache, so entries are evicted and regenerated along the way.
+    game.move_cache = MoveCache(16)
+    for _ in range(400):
+        assert_cache_matches(game)
+        action = rng.random()
+        if action < 0.15:
+            undo_move(game)
+        elif action < 0.25:
+            redo_move(game)
+        elif action < 0.28:
+            set_position(game, rng.choice(positions))
+        elif action < 0.31:
+            save_game(game, path)
+            play_bitmove(game, rng.choice(game.move_cache.moves(game)))
+            load_game(game, path)
+        elif check_game_over(game):
+            set_position(game, rng.choice(positions))
+        else:
+            play_bitmove(game, rng.choice(game.move_cache.moves(game)))
+    assert game.move_cache.hits and game.move_cache.misses
+
+
+def test_least_recently_used_entry_is_evicted(new_game):
+    game = new_game()
+    game.move_cache = MoveCache(2)
+    start = game.hash
+    first, second = game.move_cache.moves(game)[:2]
+    play_bitmove(game, first)
+    game.move_cache.moves(game)
+    evicted = game.hash
+    undo_move(game)
+    game.move_cache.moves(game)
+    play_bitmove(game, second)
+    game.move_cache.moves(game)
+    assert list(game.move_cache.entries) == [start, game.hash]
+    assert evicted not in game.move_cache.entries
+    latest = game.hash
+    hits = game.move_cache.hits
+    undo_move(game)
+    game.move_cache.moves(game)
+    assert game.move_cache.hits == hits + 1
+    assert list(game.move_cache.entries) == [latest, start]
@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+from bitboard import Position
+from gamerecord import write_records
+from openingbook import OpeningBook, build_book, merge_books, read_book
+
+PLIES = 6
+
+
+@pytest.fixture
+def records(random_record):
+    # Three openings, each played three times with every result, and one unfinished game.
+    records = []
+    for index in range(10):
+        record = random_record(index % 3, plies=10)
+        record.result = index % 4
+        records.append(record)
+    return records
+
+
+def expected_stats(records):
+    stats = {}
+    for record in records:
+        if not record.result:
+            continue
+        for ply, (position, bitmove) in enumerate(record.bitmoves()):
+            if ply >= PLIES:
+                break
+            half_points = 1 if record.result == 3 else 2 * ((record.result == 1) == position.player1_to_move)
+            entry = stats.setdefault(position.hash, {}).setdefault(bitmove, [0, 0])
+            entry[0] += 1
+            entry[1] += half_points
+    return stats
+
+
+def build(tmp_path, name, records, processes=2):
+    write_records(str(tmp_path / (name + '.ckr')), records)
+    path = str(tmp_path / (name + '.bin'))
+    build_book([str(tmp_path / (name + '.ckr'))], path, plies=PLIES, min_games=1, processes=processes)
+    return path
+
+
+def test_lookups_match_the_games(tmp_path, records):
+    book = OpeningBook(build(tmp_path, 'book', records))
+    stats = expected_stats(records)
+    assert len(book) == sum(len(moves) for moves in stats.values())
+    for record in records:
+        for position in list(record.positions())[:PLIES]:
+            expected = stats[position.hash]
+            found = book.lookup(position)
+            assert {move: [games, round(score * 2 * games)] for move, games, score in found} == expected
+            assert [games for _, games, _ in found] == sorted((games for games, _ in expected.values()), reverse=True)
+    start = book.lookup(Position.initial())
+    assert sum(games for _, games, _ in start) == 7
+    book.close()
+
+
+def test_merged_books_equal_one_built_from_all_games(tmp_path, records):
+    merged = str(tmp_path / 'merged.bin')
+    merge_books([build(tmp_path, 'first', records[:4]), build(tmp_path, 'second', records[4:])], merged)
+    whole = build(tmp_path, 'whole', records)
+    assert list(read_book(merged)) == list(read_book(whole))
+    with open(merged, 'rb') as first, open(whole, 'rb') as second:
+        assert first.read() == second.read()
+
+
+def test_book_does_not_depend_on_the_process_count(tmp_path, records):
+    single = build(tmp_path, 'single', records, processes=1)
+    with open(single, 'rb') as first, open(build(tmp_path, 'several', records, processes=3), 'rb') as second:
+        assert first.read() == second.read()
+
+
+def test_positions_outside_the_book(tmp_path, records):
+    book = OpeningBook(build(tmp_path, 'book', records))
+    position = Position.from_fen('W:W18,30:B14')
+    assert book.lookup(position) == []
+    assert book.choose(position, 'MEDIUM') is None
+    late = list(records[0].positions())[PLIES + 1]
+    assert book.lookup(late) == [] and book.choose(late, 'HARD') is None
+    book.close()
+
+    missing = OpeningBook(str(tmp_path / 'missing.bin'))
+    assert len(missing) == 0 and missing.lookup(Position.initial()) == []
+    assert missing.choose(Position.initial(), 'EASY') is None
+
+
+def test_choose_keeps_to_book_moves(tmp_path, records):
+    book = OpeningBook(build(tmp_path, 'book', records))
+    rng = random.Random(1)
+    moves = {move: games for move, games, _ in book.lookup(Position.initial())}
+    for difficulty in ('EASY', 'MEDIUM', 'HARD'):
+        for _ in range(20):
+            move = book.choose(Position.initial(), difficulty, rng)
+            assert move in moves
+            assert difficulty != 'HARD' or moves[move] >= 2
+    book.close()
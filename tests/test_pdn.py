@@ -0,0 +1,92 @@
+import io
+
+import pytest
+
+from bitboard import Position
+from gamerecord import read_records
+from pdn import (PDNError, PDNGame, convert_pdn, export_records, format_game, format_pdn_move, iter_games, parse_game,
+                 parse_move, read_games, write_pdn)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_write_parse_round_trip(seed, random_record):
+    record = random_record(seed)
+    game = PDNGame.from_record(record)
+    parsed = parse_game(format_game(game))
+    assert parsed.moves == game.moves
+    assert parsed.result == record.result
+    assert parsed.tags['White'] == "White" and parsed.tags['Black'] == "Black"
+    assert parsed.to_record().to_bytes() == record.to_bytes()
+
+
+def test_standard_start_needs_no_fen_tag(random_record):
+    record = random_record(0, plies=10, start=Position.from_fen('B:W21-32:B1-12'))
+    game = PDNGame.from_record(record)
+    assert 'FEN' not in game.tags
+    assert parse_game(format_game(game)).to_record().to_bytes() == record.to_bytes()
+
+
+def test_parse_skips_comments_variations_and_annotations():
+    text = ('[Event "Test"]\n[Result "1-0"]\n\n'
+            '1. 11-15 {a comment} 24-19 2. 15x24 (2. 8-11 22-18) 28x19! 3. 8-11 $1 22-18 1-0\n')
+    game = parse_game(text)
+    assert game.moves == ['11-15', '24-19', '15x24', '28x19', '8-11', '22-18']
+    assert game.result == 1
+    assert game.tags['Event'] == "Test"
+    assert len(list(game.positions())) == 7
+
+
+def test_illegal_move_is_reported():
+    game = parse_game('1. 11-20 *')
+    with pytest.raises(PDNError):
+        game.to_record()
+
+
+def test_ambiguous_king_capture_needs_its_path():
+    # The king on 20 can reach 4 over two pieces or round over four.
+    position = Position.from_fen('W:WK20:B8,15,16,23,24')
+    with pytest.raises(PDNError, match='Ambiguous'):
+        parse_move(position, '20x4')
+    with pytest.raises(PDNError, match='Ambiguous'):
+        parse_game('[FEN "W:WK20:B8,15,16,23,24"]\n\n1. 20x4 *').to_record()
+    for path, captured in (('20x11x4', 2), ('20x27x18x11x4', 4)):
+        move = parse_move(position, path)
+        assert move.captured.bit_count() == captured
+        assert format_pdn_move(position, move) == path
+    assert parse_move(position, '20x27x4') is None
+
+
+def test_read_games_splits_a_stream(random_record):
+    records = [random_record(seed, plies=40) for seed in range(5)]
+    stream = io.StringIO()
+    write_pdn(stream, [PDNGame.from_record(record) for record in records])
+    stream.seek(0)
+    games = list(read_games(stream))
+    assert [game.to_record().to_bytes() for game in games] == [record.to_bytes() for record in records]
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_convert_and_export_round_trip(tmp_path, processes, random_record):
+    records = [random_record(seed, plies=60) for seed in range(12)]
+    pdn_path = str(tmp_path / 'games.pdn')
+    with open(pdn_path, 'w') as outfile:
+        write_pdn(outfile, [PDNGame.from_record(record) for record in records])
+    archive_path = str(tmp_path / 'games.ckr')
+    summary = convert_pdn(pdn_path, archive_path, processes)
+    assert summary['games'] == len(records) and not summary['errors']
+    assert [record.to_bytes() for record in read_records(archive_path)] == [record.to_bytes() for record in records]
+
+    exported = io.StringIO()
+    assert export_records(archive_path, exported) == len(records)
+    with open(pdn_path) as infile:
+        assert exported.getvalue() == infile.read()
+
+
+def test_iter_games_shares_games_between_workers(tmp_path, random_record):
+    pdn_path = str(tmp_path / 'games.pdn')
+    with open(pdn_path, 'w') as outfile:
+        write_pdn(outfile, [PDNGame.from_record(random_record(seed, plies=20)) for seed in range(7)])
+    every = [game_id for game_id, _ in iter_games([pdn_path])]
+    shares = [[game_id for game_id, _ in iter_games([pdn_path], worker, 3)] for worker in range(3)]
+    assert len(every) == 7
+    assert sorted(sum(shares, [])) == sorted(every)
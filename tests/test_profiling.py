@@ -0,0 +1,45 @@
+import sys
+import types
+
+import gamerecord  # noqa: F401  (modules that import hot paths by name)
+import pdn  # noqa: F401
+import server  # noqa: F401
+import engine
+from profiling import HOT_PATHS, Profiler
+
+
+class Renderer:
+    def draw(self):
+        return 'drawn'
+
+
+def module_attributes():
+    return {(name, key): value for name, module in list(sys.modules.items())
+            for key, value in list(vars(module).items())}
+
+
+def test_disable_restores_every_original(monkeypatch, new_game):
+    menus = types.ModuleType('menus')
+    menus.draw_main_menu = lambda: 'menu'
+    monkeypatch.setitem(sys.modules, 'menus', menus)
+    before = module_attributes()
+    draw = Renderer.draw
+
+    profiler = Profiler()
+    profiler.enable(Renderer)
+    assert engine.check_game_over is not before[('engine', 'check_game_over')]
+    assert server.check_game_over is engine.check_game_over
+    assert Renderer.draw is not draw and menus.draw_main_menu is not before[('menus', 'draw_main_menu')]
+    game = new_game()
+    assert not server.check_game_over(game)
+    assert Renderer().draw() == 'drawn' and menus.draw_main_menu() == 'menu'
+    assert set(HOT_PATHS) <= set(profiler.timings)
+    assert profiler.timings['check_game_over'][0] >= 1 and profiler.timings['Renderer.draw'][0] == 1
+    assert profiler.timings['draw_main_menu'][0] == 1
+
+    profiler.disable()
+    after = module_attributes()
+    assert after.keys() == before.keys()
+    assert all(after[key] is value for key, value in before.items())
+    assert Renderer.draw is draw
+    assert gamerecord.play_bitmove is engine.play_bitmove is before[('engine', 'play_bitmove')]
@@ -0,0 +1,66 @@
+import pytest
+
+from bitboard import Position, format_move
+from search import WIN_SCORE, Searcher
+from zobrist import TranspositionTable
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_make_unmake_restores_position_and_hash(seed, random_walk):
+    for position, move in random_walk(seed):
+        before = position.copy()
+        undo = position.make(move)
+        rehashed = Position(position.player1_men, position.player1_kings, position.player2_men,
+                            position.player2_kings, position.player1_to_move)
+        assert position.hash == rehashed.hash
+        position.unmake(move, undo)
+        assert position == before
+        assert position.hash == before.hash
+
+
+def test_random_walks_cover_crowning_and_multi_jumps(random_walk):
+    promotions = multi_jumps = 0
+    for seed in range(20):
+        for position, move in random_walk(seed):
+            promotions += position.copy().make(move) & 1
+            multi_jumps += move.captured.bit_count() > 1
+    assert promotions and multi_jumps
+
+
+@pytest.mark.parametrize('tt', [None, 1])
+def test_search_returns_a_legal_move_at_full_depth(tt):
+    position = Position.from_fen('W:W18,19,22,24,27,29,32:B1,4,5,6,8,11,12,13')
+    before = position.copy()
+    result = Searcher(max_depth=5, tt=TranspositionTable(tt) if tt else None).search(position)
+    assert position == before
+    assert position.hash == before.hash
+    assert result.best_move in position.generate_moves()
+    assert result.depth == 5
+
+
+def test_search_finds_winning_capture():
+    # White's jump 18x9 takes Black's last piece.
+    position = Position.from_fen('W:W18,30:B14')
+    result = Searcher(max_depth=4).search(position)
+    assert format_move(result.best_move) == '18x9'
+    assert result.score >= WIN_SCORE - 4
+
+
+def test_side_without_moves_has_lost():
+    result = Searcher(max_depth=4).search(Position.from_fen('B:W5,6,10:B1'))
+    assert result.best_move is None and result.score == -WIN_SCORE
+
+
+def test_iterations_are_reported():
+    iterations = []
+    Searcher(max_depth=4, on_iteration=iterations.append).search(Position.initial())
+    assert [result.depth for result in iterations] == [1, 2, 3, 4]
+    assert all(result.best_move in Position.initial().generate_moves() for result in iterations)
+
+
+@pytest.mark.parametrize('limit', [{'node_limit': 200}, {'time_limit': 0.05}])
+def test_limits_still_return_a_legal_move(limit):
+    position = Position.initial()
+    result = Searcher(**limit).search(position)
+    assert result.best_move in position.generate_moves()
+    assert result.depth >= 1
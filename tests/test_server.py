@@ -0,0 +1,144 @@
+import asyncio
+import json
+
+import pytest
+
+import server
+from server import GameServer
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def send_line(self, line):
+        self.writer.write(line + b'\n')
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())
+
+    async def send(self, **request):
+        return await self.send_line(json.dumps(request).encode())
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def run_server(directory, test, **options):
+    # Runs test(connect) against a server listening on an ephemeral port.
+    async def main():
+        game_server = GameServer(str(directory), processes=1, **options)
+        listener = await asyncio.start_server(game_server.handle_client, '127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+
+        async def connect():
+            return Client(*await asyncio.open_connection('127.0.0.1', port))
+        try:
+            return await test(connect)
+        finally:
+            listener.close()
+            await listener.wait_closed()
+            game_server.close()
+    return asyncio.run(main())
+
+
+def test_new_game_and_move(tmp_path):
+    async def test(connect):
+        client = await connect()
+        state = await client.send(op='new', difficulty='EASY', id=7)
+        assert state['ok'] and state['id'] == 7 and state['player1_to_move']
+        assert len(state['moves']) == 7 and '22-18' in state['moves']
+        state = await client.send(op='move', move='22-18')
+        assert state['ok'] and state['reply'] and state['player1_to_move']
+        assert state == dict(await client.send(op='state'), reply=state['reply'])
+        await client.close()
+    run_server(tmp_path, test)
+
+
+def test_malformed_requests(tmp_path):
+    async def test(connect):
+        client = await connect()
+        reply = await client.send_line(b'{"op": "new"')
+        assert not reply['ok'] and reply['error']
+        reply = await client.send_line(b'[1, 2]')
+        assert reply == {'ok': False, 'error': "requests must be JSON objects"}
+        reply = await client.send(op='state', id='x')
+        assert not reply['ok'] and reply['id'] == 'x' and 'no session' in reply['error']
+        reply = await client.send(op='new', difficulty='IMPOSSIBLE')
+        assert not reply['ok'] and 'unknown difficulty' in reply['error']
+        assert (await client.send(op='new', difficulty='EASY'))['ok']
+        reply = await client.send(op='fly')
+        assert reply == {'ok': False, 'error': "unknown op fly"}
+        await client.close()
+    run_server(tmp_path, test)
+
+
+def test_illegal_move_is_refused(tmp_path):
+    async def test(connect):
+        client = await connect()
+        state = await client.send(op='new', difficulty='EASY')
+        for move in ('22-26', '9-13', '23x14', 'nonsense', None):
+            reply = await client.send(op='move', move=move)
+            assert not reply['ok'] and reply['error'] == f"illegal move {move}"
+        assert await client.send(op='state') == state
+        await client.close()
+    run_server(tmp_path, test)
+
+
+def test_resume_after_reconnect_and_restart(tmp_path):
+    async def play(connect):
+        client = await connect()
+        state = await client.send(op='new', difficulty='MEDIUM')
+        for _ in range(3):
+            state = await client.send(op='move', move=state['moves'][0])
+        await client.close()
+
+        client = await connect()
+        resumed = await client.send(op='resume', session=state['session'])
+        assert resumed == dict(state, reply=None)
+        reply = await client.send(op='resume', session='0123456789abcdef')
+        assert not reply['ok'] and 'unknown session' in reply['error']
+        reply = await client.send(op='resume', session='../../etc/passwd')
+        assert not reply['ok'] and 'unknown session' in reply['error']
+        await client.close()
+        return state
+
+    state = run_server(tmp_path, play)
+
+    async def resume(connect):
+        client = await connect()
+        resumed = await client.send(op='resume', session=state['session'])
+        await client.close()
+        return resumed
+    assert run_server(tmp_path, resume) == dict(state, reply=None)
+
+
+def test_internal_error_is_answered(tmp_path, monkeypatch):
+    def broken_think(position, difficulty, *args, **kwargs):
+        raise RuntimeError("no moves today")
+
+    async def test(connect):
+        client = await connect()
+        state = await client.send(op='new', difficulty='EASY')
+        monkeypatch.setattr(server, 'think', broken_think)
+        reply = await client.send(op='move', move='22-18', id=3)
+        assert reply == {'ok': False, 'error': "internal error: RuntimeError('no moves today')", 'id': 3}
+        # The connection survives, and resuming plays the reply that failed.
+        state = await client.send(op='state')
+        assert state['ok'] and not state['player1_to_move'] and not state['moves']
+        monkeypatch.undo()
+        state = await client.send(op='resume', session=state['session'])
+        assert state['ok'] and state['reply'] and state['player1_to_move']
+        await client.close()
+    run_server(tmp_path, test)
+
+
+def test_search_reply_from_the_process_pool(tmp_path):
+    async def test(connect):
+        client = await connect()
+        await client.send(op='new', difficulty='HARD')
+        state = await client.send(op='move', move='22-18')
+        assert state['ok'] and state['reply'] and state['player1_to_move']
+        await client.close()
+    run_server(tmp_path, test, budget=(None, 500))
@@ -0,0 +1,105 @@
+import multiprocessing
+import time
+
+import pytest
+
+import smp
+from bitboard import Position, pack_move, unpack_move
+from search import Searcher
+from smp import HelperPool, ParallelSearcher, SharedTranspositionTable, make_searcher
+from zobrist import EXACT, LOWER_BOUND, TranspositionTable
+
+KEY = 0x123456789ABCDEF
+
+
+@pytest.fixture
+def shared_tt():
+    tt = SharedTranspositionTable(1)
+    yield tt
+    tt.close()
+
+
+def store_and_probe(tt, replies):
+    replies.put(tt.probe(KEY))
+    tt.store(KEY + 1, 7, -99990, LOWER_BOUND, 42)
+
+
+def test_entries_are_shared_between_processes(shared_tt):
+    move = pack_move(Position.initial().generate_moves()[0])
+    shared_tt.store(KEY, 5, 1234, EXACT, move)
+    replies = multiprocessing.Queue()
+    process = multiprocessing.Process(target=store_and_probe, args=(shared_tt, replies))
+    process.start()
+    assert replies.get(timeout=10) == (5, 1234, EXACT, move)
+    process.join(10)
+    assert shared_tt.probe(KEY + 1) == (7, -99990, LOWER_BOUND, 42)
+    assert unpack_move(shared_tt.probe(KEY)[3]) == Position.initial().generate_moves()[0]
+
+
+def test_torn_entries_read_as_misses(shared_tt):
+    shared_tt.store(KEY, 5, 1234, EXACT, 77)
+    slot = [shared_tt._key_at(slot) for slot in range(shared_tt.size)].index(KEY)
+    # Another process's write to the same slot got only as far as the data word.
+    shared_tt.data[slot] ^= 1 << 21
+    assert shared_tt.probe(KEY) is None
+    assert shared_tt.misses == 1 and shared_tt.hits == 0
+    shared_tt.store(KEY, 5, 1234, EXACT, 77)
+    shared_tt.moves[slot] = 78
+    assert shared_tt.probe(KEY) is None
+
+
+def test_generation_is_shared(shared_tt):
+    shared_tt.new_search()
+    assert shared_tt.generation == 0
+    shared_tt.next_search()
+    assert shared_tt.generation == 1
+    shared_tt.store(KEY, 5, 1234, EXACT)
+    shared_tt.clear()
+    assert shared_tt.generation == 0 and shared_tt.probe(KEY) is None
+
+
+@pytest.fixture
+def helpers(shared_tt):
+    pool = HelperPool(2, shared_tt)
+    yield pool
+    pool.close()
+
+
+@pytest.mark.parametrize('fen', ['W:W18,30:B14', 'B:W6,18,21,22,27,28,29,30,32:B1,2,3,4,5,15,16,19',
+                                 'W:W15,17,21,22,23,26,27,28,29,30,31,32:B1,2,3,4,5,6,7,8,9,10,11'])
+def test_parallel_search_agrees_with_the_single_search(helpers, fen):
+    position = Position.from_fen(fen)
+    expected = Searcher(max_depth=6, tt=TranspositionTable(1)).search(position.copy())
+    searcher = make_searcher(helpers, max_depth=6)
+    assert isinstance(searcher, ParallelSearcher) and searcher.tt is helpers.tt
+    result = searcher.search(position)
+    assert result.depth >= expected.depth and result.best_move in position.generate_moves()
+    assert result.score == expected.score
+    assert result.nodes > expected.nodes // 2
+
+
+def test_helpers_answer_every_search(helpers):
+    position = Position.initial()
+    for depth in (2, 4):
+        generation = helpers.start(position, [], depth)
+        results = helpers.stop(generation)
+        assert len(results) == 2
+        assert all(result.best_move in position.generate_moves() for result in results)
+
+
+def test_stop_does_not_wait_for_a_dead_helper(helpers, monkeypatch):
+    position = Position.initial()
+    helpers.processes[0].terminate()
+    helpers.processes[0].join(10)
+    start_time = time.monotonic()
+    results = helpers.stop(helpers.start(position, [], 4))
+    assert len(results) == 1 and results[0].best_move in position.generate_moves()
+    assert time.monotonic() - start_time < smp.STOP_TIMEOUT
+
+    # Seen from another process, which cannot check on the helpers, stop gives up at the timeout.
+    monkeypatch.setattr(smp, 'STOP_TIMEOUT', 0.5)
+    processes = helpers.__dict__.pop('processes')
+    try:
+        assert len(helpers.stop(helpers.start(position, [], 4))) == 1
+    finally:
+        helpers.processes = processes
@@ -0,0 +1,113 @@
+import random
+
+import pytest
+
+import engine
+from engine import Game, check_game_over, init_game, set_position
+from evaluation import WIN_SCORE
+from gamestatus import MOVE_LIMIT_PLIES
+from search import Searcher
+from tablebase import (DRAW, LOSS, MAX_DISTANCE, WIN, Tablebase, decode, encode, generate, iter_positions,
+                       signatures)
+
+PIECES = 3
+SEARCH_DEPTH = 7  # decided positions at most this far from the end are checked against the search
+
+
+@pytest.fixture(scope='module')
+def tablebase(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('tablebases'))
+    generate(PIECES, directory, processes=1)
+    tablebase = Tablebase(directory)
+    yield tablebase
+    tablebase.close()
+
+
+def sample_positions(count, seed=1):
+    rng = random.Random(seed)
+    positions = [position for sig in signatures(PIECES) for position in iter_positions(sig)]
+    return rng.sample(positions, count)
+
+
+def test_encode_decode_round_trip():
+    for distance in range(1, MAX_DISTANCE + 1, 2):
+        assert decode(encode(WIN, distance)) == (WIN, distance)
+    for distance in range(0, MAX_DISTANCE + 2, 2):
+        assert decode(encode(LOSS, distance)) == (LOSS, distance)
+    assert decode(encode(DRAW, 0)) == (DRAW, 0)
+
+
+@pytest.mark.parametrize('result, distance', [(WIN, MAX_DISTANCE + 2), (LOSS, MAX_DISTANCE + 3)])
+def test_encode_refuses_distances_that_do_not_fit(result, distance):
+    with pytest.raises(ValueError):
+        encode(result, distance)
+
+
+def test_probes_agree_with_their_successors(tablebase):
+    # Retrograde consistency: a win has a successor lost one ply sooner and
+    # none lost sooner still, a loss has only won successors, the longest one
+    # ply shorter, and a draw has no lost successor.
+    for position in sample_positions(3000):
+        result, distance = tablebase.probe(position)
+        successors = [tablebase.probe(position.play(move)) for move in position.generate_moves()]
+        lost = [entry[1] for entry in successors if entry[0] == LOSS]
+        if result == WIN:
+            assert min(lost) == distance - 1
+        elif result == LOSS:
+            assert all(entry[0] == WIN for entry in successors)
+            assert distance == (max(entry[1] for entry in successors) + 1 if successors else 0)
+        else:
+            assert not lost and any(entry[0] == DRAW for entry in successors)
+
+
+def test_probes_agree_with_search(tablebase):
+    checked = 0
+    for position in sample_positions(3000, seed=2):
+        result, distance = tablebase.probe(position)
+        if result == DRAW or distance > SEARCH_DEPTH:
+            continue
+        score = Searcher(max_depth=distance).search(position.copy()).score if distance else -WIN_SCORE
+        assert score == result * (WIN_SCORE - distance), position.to_fen()
+        checked += 1
+    assert checked > 100
+
+
+def test_best_move_keeps_the_result(tablebase):
+    for position in sample_positions(1000, seed=3):
+        result, distance = tablebase.probe(position)
+        move = tablebase.best_move(position)
+        if not position.generate_moves():
+            assert move is None
+            continue
+        after = tablebase.probe(position.play(move))
+        if result == DRAW:
+            assert after[0] == DRAW
+        else:
+            assert after == (-result, distance - 1)
+
+
+def test_best_move_leaves_wins_beyond_the_budget(tablebase):
+    for position in sample_positions(1000, seed=4):
+        result, distance = tablebase.probe(position)
+        if result == WIN and distance > 1:
+            assert tablebase.best_move(position, distance) is not None
+            assert tablebase.best_move(position, distance - 1) is None
+        elif result != WIN and position.generate_moves():
+            assert tablebase.best_move(position, 0) is not None
+
+
+def test_live_games_respect_the_move_limit(tablebase, monkeypatch):
+    monkeypatch.setattr(engine, '_tablebase', tablebase)
+    monkeypatch.setattr(engine, 'TABLEBASE_ADJUDICATION', True)
+    position = next(position for position in sample_positions(1000, seed=5)
+                    if tablebase.probe(position)[0] == WIN and tablebase.probe(position)[1] > 1)
+    distance = tablebase.probe(position)[1]
+    game = Game()
+    init_game(game)
+    set_position(game, position)
+    assert check_game_over(game) == (1 if position.player1_to_move else 2)
+    assert engine.tablebase_move(position, MOVE_LIMIT_PLIES - distance) is not None
+
+    game.status.quiet_plies[-1] = MOVE_LIMIT_PLIES - distance + 1
+    assert check_game_over(game) == 0
+    assert engine.tablebase_move(position, game.status.quiet_plies[-1]) is None
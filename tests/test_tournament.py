@@ -0,0 +1,87 @@
+import math
+from collections import Counter
+
+import pytest
+
+import tournament
+from tournament import EngineSpec, Stats, elo_from_score, expected_score, run_game, run_tournament, sprt_bounds
+
+
+def stats(wins, draws, losses):
+    result = Stats()
+    for score, count in ((1, wins), (0.5, draws), (0, losses)):
+        for _ in range(count):
+            result.add(score)
+    return result
+
+
+def test_stats_for_known_results():
+    result = stats(60, 20, 20)
+    assert result.games == 100 and result.score() == pytest.approx(0.7)
+    assert result.variance() == pytest.approx(0.16)
+    elo, margin = result.elo()
+    assert elo == pytest.approx(147.19, abs=0.01)
+    assert margin == pytest.approx((elo_from_score(0.7784) - elo_from_score(0.6216)) / 2)
+    assert margin == pytest.approx(66.01, abs=0.01)
+    assert result.los() == pytest.approx(0.5 * (1 + math.erf(40 / math.sqrt(160))))
+    assert result.llr(0, 20) == pytest.approx(3.3355, abs=1e-4)
+
+
+def test_even_results():
+    result = stats(10, 30, 10)
+    assert result.elo()[0] == pytest.approx(0)
+    assert result.los() == pytest.approx(0.5)
+    assert result.llr(-10, 10) == pytest.approx(0)
+    assert Stats().elo() == (0.0, 0.0) and Stats().llr(0, 20) == 0.0
+
+
+def test_elo_and_expected_score_are_inverse():
+    for elo in (-400, -35, 0, 12.5, 200):
+        assert elo_from_score(expected_score(elo)) == pytest.approx(elo)
+
+
+def test_engine_specs():
+    spec = EngineSpec('search:time=0.5,nodes=2000,weights=tuned.json')
+    assert spec.is_search() and spec.options == {'time': 0.5, 'nodes': 2000.0, 'weights': 'tuned.json'}
+    assert not EngineSpec('easy').is_search()
+    with pytest.raises(ValueError):
+        EngineSpec('grandmaster')
+
+
+def test_run_game_with_real_engines():
+    index, result = run_game((1, 'easy', 'search:depth=2,tt=1', 1, 4, 30))
+    assert index == 1 and result in (0, 0.5, 1)
+
+
+def fake_play_game(log_path, winner):
+    # Logs (opening, Player 1) and lets engine winner win every game.
+    def play_game(player1, player2, position, max_plies):
+        with open(log_path, 'a') as log:
+            log.write(f"{position.to_fen()} {player1.spec.text}\n")
+        return 1 if player1.spec.text == winner else 0
+    return play_game
+
+
+def test_each_opening_is_played_with_both_colours(tmp_path, monkeypatch):
+    log_path = str(tmp_path / 'games.log')
+    monkeypatch.setattr(tournament, 'play_game', fake_play_game(log_path, 'easy'))
+    summary = run_tournament('easy', 'medium', 12, processes=2, seed=5)
+    assert (summary['wins'], summary['draws'], summary['losses']) == (12, 0, 0)
+    with open(log_path) as log:
+        games = Counter(tuple(line.split()) for line in log)
+    assert sum(games.values()) == 12
+    for fen in {fen for fen, _ in games}:
+        assert games[(fen, 'easy')] == games[(fen, 'medium')] > 0
+
+
+@pytest.mark.parametrize('winner, hypothesis', [('easy', 'H1'), ('medium', 'H0')])
+def test_sprt_stops_at_its_bounds(tmp_path, monkeypatch, winner, hypothesis):
+    monkeypatch.setattr(tournament, 'play_game', fake_play_game(str(tmp_path / 'games.log'), winner))
+    summary = run_tournament('easy', 'medium', 200, processes=2, sprt=(0, 20, 0.05, 0.05))
+    lower, upper = sprt_bounds(0.05, 0.05)
+    assert summary['sprt']['result'] == hypothesis
+    assert summary['games'] < 20
+    assert summary['sprt']['llr'] >= upper if hypothesis == 'H1' else summary['sprt']['llr'] <= lower
+    # One game fewer would not have crossed the bound.
+    previous = stats(summary['wins'] - (winner == 'easy'), 0, summary['losses'] - (winner == 'medium'))
+    assert lower < previous.llr(0, 20) < upper
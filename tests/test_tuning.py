@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from batch_evaluation import pack_positions, random_positions, unpack_positions  # noqa: E402
+from bitboard import Position  # noqa: E402
+from tuning import RESULT, ROW_WORDS, VALIDATION_EVERY, _chunks, generate, mean_error, open_data, tune  # noqa: E402
+
+SCALE = 0.01
+START_WEIGHTS = [20, 20, 20, 20, 20, 20]
+
+
+@pytest.fixture(scope='module')
+def data(tmp_path_factory):
+    # Random positions labelled with the side ahead on material as the winner.
+    positions = random_positions(3000, seed=4)
+    rows = np.zeros((len(positions), ROW_WORDS), dtype=np.uint64)
+    rows[:, :RESULT] = pack_positions(positions)
+    for row, position in zip(rows, positions):
+        balance = ((position.player1_men | position.player1_kings).bit_count() -
+                   (position.player2_men | position.player2_kings).bit_count())
+        row[RESULT] = 1 + (balance > 0) - (balance < 0)
+    path = tmp_path_factory.mktemp('tuning') / 'data.bin'
+    rows.tofile(str(path))
+    return open_data(str(path))
+
+
+def test_open_data(data, tmp_path):
+    assert data.shape == (3000, ROW_WORDS)
+    assert len(open_data(str(tmp_path / 'missing.bin'))) == 0
+    first = Position(*(int(word) for word in data[0, :4]), bool(data[0, 4]))
+    assert unpack_positions(data[:1, :RESULT])[0] == first
+
+
+def test_validation_rows_are_held_out(data):
+    train = sum(len(results) for _, results in _chunks(data, False))
+    validation = sum(len(results) for _, results in _chunks(data, True))
+    assert validation == len(data) // VALIDATION_EVERY and train + validation == len(data)
+    packed, results = next(_chunks(data, True))
+    assert (packed == np.asarray(data[::VALIDATION_EVERY, :RESULT])).all()
+    assert set(results) <= {0.0, 0.5, 1.0}
+
+
+def test_error_falls_while_tuning(data):
+    start = mean_error(data, np.array(START_WEIGHTS, dtype=np.float64), SCALE, False)
+    weights, history = tune(data, START_WEIGHTS, SCALE, 4, batch_size=256, learning_rate=2)
+    errors = [start] + [entry['train'] for entry in history]
+    assert [entry['epoch'] for entry in history] == [1, 2, 3, 4]
+    assert all(later < earlier for earlier, later in zip(errors, errors[1:]))
+    assert history[-1]['validation'] < mean_error(data, np.array(START_WEIGHTS, dtype=np.float64), SCALE, True)
+    assert weights[0] > START_WEIGHTS[0]
+
+
+def test_resuming_from_a_checkpoint(data, tmp_path):
+    whole = str(tmp_path / 'whole.json')
+    weights, history = tune(data, START_WEIGHTS, SCALE, 4, batch_size=256, learning_rate=2, checkpoint=whole)
+    part = str(tmp_path / 'part.json')
+    tune(data, START_WEIGHTS, SCALE, 2, batch_size=256, learning_rate=2, checkpoint=part)
+    with open(part) as infile:
+        state = json.load(infile)
+    assert state['epoch'] == 2 and state['scale'] == SCALE
+    resumed, resumed_history = tune(data, START_WEIGHTS, SCALE, 4, batch_size=256, learning_rate=2,
+                                    checkpoint=part, state=state)
+    assert resumed.tolist() == weights.tolist()
+    assert resumed_history == history
+    with open(whole) as first, open(part) as second:
+        assert json.load(first) == json.load(second)
+
+
+def test_generate_appends_labelled_quiet_positions(tmp_path):
+    path = str(tmp_path / 'selfplay.bin')
+    first = generate(path, 2, processes=1, node_limit=30, max_plies=30)
+    second = generate(path, 1, processes=1, node_limit=30, max_plies=30, seed=2)
+    data = open_data(path)
+    assert first and second and len(data) == first + second
+    assert set(data[:, RESULT].tolist()) <= {0, 1, 2}
+    assert not any(position.has_captures() for position in unpack_positions(data[:, :RESULT]))
@@ -0,0 +1,108 @@
+import pytest
+
+from bitboard import Position
+from zobrist import EXACT, LOWER_BOUND, SCORE_OFFSET, UPPER_BOUND, TranspositionTable, hash_bitboards
+
+# With size_mb=0 a table has a single bucket, so every key lands in the same slots.
+A, B, C, D = 0x1111, 0x2222, 0x3333, 0x4444
+
+
+def stored(tt, key):
+    return tt.keys.tolist().count(key) == 1
+
+
+def test_depth_replacement_keeps_the_deeper_entry():
+    tt = TranspositionTable(0)
+    assert tt.size == 2
+    tt.store(A, 5, 10, EXACT)
+    tt.store(B, 3, 20, EXACT)
+    assert stored(tt, A) and stored(tt, B)
+    tt.store(C, 2, 30, EXACT)
+    assert stored(tt, A) and not stored(tt, B) and stored(tt, C)
+    tt.store(D, 6, 40, EXACT)
+    assert not stored(tt, A) and stored(tt, C) and stored(tt, D)
+    assert tt.probe(D) == (6, 40, EXACT, 0)
+
+
+def test_always_replacement_keeps_the_latest_entry():
+    tt = TranspositionTable(0, replacement='always')
+    assert tt.size == 1
+    tt.store(A, 9, 10, EXACT)
+    tt.store(B, 1, 20, EXACT)
+    assert tt.probe(A) is None
+    assert tt.probe(B) == (1, 20, EXACT, 0)
+
+
+def test_unknown_replacement_policy():
+    with pytest.raises(ValueError):
+        TranspositionTable(0, replacement='never')
+
+
+def test_entries_from_an_older_search_are_replaced():
+    tt = TranspositionTable(0)
+    tt.store(A, 10, 10, EXACT)
+    tt.store(B, 1, 20, EXACT)
+    tt.store(C, 1, 30, EXACT)
+    assert stored(tt, A) and stored(tt, C)
+    tt.new_search()
+    tt.store(D, 1, 40, EXACT)
+    assert not stored(tt, A) and stored(tt, C) and stored(tt, D)
+
+
+def test_generation_wraps():
+    tt = TranspositionTable(0)
+    for _ in range(255):
+        tt.new_search()
+    assert tt.generation == 255
+    tt.store(A, 10, 10, EXACT)
+    assert tt.data[tt.keys.tolist().index(A)] >> 30 == 255
+    tt.new_search()
+    assert tt.generation == 0
+    tt.store(B, 1, 20, EXACT)
+    assert not stored(tt, A)
+
+
+@pytest.mark.parametrize('score', [0, 1, -1, 99990, -99990, SCORE_OFFSET - 1, -SCORE_OFFSET])
+@pytest.mark.parametrize('flag', [EXACT, LOWER_BOUND, UPPER_BOUND])
+@pytest.mark.parametrize('depth', [0, 1, 64, 0x7F])
+def test_entry_packing(score, flag, depth):
+    tt = TranspositionTable(0)
+    for _ in range(200):
+        tt.new_search()
+    tt.store(A, depth, score, flag, 0xFFFFFFFFFFFFFFFF)
+    assert tt.probe(A) == (depth, score, flag, 0xFFFFFFFFFFFFFFFF)
+    assert tt.data[tt.keys.tolist().index(A)] >> 30 == 200
+
+
+def test_depth_is_capped():
+    tt = TranspositionTable(0)
+    tt.store(A, 500, 1, EXACT)
+    assert tt.probe(A)[0] == 0x7F
+
+
+def test_restore_without_a_move_keeps_the_old_one():
+    tt = TranspositionTable(0)
+    tt.store(A, 2, 1, EXACT, 77)
+    tt.store(A, 3, 2, LOWER_BOUND)
+    assert tt.probe(A) == (3, 2, LOWER_BOUND, 77)
+
+
+def test_counters():
+    tt = TranspositionTable(0)
+    assert tt.probe(A) is None
+    assert (tt.hits, tt.misses, tt.collisions) == (0, 1, 0)
+    tt.store(A, 1, 1, EXACT)
+    assert tt.probe(A) is not None
+    assert tt.probe(B) is None
+    assert (tt.hits, tt.misses, tt.collisions, tt.stores) == (1, 2, 1, 1)
+    assert tt.stats()['hit_rate'] == pytest.approx(1 / 3)
+    tt.clear()
+    assert (tt.hits, tt.misses, tt.collisions, tt.stores) == (0, 0, 0, 0)
+    assert tt.probe(A) is None
+
+
+def test_incremental_hash_matches_a_full_rehash(random_walk):
+    for position, move in random_walk(0, plies=500):
+        after = position.play(move)
+        assert after.hash == hash_bitboards(after.player1_men, after.player1_kings, after.player2_men,
+                                            after.player2_kings, after.player1_to_move)
@@ -0,0 +1,269 @@
+import argparse
+import functools
+import json
+import math
+import multiprocessing
+import random
+import time
+
+from bitboard import Position
+from engine import Difficulty, SEARCH_BUDGETS, choose_move
+from evaluation import evaluate, load_weights
+from gamestatus import GameStatus
+from search import MAX_PLY, Searcher
+from zobrist import TranspositionTable
+
+POLICIES = {'easy': Difficulty.EASY, 'medium': Difficulty.MEDIUM}
+MIN_VARIANCE = 0.05
+RESULT_SCORES = {1: 1, 2: 0, 3: 0.5}  # GameStatus.result() -> score for Player 1
+
+
+class EngineSpec:
+    # "easy", "medium", "hard[:time=1.0]" or "search:time=0.1,nodes=20000,depth=8,tt=8,weights=tuned.json"
+    def __init__(self, text):
+        self.text = text
+        name, _, options = text.partition(':')
+        self.name = name.lower()
+        if self.name not in ('easy', 'medium', 'hard', 'search'):
+            raise ValueError(f"Unknown engine: {text}")
+        self.options = {}
+        for option in filter(None, options.split(',')):
+            key, _, value = option.partition('=')
+            key = key.strip()
+            self.options[key] = value.strip() if key == 'weights' else float(value)
+
+        if self.name == 'hard':
+            time_limit, node_limit = SEARCH_BUDGETS[Difficulty.HARD]
+            self.options.setdefault('time', time_limit)
+            if node_limit is not None:
+                self.options.setdefault('nodes', node_limit)
+
+    def is_search(self):
+        return self.name in ('hard', 'search')
+
+    def __repr__(self):
+        return self.text
+
+
+class EnginePlayer:
+    def __init__(self, spec, rng):
+        self.spec = spec
+        self.rng = rng
+        self.searcher = None
+        if spec.is_search():
+            options = spec.options
+            tt = TranspositionTable(int(options.get('tt', 8)))
+            evaluator = evaluate
+            if 'weights' in options:
+                evaluator = functools.partial(evaluate, weights=load_weights(options['weights']))
+            self.searcher = Searcher(time_limit=options.get('time'), node_limit=int(options.get('nodes', 0)) or None,
+                                     max_depth=int(options.get('depth', 0)) or MAX_PLY - 1, evaluate=evaluator, tt=tt)
+
+    def new_game(self):
+        if self.searcher is not None:
+            self.searcher.tt.clear()
+            self.searcher.history = {}
+
+    def choose(self, position, history):
+        if self.searcher is not None:
+            return self.searcher.search(position, history=history).best_move
+        return choose_move(position, POLICIES[self.spec.name], self.rng)
+
+
+def random_opening(rng, plies):
+    position = Position.initial()
+    for _ in range(plies):
+        moves = position.generate_moves()
+        if not moves:
+            break
+        position.make(rng.choice(moves))
+    return position
+
+
+def play_game(player1, player2, position, max_plies):
+    # Returns 1 if Player 1 wins, 0 if Player 2 wins, 0.5 for a draw.
+    status = GameStatus(position)
+    history = []
+    for _ in range(max_plies):
+        result = status.result()
+        if result:
+            return RESULT_SCORES[result]
+        position = status.position
+        player = player1 if position.player1_to_move else player2
+        move = player.choose(position, history)
+        history.append(position.hash)
+        status.push(move)
+    return 0.5
+
+
+_players = {}
+
+
+def _get_player(spec_text, slot, seed):
+    # Players are reused across the games a worker plays, so each engine keeps
+    # its transposition table allocation; slot keeps self-play sides apart.
+    player = _players.get((spec_text, slot))
+    if player is None:
+        player = _players[(spec_text, slot)] = EnginePlayer(EngineSpec(spec_text), random.Random())
+    player.rng.seed(seed)
+    player.new_game()
+    return player
+
+
+def run_game(task):
+    # Worker entry point. Plays one game and returns engine A's score.
+    index, engine_a, engine_b, seed, opening_plies, max_plies = task
+    opening = random_opening(random.Random(seed * 1000003 + index // 2), opening_plies)
+    player_a = _get_player(engine_a, 'a', seed * 1000003 + index * 2)
+    player_b = _get_player(engine_b, 'b', seed * 1000003 + index * 2 + 1)
+    if index % 2 == 0:
+        result = play_game(player_a, player_b, opening, max_plies)
+    else:
+        result = 1 - play_game(player_b, player_a, opening, max_plies)
+    return index, result
+
+
+def expected_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo_from_score(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+class Stats:
+    def __init__(self):
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+
+    def add(self, result):
+        if result == 1:
+            self.wins += 1
+        elif result == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def score(self):
+        return (self.wins + 0.5 * self.draws) / self.games if self.games else 0.5
+
+    def variance(self):
+        if not self.games:
+            return 0.0
+        score = self.score()
+        return (self.wins * (1 - score) ** 2 + self.draws * (0.5 - score) ** 2 +
+                self.losses * score ** 2) / self.games
+
+    def elo(self):
+        # Elo difference with a 95% confidence margin.
+        score = self.score()
+        if not self.games:
+            return 0.0, 0.0
+        margin = 1.96 * math.sqrt(self.variance() / self.games)
+        low, high = elo_from_score(score - margin), elo_from_score(score + margin)
+        return elo_from_score(score), (high - low) / 2
+
+    def los(self):
+        decisive = self.wins + self.losses
+        if not decisive:
+            return 0.5
+        return 0.5 * (1 + math.erf((self.wins - self.losses) / math.sqrt(2 * decisive)))
+
+    def llr(self, elo0, elo1):
+        # Normal approximation of the log-likelihood ratio of H1 (elo1) against H0 (elo0).
+        # The variance floor stops a one-sided start from ending the test after a few games.
+        if not self.games:
+            return 0.0
+        variance = max(self.variance(), MIN_VARIANCE)
+        score0, score1 = expected_score(elo0), expected_score(elo1)
+        return self.games * (score1 - score0) * (2 * self.score() - score0 - score1) / (2 * variance)
+
+    def to_dict(self):
+        elo, margin = self.elo()
+        return {'games': self.games, 'wins': self.wins, 'draws': self.draws, 'losses': self.losses,
+                'score': self.score(), 'elo': elo, 'elo_margin': margin, 'los': self.los()}
+
+
+def sprt_bounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def run_tournament(engine_a, engine_b, games, processes=None, seed=1, opening_plies=4, max_plies=200,
+                   sprt=None, report=None):
+    # sprt is (elo0, elo1, alpha, beta) or None. Games are played in colour-swapped
+    # pairs so both engines play each randomised opening from both sides.
+    EngineSpec(engine_a), EngineSpec(engine_b)  # validate before starting workers
+    tasks = [(index, engine_a, engine_b, seed, opening_plies, max_plies) for index in range(games)]
+    stats = Stats()
+    sprt_result = None
+    start_time = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        for _, result in pool.imap_unordered(run_game, tasks):
+            stats.add(result)
+            if report:
+                report(stats)
+            if sprt:
+                lower, upper = sprt_bounds(sprt[2], sprt[3])
+                llr = stats.llr(sprt[0], sprt[1])
+                if llr <= lower or llr >= upper:
+                    sprt_result = 'H0' if llr <= lower else 'H1'
+                    pool.terminate()
+                    break
+    summary = stats.to_dict()
+    summary['engines'] = [engine_a, engine_b]
+    summary['seconds'] = time.perf_counter() - start_time
+    if sprt:
+        summary['sprt'] = {'elo0': sprt[0], 'elo1': sprt[1], 'alpha': sprt[2], 'beta': sprt[3],
+                           'llr': stats.llr(sprt[0], sprt[1]), 'bounds': sprt_bounds(sprt[2], sprt[3]),
+                           'result': sprt_result}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a headless match between two engines.")
+    parser.add_argument('engine_a',
+                        help="easy, medium, hard[:time=S] or search:time=S,nodes=N,depth=D,tt=MB,weights=FILE")
+    parser.add_argument('engine_b')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--processes', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--opening-plies', type=int, default=4, help="random plies played before each game pair")
+    parser.add_argument('--max-plies', type=int, default=200, help="plies before a game is scored as a draw")
+    parser.add_argument('--sprt', action='store_true', help="stop early once the SPRT accepts H0 or H1")
+    parser.add_argument('--elo0', type=float, default=0.0)
+    parser.add_argument('--elo1', type=float, default=20.0)
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    parser.add_argument('--json', help="write the summary to this JSON file")
+    args = parser.parse_args()
+
+    def report(stats):
+        if stats.games % 10 == 0:
+            elo, margin = stats.elo()
+            print(f"games {stats.games:5d}  +{stats.wins} ={stats.draws} -{stats.losses}  "
+                  f"elo {elo:+7.1f} +/- {margin:.1f}")
+
+    sprt = (args.elo0, args.elo1, args.alpha, args.beta) if args.sprt else None
+    summary = run_tournament(args.engine_a, args.engine_b, args.games, args.processes, args.seed,
+                             args.opening_plies, args.max_plies, sprt, report)
+
+    print(f"{args.engine_a} vs {args.engine_b}: +{summary['wins']} ={summary['draws']} -{summary['losses']}  "
+          f"score {summary['score']:.3f}  elo {summary['elo']:+.1f} +/- {summary['elo_margin']:.1f}  "
+          f"LOS {summary['los']:.1%}  ({summary['seconds']:.1f}s)")
+    if sprt:
+        result = summary['sprt']
+        print(f"SPRT llr {result['llr']:.2f} bounds ({result['bounds'][0]:.2f}, {result['bounds'][1]:.2f}): "
+              f"{result['result'] or 'inconclusive'}")
+    if args.json:
+        with open(args.json, 'w') as outfile:
+            json.dump(summary, outfile, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from batch_evaluation import batch_features
+from evaluation import FEATURES, WEIGHTS, save_weights
+from gamestatus import GameStatus
+from search import Searcher
+from tournament import random_opening, run_tournament
+from zobrist import TranspositionTable
+
+# Self-play positions are appended to a flat file of uint64 rows: the (N, 5)
+# packed position of batch_evaluation followed by the game result as
+# 2 * Player 1's score (0 loss, 1 draw, 2 win). The tuner reads it through a
+# memmap one chunk at a time, so the data set can be far larger than RAM.
+ROW_WORDS = 6
+RESULT = 5
+OUTCOME_LABELS = {1: 2, 2: 0, 3: 1}  # GameStatus.result() -> result column
+CHUNK_ROWS = 1 << 20
+VALIDATION_EVERY = 10  # every 10th row is held out for validation
+
+_generator = None
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("tuning needs NumPy (pip install numpy)")
+
+
+def open_data(path):
+    rows = os.path.getsize(path) // (8 * ROW_WORDS) if os.path.exists(path) else 0
+    if not rows:
+        return np.zeros((0, ROW_WORDS), dtype=np.uint64)
+    return np.memmap(path, dtype=np.uint64, mode='r', shape=(rows, ROW_WORDS))
+
+
+def _init_generator(node_limit, tt_mb):
+    global _generator
+    _generator = Searcher(node_limit=node_limit, tt=TranspositionTable(tt_mb))
+
+
+def play_selfplay_game(task):
+    # Worker entry point: plays one game and returns its labelled quiet positions as rows.
+    seed, opening_plies, max_plies = task
+    rng = random.Random(seed)
+    status = GameStatus(random_opening(rng, opening_plies))
+    _generator.tt.clear()
+    history = []
+    rows = []
+    result = 1  # draw unless a side runs out of moves
+    for _ in range(max_plies):
+        outcome = status.result()
+        if outcome:
+            result = OUTCOME_LABELS[outcome]
+            break
+        position = status.position
+        # Positions with a capture pending are scored badly by a static
+        # evaluation whatever its weights, so only quiet ones are kept.
+        if not position.has_captures():
+            rows.append([position.player1_men, position.player1_kings, position.player2_men, position.player2_kings,
+                         int(position.player1_to_move), 0])
+        move = _generator.search(position, history=history).best_move
+        history.append(position.hash)
+        status.push(move)
+    for row in rows:
+        row[RESULT] = result
+    return rows
+
+
+def generate(path, games, processes=None, node_limit=2000, opening_plies=6, max_plies=200, seed=1, tt_mb=4,
+             report=None):
+    _require_numpy()
+    tasks = [(seed * 1000003 + index, opening_plies, max_plies) for index in range(games)]
+    positions = 0
+    start_time = time.perf_counter()
+    with open(path, 'ab') as outfile, multiprocessing.Pool(processes, _init_generator, (node_limit, tt_mb)) as pool:
+        for done, rows in enumerate(pool.imap_unordered(play_selfplay_game, tasks)):
+            if rows:
+                np.array(rows, dtype=np.uint64).tofile(outfile)
+                positions += len(rows)
+            if report:
+                report(done + 1, positions, time.perf_counter() - start_time)
+    return positions
+
+
+def _chunks(data, validation):
+    # (packed positions, Player 1 scores) for the training or validation rows, chunk by chunk.
+    for start in range(0, len(data), CHUNK_ROWS):
+        chunk = np.asarray(data[start:start + CHUNK_ROWS])
+        held_out = (np.arange(start, start + len(chunk)) % VALIDATION_EVERY) == 0
+        chunk = chunk[held_out if validation else ~held_out]
+        if len(chunk):
+            yield chunk[:, :RESULT], chunk[:, RESULT].astype(np.float64) / 2
+
+
+def _predict(features, weights, scale):
+    # Expected Player 1 score for a static evaluation from Player 1's side.
+    return 1 / (1 + np.exp(-scale * (features @ weights)))
+
+
+def mean_error(data, weights, scale, validation):
+    total = 0.0
+    count = 0
+    for packed, results in _chunks(data, validation):
+        total += ((_predict(batch_features(packed), weights, scale) - results) ** 2).sum()
+        count += len(results)
+    return total / count if count else 0.0
+
+
+def fit_scale(data, weights):
+    # Texel tuning first picks the sigmoid scale that best fits the current
+    # weights, then keeps it fixed so the weights alone explain the results.
+    # The first chunk of data is plenty to fit one number.
+    data = data[:CHUNK_ROWS]
+    low, high = 1e-4, 1e-1
+    for _ in range(30):
+        # Golden-section search in log space.
+        a = low * (high / low) ** 0.382
+        b = low * (high / low) ** 0.618
+        if mean_error(data, weights, a, False) < mean_error(data, weights, b, False):
+            high = b
+        else:
+            low = a
+    return math.sqrt(low * high)
+
+
+def tune(data, weights, scale, epochs, batch_size=65536, learning_rate=0.5, checkpoint=None, state=None, report=None):
+    # Mini-batch Adam on the mean squared error between predicted and actual
+    # results. state is a checkpoint dict to resume from.
+    weights = np.array(weights, dtype=np.float64)
+    moment = np.zeros_like(weights)
+    velocity = np.zeros_like(weights)
+    step = 0
+    first_epoch = 0
+    history = []
+    if state:
+        weights = np.array(state['weights'], dtype=np.float64)
+        moment = np.array(state['moment'])
+        velocity = np.array(state['velocity'])
+        step, first_epoch, history = state['step'], state['epoch'], state['history']
+
+    for epoch in range(first_epoch, epochs):
+        for packed, results in _chunks(data, False):
+            features = batch_features(packed).astype(np.float64)
+            for start in range(0, len(results), batch_size):
+                batch = features[start:start + batch_size]
+                predicted = _predict(batch, weights, scale)
+                error = predicted - results[start:start + batch_size]
+                gradient = (2 * scale * error * predicted * (1 - predicted)) @ batch / len(error)
+                step += 1
+                moment = 0.9 * moment + 0.1 * gradient
+                velocity = 0.999 * velocity + 0.001 * gradient ** 2
+                weights -= learning_rate * (moment / (1 - 0.9 ** step)) / (
+                    np.sqrt(velocity / (1 - 0.999 ** step)) + 1e-12)
+        history.append({'epoch': epoch + 1, 'train': mean_error(data, weights, scale, False),
+                        'validation': mean_error(data, weights, scale, True)})
+        if report:
+            report(history[-1], weights)
+        if checkpoint:
+            with open(checkpoint + '.tmp', 'w') as outfile:
+                json.dump({'weights': weights.tolist(), 'moment': moment.tolist(), 'velocity': velocity.tolist(),
+                           'step': step, 'epoch': epoch + 1, 'history': history, 'scale': scale}, outfile)
+            os.replace(checkpoint + '.tmp', checkpoint)
+    return weights, history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate self-play positions and tune the evaluation weights.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = subparsers.add_parser('generate', help="append labelled self-play positions to a data file")
+    generate_parser.add_argument('--data', default='selfplay.bin')
+    generate_parser.add_argument('--games', type=int, default=1000)
+    generate_parser.add_argument('--processes', type=int, default=None, help="worker processes (default: all cores)")
+    generate_parser.add_argument('--nodes', type=int, default=2000, help="search nodes per move")
+    generate_parser.add_argument('--opening-plies', type=int, default=6)
+    generate_parser.add_argument('--seed', type=int, default=1)
+
+    tune_parser = subparsers.add_parser('tune', help="fit the weights to the results of the data file")
+    tune_parser.add_argument('--data', default='selfplay.bin')
+    tune_parser.add_argument('--output', default='weights.json')
+    tune_parser.add_argument('--epochs', type=int, default=20)
+    tune_parser.add_argument('--batch-size', type=int, default=65536)
+    tune_parser.add_argument('--learning-rate', type=float, default=0.5)
+    tune_parser.add_argument('--checkpoint', default='tuning_checkpoint.json', help="resumed from if it exists")
+    tune_parser.add_argument('--match-games', type=int, default=0,
+                             help="play this many games of tuned against default weights afterwards")
+    tune_parser.add_argument('--match-nodes', type=int, default=5000)
+    args = parser.parse_args()
+    _require_numpy()
+
+    if args.command == 'generate':
+        def report(games, positions, elapsed):
+            if games % 10 == 0 or games == args.games:
+                print(f"\r{games}/{args.games} games  {positions} positions  {positions / elapsed:.0f} positions/s",
+                      end='')
+
+        generate(args.data, args.games, args.processes, args.nodes, args.opening_plies, seed=args.seed,
+                 report=report)
+        print(f"\n{len(open_data(args.data))} positions in {args.data}")
+        return
+
+    data = open_data(args.data)
+    state = None
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        with open(args.checkpoint) as infile:
+            state = json.load(infile)
+        scale = state['scale']
+        print(f"Resuming from {args.checkpoint} after epoch {state['epoch']}")
+    else:
+        scale = fit_scale(data, np.array(WEIGHTS, dtype=np.float64))
+    start_error = mean_error(data, np.array(WEIGHTS, dtype=np.float64), scale, True)
+    print(f"{len(data)} positions, scale {scale:.5f}, validation error {start_error:.5f} with the default weights")
+
+    def report(entry, weights):
+        print(f"epoch {entry['epoch']:3d}  train {entry['train']:.5f}  validation {entry['validation']:.5f}  "
+              f"weights {' '.join(f'{weight:.1f}' for weight in weights)}")
+
+    weights, history = tune(data, WEIGHTS, scale, args.epochs, args.batch_size, args.learning_rate, args.checkpoint,
+                            state, report)
+    save_weights(args.output, weights.tolist(), scale=scale, positions=len(data), history=history)
+    print(f"Saved {args.output}")
+    for feature, old, new in zip(FEATURES, WEIGHTS, weights):
+        print(f"  {feature:12s} {old:8.1f} -> {new:8.1f}")
+
+    if args.match_games:
+        # Tuned against default weights at the same node budget; positive Elo means the tuning helped.
+        summary = run_tournament(f"search:nodes={args.match_nodes},weights={args.output}",
+                                 f"search:nodes={args.match_nodes}", args.match_games)
+        print(f"tuned vs default: +{summary['wins']} ={summary['draws']} -{summary['losses']}  "
+              f"elo {summary['elo']:+.1f} +/- {summary['elo_margin']:.1f}  LOS {summary['los']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import random
+from array import array
+
+# One 64-bit key per piece kind and bit of the 35-bit board layout, plus one
+# for Player 2 to move. The seed is fixed so hashes are stable across runs
+# and processes.
+BOARD_BITS = 35
+PIECE_KINDS = 4  # Player 1 men, Player 1 kings, Player 2 men, Player 2 kings
+
+_rng = random.Random(0x5EED)
+PIECE_KEYS = [[_rng.getrandbits(64) for _ in range(BOARD_BITS)] for _ in range(PIECE_KINDS)]
+SIDE_KEY = _rng.getrandbits(64)
+del _rng
+
+
+def board_key(kind, mask):
+    keys = PIECE_KEYS[kind]
+    key = 0
+    while mask:
+        bit = mask & -mask
+        key ^= keys[bit.bit_length() - 1]
+        mask ^= bit
+    return key
+
+
+def hash_bitboards(player1_men, player1_kings, player2_men, player2_kings, player1_to_move):
+    key = (board_key(0, player1_men) ^ board_key(1, player1_kings) ^
+           board_key(2, player2_men) ^ board_key(3, player2_kings))
+    return key if player1_to_move else key ^ SIDE_KEY
+
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+ENTRY_BYTES = 24
+SCORE_OFFSET = 1 << 20
+REPLACEMENT_POLICIES = ('depth', 'always')
+
+
+class TranspositionTable:
+    # Fixed-size table of (key, data, move) entries held in three flat arrays
+    # allocated up front, so memory use never grows. With the 'depth' policy
+    # each bucket has a depth-preferred slot and an always-replace slot; with
+    # 'always' each bucket is a single always-replace slot.
+    def __init__(self, size_mb=16, replacement='depth'):
+        if replacement not in REPLACEMENT_POLICIES:
+            raise ValueError(f"Unknown replacement policy: {replacement}")
+        self.replacement = replacement
+        self.slots_per_bucket = 2 if replacement == 'depth' else 1
+        entries = max(self.slots_per_bucket, (size_mb * 1024 * 1024) // ENTRY_BYTES)
+        buckets = 1
+        while buckets * 2 * self.slots_per_bucket <= entries:
+            buckets *= 2
+        self.bucket_mask = buckets - 1
+        self.size = buckets * self.slots_per_bucket
+        self._allocate()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def _allocate(self):
+        self.keys = array('Q', bytes(8 * self.size))
+        self.data = array('Q', bytes(8 * self.size))
+        self.moves = array('Q', bytes(8 * self.size))
+
+    def memory_bytes(self):
+        return self.keys.itemsize * len(self.keys) * 3
+
+    def new_search(self):
+        self.generation = (self.generation + 1) & 0xFF
+
+    def clear(self):
+        for table in (self.keys, self.data, self.moves):
+            table[:] = array('Q', bytes(8 * self.size))
+        self.generation = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            'size_mb': self.memory_bytes() / (1024 * 1024),
+            'entries': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'stores': self.stores,
+            'hit_rate': self.hits / probes if probes else 0.0,
+        }
+
+    def probe(self, key):
+        # Returns (depth, score, flag, packed_move) or None.
+        index = (key & self.bucket_mask) * self.slots_per_bucket
+        occupied = False
+        for slot in range(index, index + self.slots_per_bucket):
+            stored = self.keys[slot]
+            if stored == key:
+                self.hits += 1
+                data = self.data[slot]
+                return ((data >> 21) & 0x7F, (data & 0x1FFFFF) - SCORE_OFFSET, (data >> 28) & 0x3, self.moves[slot])
+            if stored:
+                occupied = True
+        self.misses += 1
+        if occupied:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, score, flag, packed_move=0):
+        index = (key & self.bucket_mask) * self.slots_per_bucket
+        slot = index
+        if self.slots_per_bucket == 2:
+            data = self.data[index]
+            same_position = self.keys[index] == key
+            stale = (data >> 30) != self.generation
+            if not (same_position or stale or depth >= (data >> 21) & 0x7F or not self.keys[index]):
+                slot = index + 1
+        if self.keys[slot] == key and not packed_move:
+            packed_move = self.moves[slot]
+        self.keys[slot] = key
+        self.data[slot] = ((score + SCORE_OFFSET) | (min(depth, 0x7F) << 21) | (flag << 28) | (self.generation << 30))
+        self.moves[slot] = packed_move
+        self.stores += 1